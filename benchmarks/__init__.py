@@ -0,0 +1,4 @@
+"""Benchmarks for the routes that jsonclasses-server generates. The
+benchmarks run against an in-memory ORM stand-in, thus no database is
+required.
+"""
@@ -0,0 +1,64 @@
+"""This module drives an ASGI app in process, so benchmarks measure the
+server code rather than the network stack.
+"""
+from __future__ import annotations
+from typing import Any
+from json import dumps, loads
+from thunderlight import App
+
+
+class Response:
+
+    def __init__(self, code: int, headers: dict[str, str], body: bytes) -> None:
+        self.code = code
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return loads(self.body)
+
+
+async def request(app: App,
+                  method: str,
+                  path: str,
+                  qs: str = '',
+                  body: Any = None,
+                  headers: dict[str, str] | None = None) -> Response:
+    raw = dumps(body).encode('utf-8') if body is not None else b''
+    hdrs = {'content-type': 'application/json', **(headers or {})}
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': qs.encode('utf-8'),
+        'headers': [(k.lower().encode(), v.encode()) for k, v in hdrs.items()],
+        'client': ('127.0.0.1', 0),
+        'scheme': 'http',
+        'http_version': '1.1',
+    }
+    sent = False
+
+    async def receive() -> dict[str, Any]:
+        nonlocal sent
+        if sent:
+            return {'type': 'http.disconnect'}
+        sent = True
+        return {'type': 'http.request', 'body': raw, 'more_body': False}
+
+    code = 0
+    rheaders: dict[str, str] = {}
+    chunks: list[bytes] = []
+
+    async def send(message: dict[str, Any]) -> None:
+        nonlocal code
+        if message['type'] == 'http.response.start':
+            code = message['status']
+            for k, v in message['headers']:
+                k = k.decode() if isinstance(k, bytes) else k
+                v = v.decode() if isinstance(v, bytes) else v
+                rheaders[k.lower()] = v
+        else:
+            chunks.append(message.get('body', b''))
+
+    await app(scope)(receive, send)
+    return Response(code, rheaders, b''.join(chunks))
@@ -0,0 +1,49 @@
+"""Compare encoding list responses with `tojson()` against the compiled
+encoder.
+
+    python -m benchmarks.bench_encoder
+"""
+from __future__ import annotations
+from argparse import ArgumentParser
+from json import dumps
+from time import perf_counter
+from typing import Any, Callable
+from thunderlight.json import JSON
+from jsonclasses_server.encoder import json_encoder
+from .models import Song
+
+
+def measure(encode: Callable[[Any], dict[str, Any]],
+            items: list[Song],
+            rounds: int) -> float:
+    json = JSON()
+    best = float('inf')
+    for _ in range(rounds):
+        begin = perf_counter()
+        json.encode({'data': [encode(item.opby(None)) for item in items]})
+        best = min(best, perf_counter() - begin)
+    return best
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+    items = [Song(name=f'song {i}', year=2000 + i % 20)
+             for i in range(args.items)]
+    tojson = json_encoder(Song, 'tojson')
+    compiled = json_encoder(Song, 'compiled')
+    assert tojson(items[0]) == compiled(items[0])
+    before = measure(tojson, items, args.rounds)
+    after = measure(compiled, items, args.rounds)
+    print(dumps({
+        'items': args.items,
+        'tojson_ms': before * 1000,
+        'compiled_ms': after * 1000,
+        'speedup': before / after
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Measure cheap read latency while slow list queries are running, for each
+executor mode.
+
+    python -m benchmarks.bench_executor
+"""
+from __future__ import annotations
+from argparse import ArgumentParser
+from asyncio import run, gather, sleep
+from json import dumps
+from time import perf_counter
+from jsonclasses_server import server
+from jsonclasses_server.executor import Executor, set_executor
+from . import memory
+from .asgi import request
+from .models import Song
+from .stats import summary
+
+
+async def measure(mode: str, slow: int, reads: int, interval: float,
+                  list_latency: float, max_workers: int) -> dict[str, float]:
+    set_executor(Executor(mode=mode, max_workers=max_workers))
+    app = server()
+    song = Song(name='song', year=2021).save()
+    latencies: list[float] = []
+    running = True
+
+    async def slow_lists() -> None:
+        while running:
+            await request(app, 'GET', '/songs')
+            await sleep(0)
+
+    async def cheap_reads() -> None:
+        # latency is measured from when a read is due, so time spent waiting
+        # for a blocked event loop is counted
+        begin = perf_counter()
+        for i in range(reads):
+            due = begin + i * interval
+            await sleep(max(0.0, due - perf_counter()))
+            response = await request(app, 'GET', f'/songs/{song.id}')
+            latencies.append(perf_counter() - due)
+            assert response.code == 200
+
+    memory.latency['find'] = list_latency
+    tasks = [slow_lists() for _ in range(slow)]
+
+    async def reader() -> None:
+        nonlocal running
+        await sleep(list_latency / 2)
+        await cheap_reads()
+        running = False
+
+    await gather(reader(), *tasks)
+    memory.latency['find'] = 0.0
+    return summary(latencies)
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument('--slow', type=int, default=4)
+    parser.add_argument('--reads', type=int, default=100)
+    parser.add_argument('--interval', type=float, default=0.01)
+    parser.add_argument('--list-latency', type=float, default=0.05)
+    parser.add_argument('--max-workers', type=int, default=8)
+    args = parser.parse_args()
+    results = {}
+    for mode in Executor.modes:
+        results[mode] = run(measure(mode, args.slow, args.reads,
+                                    args.interval, args.list_latency,
+                                    args.max_workers))
+    print(dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
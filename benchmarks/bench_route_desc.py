@@ -0,0 +1,75 @@
+"""Measure the per request overhead of resolving route metadata, computed on
+each request as handlers used to, against reading it from the compiled route
+descriptor.
+
+    python -m benchmarks.bench_route_desc
+"""
+from __future__ import annotations
+from argparse import ArgumentParser
+from asyncio import run
+from json import dumps
+from time import perf_counter
+from timeit import timeit
+from typing import Any
+from jsonclasses_server import server
+from jsonclasses_server.aconf import AConf
+from .asgi import request
+from .models import Song
+from .stats import summary
+
+
+BODY = {'name': 'song', 'year': 2021}
+
+
+def resolve_per_request() -> Any:
+    cdef = Song.cdef
+    aconf = Song.aconf
+    ufields = cdef._unique_fields
+    uvalidnames = set([f.name for f in ufields] + [f.json_name for f in ufields])
+    ifields = cdef._auth_identity_fields
+    ivalidnames = set([f.name for f in ifields] + [f.json_name for f in ifields])
+    keys = [cdef.jconf.input_key_strategy(k) for k in BODY]
+    fresh = AConf(Song, None, None, None, None, None, None, None, None)
+    return (uvalidnames, ivalidnames, keys, fresh.actions, fresh.name,
+            fresh.cname_to_srname(Song.__name__), aconf.paginated,
+            aconf.streaming)
+
+
+def resolve_compiled() -> Any:
+    desc = Song.rdesc
+    keys = [desc.key_map[k] for k in BODY]
+    return (desc.unique_names, desc.identity_names, keys, desc.actions,
+            desc.name, desc.srname, desc.paginated, desc.streaming)
+
+
+async def list_latency(requests: int) -> dict[str, float]:
+    app = server()
+    Song(**BODY).save()
+    latencies: list[float] = []
+    for _ in range(requests):
+        begin = perf_counter()
+        response = await request(app, 'GET', '/songs', '_limit=1')
+        latencies.append(perf_counter() - begin)
+        assert response.code == 200
+    return summary(latencies)
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    before = timeit(resolve_per_request, number=args.number)
+    after = timeit(resolve_compiled, number=args.number)
+    results = {
+        'metadata_us': {
+            'per_request': before / args.number * 1e6,
+            'compiled': after / args.number * 1e6,
+        },
+        'list': run(list_latency(args.requests)),
+    }
+    print(dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Measure throughput and latency of each generated route: list, read,
+create, update, update many, delete, delete many, ensure and session. Each
+route is measured anonymously and with an authorized operator, with small
+and large payloads and at several concurrency levels. Results are written as
+JSON, two runs are compared with `benchmarks.compare`.
+
+    python -m benchmarks.bench_routes --output before.json
+    python -m benchmarks.bench_routes --routes L,R --concurrency 1,64
+
+Requests are handled in process against the in-memory backend, so the
+numbers are of the server code, not of a database or the network stack.
+"""
+from __future__ import annotations
+from typing import Any, Callable
+from argparse import ArgumentParser
+from asyncio import gather, run
+from datetime import datetime, timezone
+from json import dumps
+from os import chdir, getcwd
+from os.path import abspath, dirname
+from pathlib import Path
+from platform import platform, python_version
+from subprocess import run as run_process
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from .stats import summary
+
+
+ROOT = dirname(dirname(abspath(__file__)))
+ROUTES = ('L', 'R', 'C', 'U', 'Um', 'D', 'Dm', 'E', 'S')
+PAYLOADS = {
+    # items in the listed collection, bytes of each song name
+    'small': (10, 16),
+    'large': (100, 1024),
+}
+PASSWORD = 'password1'
+Call = tuple[str, str, str, Any]
+
+
+def _plan(route: str, ids: list[str], items: int, name: str) -> Callable[[int], Call]:
+    """The request of route `route` with index `i`. Writes that remove
+    objects use a seeded object each.
+    """
+    match route:
+        case 'L':
+            return lambda i: ('GET', '/songs', '', None)
+        case 'R':
+            return lambda i: ('GET', f'/songs/{ids[i % items]}', '', None)
+        case 'C':
+            return lambda i: ('POST', '/songs', '', {'name': name, 'year': i})
+        case 'U':
+            return lambda i: ('PATCH', f'/songs/{ids[i % items]}', '',
+                              {'name': name})
+        case 'Um':
+            return lambda i: ('PATCH', '/songs', '', {'_update': {
+                '_query': {'year': i % items}, '_data': {'name': name}}})
+        case 'D':
+            return lambda i: ('DELETE', f'/songs/{ids[i]}', '', None)
+        case 'Dm':
+            return lambda i: ('DELETE', '/songs', f'year={i}', None)
+        case 'E':
+            return lambda i: ('POST', '/users/ensure', '',
+                              {'username': f'user{i % items}', 'password': PASSWORD})
+        case _:
+            return lambda i: ('POST', '/users/session', '',
+                              {'username': 'operator', 'password': PASSWORD})
+
+
+async def measure(app: Any,
+                  call: Callable[[int], Call],
+                  headers: dict[str, str],
+                  warmup: int,
+                  requests: int,
+                  concurrency: int) -> dict[str, Any]:
+    from .asgi import request
+    for i in range(warmup):
+        await request(app, *call(i), headers)
+    latencies: list[float] = []
+    errors = 0
+    index = warmup
+    end = warmup + requests
+
+    async def worker() -> None:
+        nonlocal index, errors
+        while index < end:
+            i = index
+            index += 1
+            begin = perf_counter()
+            response = await request(app, *call(i), headers)
+            latencies.append(perf_counter() - begin)
+            if response.code >= 400:
+                errors += 1
+
+    begin = perf_counter()
+    await gather(*[worker() for _ in range(concurrency)])
+    elapsed = perf_counter() - begin
+    return {**summary(latencies),
+            'rps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+            'errors': errors}
+
+
+async def bench(routes: list[str],
+                payloads: list[str],
+                auths: list[str],
+                levels: list[int],
+                warmup: int,
+                requests: int,
+                executor: str) -> list[dict[str, Any]]:
+    from jsonclasses_server import server
+    from jsonclasses_server.executor import Executor, set_executor
+    from .asgi import request
+    from .memory import stores
+    from .models import Song, User
+    set_executor(Executor(mode=executor))
+    app = server()
+    User(username='operator', password=PASSWORD).save()
+    response = await request(app, 'POST', '/users/session',
+                             body={'username': 'operator', 'password': PASSWORD})
+    token = response.json()['data']['token']
+    results: list[dict[str, Any]] = []
+    for route in routes:
+        for payload in payloads:
+            items, size = PAYLOADS[payload]
+            name = 'x' * size
+            for auth in auths:
+                if route == 'S' and auth == 'authorized':
+                    continue
+                headers = {'authorization': f'Bearer {token}'} \
+                    if auth == 'authorized' else {}
+                for concurrency in levels:
+                    stores['Song'].clear()
+                    count = items if route not in ('D', 'Dm') else warmup + requests
+                    songs = [Song(name=name, year=i).save() for i in range(count)]
+                    call = _plan(route, [s.id for s in songs], items, name)
+                    result = await measure(app, call, headers, warmup,
+                                           requests, concurrency)
+                    results.append({'route': route, 'payload': payload,
+                                    'auth': auth, 'concurrency': concurrency,
+                                    **result})
+    return results
+
+
+def _commit() -> str | None:
+    result = run_process(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                         capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def _split(value: str) -> list[str]:
+    return [item.strip() for item in value.split(',') if item.strip() != '']
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    parser.add_argument('--payloads', default=','.join(PAYLOADS))
+    parser.add_argument('--auth', default='anonymous,authorized')
+    parser.add_argument('--concurrency', default='1,16,64')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--executor', default='inline')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    routes = _split(args.routes)
+    for route in routes:
+        if route not in ROUTES:
+            parser.error(f'unknown route {route}, routes are {", ".join(ROUTES)}')
+    payloads = _split(args.payloads)
+    for payload in payloads:
+        if payload not in PAYLOADS:
+            parser.error(f'unknown payload {payload}')
+    output = Path(args.output).absolute() if args.output else None
+    cwd = getcwd()
+    with TemporaryDirectory() as directory:
+        # the user config is read from the working directory when the server
+        # is first imported, tokens need a secret key
+        Path(directory, 'config.json').write_text(dumps(
+            {'operator': {'secretKey': 'jsonclasses-server-benchmark-secret'}}))
+        chdir(directory)
+        results = run(bench(routes, payloads, _split(args.auth),
+                            [int(c) for c in _split(args.concurrency)],
+                            args.warmup, args.requests, args.executor))
+        chdir(cwd)
+    report = dumps({
+        'meta': {
+            'commit': _commit(),
+            'python': python_version(),
+            'platform': platform(),
+            'time': datetime.now(timezone.utc).isoformat(),
+            'executor': args.executor,
+            'warmup': args.warmup,
+            'requests': args.requests
+        },
+        'results': results
+    }, indent=2)
+    if output is not None:
+        output.write_text(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Measure cold start of an app with many API classes. Each run is a fresh
+interpreter which imports the app and handles one request.
+
+    python -m benchmarks.bench_startup
+"""
+from __future__ import annotations
+from argparse import ArgumentParser
+from json import dumps, loads
+from os.path import dirname, abspath
+from pathlib import Path
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory
+from .stats import summary
+
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+CLASS = '''
+@api
+@memory
+@jsonclass
+class Model{i}:
+    id: str = types.readonly.str.primary.mongoid.required
+    name: str
+    value: int | None
+    created_at: datetime = types.readonly.datetime.tscreated.required
+    updated_at: datetime = types.readonly.datetime.tsupdated.required
+'''
+
+HEADER = '''from __future__ import annotations
+from datetime import datetime
+from jsonclasses import jsonclass, types
+from jsonclasses_server import api
+from benchmarks.memory import memory
+'''
+
+PROBE = '''
+import sys
+sys.path.insert(0, {root!r})
+from time import perf_counter
+from asyncio import run
+from json import dumps
+begin = perf_counter()
+import graph
+from jsonclasses_server import server
+app = server()
+imported = perf_counter()
+from benchmarks.asgi import request
+response = run(request(app, 'GET', '/model0s'))
+assert response.code == 200, response.body
+print(dumps({{'import': imported - begin, 'first_request': perf_counter() - imported,
+              'jwt': 'jwt' in sys.modules}}))
+'''
+
+
+def measure(directory: Path, runs: int) -> dict[str, object]:
+    imports: list[float] = []
+    firsts: list[float] = []
+    jwt = False
+    for _ in range(runs):
+        result = run([executable, '-c', PROBE.format(root=ROOT)],
+                     cwd=directory, capture_output=True, text=True, check=True)
+        data = loads(result.stdout.splitlines()[-1])
+        imports.append(data['import'])
+        firsts.append(data['first_request'])
+        jwt = data['jwt']
+    return {'import': summary(imports),
+            'first_request': summary(firsts),
+            'jwt_imported': jwt}
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument('--classes', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    with TemporaryDirectory() as name:
+        directory = Path(name)
+        source = HEADER + ''.join(CLASS.format(i=i) for i in range(args.classes))
+        (directory / 'graph.py').write_text(source)
+        print(dumps({
+            'classes': args.classes,
+            **measure(directory, args.runs)
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
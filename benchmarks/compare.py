@@ -0,0 +1,82 @@
+"""Compare two results of `benchmarks.bench_routes`. A scenario regresses
+if its p50 or p99 latency grows, or its throughput drops, by more than the
+threshold. Scenarios of the first result which the second result lacks are
+listed as missing. The exit status is 1 if any scenario regresses or is
+missing.
+
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+from __future__ import annotations
+from typing import Any
+from argparse import ArgumentParser
+from json import loads
+from pathlib import Path
+from sys import exit
+
+
+Key = tuple[str, str, str, int]
+
+
+def _index(path: str) -> dict[Key, dict[str, Any]]:
+    data = loads(Path(path).read_text())
+    return {(r['route'], r['payload'], r['auth'], r['concurrency']): r
+            for r in data['results']}
+
+
+def _change(before: float, after: float) -> float:
+    if before == 0:
+        return 0.0
+    return (after - before) / before * 100
+
+
+def compare(before: dict[Key, dict[str, Any]],
+            after: dict[Key, dict[str, Any]],
+            threshold: float) -> tuple[list[str], int, list[str]]:
+    """Lines describing the changes of the scenarios which both results
+    have, the number of regressed scenarios, and the names of the scenarios
+    missing from `after`.
+    """
+    lines = [f'{"scenario":<36} {"p50 ms":>18} {"p99 ms":>18} {"rps":>18}']
+    regressions = 0
+    for key in sorted(set(before) & set(after)):
+        b, a = before[key], after[key]
+        p50 = _change(b['p50_ms'], a['p50_ms'])
+        p99 = _change(b['p99_ms'], a['p99_ms'])
+        rps = _change(b['rps'], a['rps'])
+        regressed = p50 > threshold or p99 > threshold or -rps > threshold
+        regressions += regressed
+        name = _name(key)
+        lines.append(f'{name:<36} '
+                     f'{a["p50_ms"]:>9.2f} {p50:>+7.1f}% '
+                     f'{a["p99_ms"]:>9.2f} {p99:>+7.1f}% '
+                     f'{a["rps"]:>9.0f} {rps:>+7.1f}%'
+                     f'{"  REGRESSED" if regressed else ""}')
+    missing = [_name(key) for key in sorted(set(before) - set(after))]
+    return lines, regressions, missing
+
+
+def _name(key: Key) -> str:
+    route, payload, auth, concurrency = key
+    return f'{route} {payload} {auth} c={concurrency}'
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percentage of change which is a regression')
+    args = parser.parse_args()
+    lines, regressions, missing = compare(_index(args.before),
+                                          _index(args.after), args.threshold)
+    print('\n'.join(lines))
+    for name in missing:
+        print(f'{name:<36} MISSING')
+    print(f'{regressions} scenarios regressed by more than {args.threshold}%')
+    if len(missing) > 0:
+        print(f'{len(missing)} scenarios are missing')
+    exit(1 if regressions > 0 or len(missing) > 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""This module defines `memory`, an in-memory ORM stand-in for benchmarking
+generated routes without a running database. Query latency can be simulated
+through `latency` to model a slow backend.
+"""
+from __future__ import annotations
+from typing import Any, cast
+from copy import copy
+from datetime import datetime, timezone
+from time import sleep
+from inflection import underscore
+from qsparser import parse
+from jsonclasses.excs import ObjectNotFoundException
+
+
+latency: dict[str, float] = {'find': 0.0, 'id': 0.0, 'write': 0.0}
+"""Seconds each kind of backend operation blocks for."""
+
+
+stores: dict[str, dict[Any, dict[str, Any]]] = {}
+
+
+def _wait(kind: str) -> None:
+    if latency[kind] > 0:
+        sleep(latency[kind])
+
+
+def _filter(arg: Any = None, kwargs: dict[str, Any] | None = None) -> dict[str, Any]:
+    if type(arg) is str:
+        return parse(arg) if arg != '' else {}
+    if isinstance(arg, dict):
+        return arg
+    return kwargs or {}
+
+
+def _comparable(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).isoformat()
+    return value
+
+
+def _coerce(value: Any, like: Any) -> Any:
+    if isinstance(like, datetime):
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')) \
+            .astimezone(timezone.utc).isoformat()
+    if isinstance(like, (int, float)) and not isinstance(like, bool):
+        return type(like)(value)
+    return str(value)
+
+
+def _matches(record: dict[str, Any], matcher: dict[str, Any]) -> bool:
+    for k, v in matcher.items():
+        if k.startswith('_'):
+            continue
+        k = underscore(k)
+        value = record.get(k)
+        if isinstance(v, dict):
+            if value is None:
+                return False
+            for op, operand in v.items():
+                compare = _operators[underscore(op)]
+                if not compare(_comparable(value), _coerce(operand, value)):
+                    return False
+        elif str(_comparable(value)) != str(v):
+            return False
+    return True
+
+
+_operators = {
+    '_gt': lambda a, b: a > b,
+    '_gte': lambda a, b: a >= b,
+    '_lt': lambda a, b: a < b,
+    '_lte': lambda a, b: a <= b,
+}
+
+
+def _sort(records: list[dict[str, Any]], order: Any) -> list[dict[str, Any]]:
+    orders = order if isinstance(order, list) else [order]
+    for item in reversed(orders):
+        desc = item.startswith('-')
+        key = underscore(item.lstrip('-'))
+        records = sorted(records, key=lambda r: _comparable(r.get(key)),
+                         reverse=desc)
+    return records
+
+
+def _load(cls: type, record: dict[str, Any], picks: list[str] | None = None) -> Any:
+    obj = cls()
+    if picks is None:
+        obj.update(**record)
+    else:
+        obj.update(**{k: v for k, v in record.items() if k in picks})
+        setattr(obj, '_is_partial', True)
+        setattr(obj, '_partial_picks', picks)
+    obj._mark_not_new()
+    obj._mark_unmodified()
+    return obj
+
+
+class MemoryQuery:
+
+    def __init__(self, cls: type, matcher: dict[str, Any],
+                 ids: list[Any] | None = None, one: bool = False,
+                 optional: bool = False, iterating: bool = False) -> None:
+        self._cls = cls
+        self._matcher = matcher
+        self._ids = ids
+        self._one = one
+        self._optional = optional
+        self._iterating = iterating
+
+    @property
+    def optional(self) -> MemoryQuery:
+        query = copy(self)
+        query._optional = True
+        return query
+
+    def _records(self) -> list[dict[str, Any]]:
+        store = stores.setdefault(self._cls.__name__, {})
+        if self._ids is not None:
+            records = [store[i] for i in self._ids if i in store]
+        else:
+            records = [r for r in store.values()
+                       if _matches(r, self._matcher)]
+        if self._matcher.get('_order') is not None:
+            records = _sort(records, self._matcher['_order'])
+        skip = int(self._matcher.get('_skip') or 0)
+        limit = self._matcher.get('_limit')
+        records = records[skip:]
+        if limit is not None:
+            records = records[:int(limit)]
+        return records
+
+    def exec(self) -> Any:
+        picks = self._matcher.get('_pick')
+        if self._one:
+            _wait('id')
+            records = self._records()
+            if len(records) == 0:
+                if self._optional:
+                    return None
+                raise ObjectNotFoundException(
+                    f'{self._cls.__name__} not found.')
+            return _load(self._cls, records[0], picks)
+        _wait('find')
+        if self._iterating:
+            return (_load(self._cls, r, picks) for r in self._records())
+        return [_load(self._cls, r, picks) for r in self._records()]
+
+
+def memory(cls: type) -> type:
+    """Install an in-memory backend onto a JSON class.
+    """
+    name = cls.__name__
+    stores[name] = {}
+
+    def find(cls, *args, **kwargs) -> MemoryQuery:
+        return MemoryQuery(cls, _filter(args[0] if args else None, kwargs))
+
+    def one(cls, *args, **kwargs) -> MemoryQuery:
+        return MemoryQuery(cls, _filter(args[0] if args else None, kwargs),
+                           one=True)
+
+    def id(cls, id: Any, *args, **kwargs) -> MemoryQuery:
+        return MemoryQuery(cls, _filter(args[0] if args else None, kwargs),
+                           ids=[id], one=True)
+
+    def ids(cls, ids: list[Any], *args, **kwargs) -> MemoryQuery:
+        return MemoryQuery(cls, _filter(args[0] if args else None, kwargs),
+                           ids=list(ids))
+
+    def iterate(cls, **kwargs) -> MemoryQuery:
+        return MemoryQuery(cls, kwargs, iterating=True)
+
+    def _database_write(self) -> None:
+        _wait('write')
+        record = dict(self._data_dict)
+        for field in self.__class__.cdef.fields:
+            if field.is_local_one_ref:
+                record.pop(field.name, None)
+                record[field.ref_name] = getattr(self, field.ref_name)
+        stores[name][self._id] = record
+
+    def _orm_delete(self) -> None:
+        _wait('write')
+        stores[name].pop(self._id, None)
+
+    cls.find = classmethod(find)
+    cls.one = classmethod(one)
+    cls.id = classmethod(id)
+    cls.ids = classmethod(ids)
+    cls.iterate = classmethod(iterate)
+    cls._database_write = _database_write
+    cls._orm_delete = _orm_delete
+    return cast(type, cls)
@@ -0,0 +1,30 @@
+"""This module defines the JSON classes benchmarks run against.
+"""
+from __future__ import annotations
+from datetime import datetime
+from jsonclasses import jsonclass, types
+from jsonclasses_server import api, authorized
+from .memory import memory
+
+
+@api
+@memory
+@jsonclass
+class Song:
+    id: str = types.readonly.str.primary.mongoid.required
+    name: str
+    year: int | None
+    created_at: datetime = types.readonly.datetime.tscreated.required
+    updated_at: datetime = types.readonly.datetime.tsupdated.required
+
+
+@authorized
+@api(enable='CRUDLE')
+@memory
+@jsonclass
+class User:
+    id: str = types.readonly.str.primary.mongoid.required
+    username: str = types.str.unique.authidentity.required
+    password: str = types.writeonly.str.length(8, 16).authby(types.eq(types.passin)).required
+    created_at: datetime = types.readonly.datetime.tscreated.required
+    updated_at: datetime = types.readonly.datetime.tsupdated.required
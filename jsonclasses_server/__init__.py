@@ -1,3 +1,4 @@
 from .api import api
 from .authorized import authorized
 from .server import server
+from .read_filter import owned_by
@@ -0,0 +1,35 @@
+"""Serve a JSONClasses server app with forked worker processes.
+
+    python -m jsonclasses_server app --workers 4 --port 8000
+
+The module is imported once in the master process. It should define the
+API classes. If the module has an `app` attribute, or an attribute named
+after a colon like `app:server`, that app is served, otherwise the default
+server app is.
+"""
+from __future__ import annotations
+from argparse import ArgumentParser
+from importlib import import_module
+from os import getcwd
+from sys import path
+from thunderlight import gimme
+from .launcher import serve
+
+
+def main() -> None:
+    parser = ArgumentParser(prog='python -m jsonclasses_server')
+    parser.add_argument('app', help='module of the API classes, like app or app:server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--graceful-timeout', type=float, default=30.0)
+    args = parser.parse_args()
+    path.insert(0, getcwd())
+    module_name, _, attr = args.app.partition(':')
+    module = import_module(module_name)
+    app = getattr(module, attr) if attr else getattr(module, 'app', gimme())
+    serve(app, args.host, args.port, args.workers, args.graceful_timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,9 @@ JSONClasses object's API configurations.
 from __future__ import annotations
 from typing import Optional, Callable, Union, cast, final
 from .api_object import APIObject
+from .read_filter import ReadFilter
+from .limits import Limits
+from .ratelimit import RateLimit
 
 
 @final
@@ -21,7 +24,17 @@ class AConf:
                  fname_to_pname: Optional[Callable[[str], str]],
                  pname_to_cname: Optional[Callable[[str], str]],
                  pname_to_fname: Optional[Callable[[str], str]],
-                 cname_to_srname: Optional[Callable[[str], str]]) -> None:
+                 cname_to_srname: Optional[Callable[[str], str]],
+                 streaming: Optional[bool] = None,
+                 page_size: Optional[int] = None,
+                 max_page_size: Optional[int] = None,
+                 cache_ttl: Optional[float] = None,
+                 read_filter: Optional[ReadFilter] = None,
+                 serializer: Optional[str] = None,
+                 coalesce: Optional[bool] = None,
+                 limits: Optional[Limits] = None,
+                 rate_limit: Optional[RateLimit] = None,
+                 changes: Optional[bool] = None) -> None:
         """
         Initialize a new API configuration object.
         """
@@ -35,6 +48,17 @@ class AConf:
         self._pname_to_cname = pname_to_cname
         self._pname_to_fname = pname_to_fname
         self._cname_to_srname = cname_to_srname
+        self._streaming = streaming
+        self._page_size = page_size
+        self._max_page_size = max_page_size
+        self._cache_ttl = cache_ttl
+        self._read_filter = read_filter
+        self._serializer = serializer
+        self._coalesce = coalesce
+        self._limits = limits
+        self._rate_limit = rate_limit
+        self._changes = changes
+        self._default_aconf: AConf | None = None
 
     @property
     def cls(self: AConf) -> type[APIObject]:
@@ -44,9 +68,11 @@ class AConf:
 
     @property
     def default_aconf(self: AConf) -> AConf:
-        from .api_class import API
-        gname = self.cls.cdef.jconf.cgraph.name
-        return API(gname).aconf
+        if self._default_aconf is None:
+            from .api_class import API
+            gname = self.cls.cdef.jconf.cgraph.name
+            self._default_aconf = API(gname).aconf
+        return self._default_aconf
 
     @property
     def name(self: AConf) -> str:
@@ -97,3 +123,95 @@ class AConf:
         if self._cname_to_srname is not None:
             return self._cname_to_srname
         return self.default_aconf.cname_to_srname
+
+    @property
+    def streaming(self: AConf) -> bool:
+        if self._streaming is not None:
+            return self._streaming
+        return self.default_aconf.streaming
+
+    @property
+    def page_size(self: AConf) -> Optional[int]:
+        if self._page_size is not None:
+            return self._page_size
+        if self._cls is None:
+            return None
+        return self.default_aconf.page_size
+
+    @property
+    def max_page_size(self: AConf) -> Optional[int]:
+        if self._max_page_size is not None:
+            return self._max_page_size
+        if self._cls is None:
+            return None
+        return self.default_aconf.max_page_size
+
+    @property
+    def paginated(self: AConf) -> bool:
+        return self.page_size is not None or self.max_page_size is not None
+
+    @property
+    def cache_ttl(self: AConf) -> Optional[float]:
+        """How many seconds read responses are cached. None disables response
+        caching.
+        """
+        if self._cache_ttl is not None:
+            return self._cache_ttl
+        if self._cls is None:
+            return None
+        return self.default_aconf.cache_ttl
+
+    @property
+    def read_filter(self: AConf) -> Optional[ReadFilter]:
+        """The read filter which is merged into list queries.
+        """
+        if self._read_filter is not None:
+            return self._read_filter
+        if self._cls is None:
+            return None
+        return self.default_aconf.read_filter
+
+    @property
+    def serializer(self: AConf) -> str:
+        """How read routes convert objects into JSON. 'tojson' uses each
+        object's `tojson()`, 'compiled' uses a compiled encoder.
+        """
+        if self._serializer is not None:
+            return self._serializer
+        return self.default_aconf.serializer
+
+    @property
+    def coalesce(self: AConf) -> bool:
+        """Whether identical concurrent reads share one fetch.
+        """
+        if self._coalesce is not None:
+            return self._coalesce
+        return self.default_aconf.coalesce
+
+    @property
+    def limits(self: AConf) -> Optional[Limits]:
+        """Request limits which replace the server's limits.
+        """
+        if self._limits is not None:
+            return self._limits
+        if self._cls is None:
+            return None
+        return self.default_aconf.limits
+
+    @property
+    def rate_limit(self: AConf) -> Optional[RateLimit]:
+        """The rate limit of each route of the class.
+        """
+        if self._rate_limit is not None:
+            return self._rate_limit
+        if self._cls is None:
+            return None
+        return self.default_aconf.rate_limit
+
+    @property
+    def changes(self: AConf) -> bool:
+        """Whether writes publish changes to a change feed route.
+        """
+        if self._changes is not None:
+            return self._changes
+        return self.default_aconf.changes
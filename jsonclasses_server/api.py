@@ -3,6 +3,9 @@ from typing import Union, Callable, Optional, overload, cast
 from jsonclasses.jobject import JObject
 from jsonclasses.isjsonclass import isjsonclass
 from .aconf import AConf
+from .read_filter import ReadFilter
+from .limits import Limits
+from .ratelimit import RateLimit
 from .api_object import APIObject
 
 
@@ -20,7 +23,17 @@ def api(
     field_name_to_pathname: Optional[Callable[[str], str]] = None,
     pathname_to_class_name: Optional[Callable[[str], str]] = None,
     pathname_to_field_name: Optional[Callable[[str], str]] = None,
-    class_name_to_singular_resource_name: Optional[Callable[[str], str]] = None
+    class_name_to_singular_resource_name: Optional[Callable[[str], str]] = None,
+    streaming: Optional[bool] = None,
+    page_size: Optional[int] = None,
+    max_page_size: Optional[int] = None,
+    cache_ttl: Optional[float] = None,
+    read_filter: Optional[ReadFilter] = None,
+    serializer: Optional[str] = None,
+    coalesce: Optional[bool] = None,
+    limits: Optional[Limits] = None,
+    rate_limit: Optional[RateLimit] = None,
+    changes: Optional[bool] = None
 ) -> Callable[[type[APIObject]], type[APIObject]]: ...
 
 
@@ -34,7 +47,17 @@ def api(
     field_name_to_pathname: Optional[Callable[[str], str]] = None,
     pathname_to_class_name: Optional[Callable[[str], str]] = None,
     pathname_to_field_name: Optional[Callable[[str], str]] = None,
-    class_name_to_singular_resource_name: Optional[Callable[[str], str]] = None
+    class_name_to_singular_resource_name: Optional[Callable[[str], str]] = None,
+    streaming: Optional[bool] = None,
+    page_size: Optional[int] = None,
+    max_page_size: Optional[int] = None,
+    cache_ttl: Optional[float] = None,
+    read_filter: Optional[ReadFilter] = None,
+    serializer: Optional[str] = None,
+    coalesce: Optional[bool] = None,
+    limits: Optional[Limits] = None,
+    rate_limit: Optional[RateLimit] = None,
+    changes: Optional[bool] = None
 ) -> type[APIObject]: ...
 
 
@@ -47,7 +70,17 @@ def api(
     field_name_to_pathname: Optional[Callable[[str], str]] = None,
     pathname_to_class_name: Optional[Callable[[str], str]] = None,
     pathname_to_field_name: Optional[Callable[[str], str]] = None,
-    class_name_to_singular_resource_name: Optional[Callable[[str], str]] = None
+    class_name_to_singular_resource_name: Optional[Callable[[str], str]] = None,
+    streaming: Optional[bool] = None,
+    page_size: Optional[int] = None,
+    max_page_size: Optional[int] = None,
+    cache_ttl: Optional[float] = None,
+    read_filter: Optional[ReadFilter] = None,
+    serializer: Optional[str] = None,
+    coalesce: Optional[bool] = None,
+    limits: Optional[Limits] = None,
+    rate_limit: Optional[RateLimit] = None,
+    changes: Optional[bool] = None
 ) -> Union[Callable[[type[APIObject]], type[APIObject]], type[APIObject]]:
     from .api_class import API
     if cls is not None:
@@ -63,7 +96,17 @@ def api(
             fname_to_pname=field_name_to_pathname,
             pname_to_cname=pathname_to_class_name,
             pname_to_fname=pathname_to_field_name,
-            cname_to_srname=class_name_to_singular_resource_name)
+            cname_to_srname=class_name_to_singular_resource_name,
+            streaming=streaming,
+            page_size=page_size,
+            max_page_size=max_page_size,
+            cache_ttl=cache_ttl,
+            read_filter=read_filter,
+            serializer=serializer,
+            coalesce=coalesce,
+            limits=limits,
+            rate_limit=rate_limit,
+            changes=changes)
         cls.aconf = aconf
         API(cls.cdef.jconf.cgraph.name).record(cls, aconf)
         return cls
@@ -78,6 +121,16 @@ def api(
                 field_name_to_pathname=field_name_to_pathname,
                 pathname_to_class_name=pathname_to_class_name,
                 pathname_to_field_name=pathname_to_field_name,
-                class_name_to_singular_resource_name=class_name_to_singular_resource_name
+                class_name_to_singular_resource_name=class_name_to_singular_resource_name,
+                streaming=streaming,
+                page_size=page_size,
+                max_page_size=max_page_size,
+                cache_ttl=cache_ttl,
+                read_filter=read_filter,
+                serializer=serializer,
+                coalesce=coalesce,
+                limits=limits,
+                rate_limit=rate_limit,
+                changes=changes
             )
         return parametered_api
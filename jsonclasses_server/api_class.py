@@ -1,19 +1,43 @@
 from __future__ import annotations
 from jsonclasses_server.auth_conf import AuthConf
-from typing import ClassVar, Any, cast
-from qsparser import stringify
+from typing import ClassVar, Any, Iterator, cast
+from qsparser import stringify, parse
 from jsonclasses.ctx import Ctx as JCtx
 from thunderlight import Ctx, get, post, patch, delete
 from .api_object import APIObject
 from .aconf import AConf
-from .jwt_token import encode_jwt_token
+from .route_desc import RouteDesc
+from .jwt_token import encode_jwt_token, signer
+from .executor import run
+from .bulk import (
+    save_many, reload_many, validate_update, iterate_chunks, chunk_size,
+    can_delete_by_query
+)
+from .qsutils import pop_param
+from .stream import stream_items
+from .pagination import Page
+from .operator_cache import invalidate_operator
+from .response_cache import cached, invalidate
+from .coalesce import coalesced
+from .metrics import timed
+from .read_filter import apply_read_filter
+from .limits import check_batch, check_query, limit_body
+from .ratelimit import check_rate
+from .projection import PARAMS
+from .changes import (
+    Subscriber, filters, json_names, publish, queue_size, subscribe
+)
 from .nameutils import (
     cname_to_pname, cname_to_srname, fname_to_pname, pname_to_cname,
     pname_to_fname
 )
+from jsonclasses.excs import UnauthorizedActionException
 from .excs import AuthenticationException
 
 
+SESSION_PARAMS = ('_includes', '_omit', *PARAMS)
+
+
 class API:
 
     _graph_map: dict[str, API] = {}
@@ -37,7 +61,11 @@ class API:
             fname_to_pname=fname_to_pname,
             pname_to_cname=pname_to_cname,
             pname_to_fname=pname_to_fname,
-            cname_to_srname=cname_to_srname)
+            cname_to_srname=cname_to_srname,
+            streaming=False,
+            serializer='tojson',
+            coalesce=False,
+            changes=False)
         self.__class__._initialized_map[graph_name] = True
         return None
 
@@ -49,185 +77,444 @@ class API:
         return self._default_aconf
 
     def record_auth(self: API, cls: type[APIObject], auth_conf: AuthConf) -> None:
-        aconf = cls.aconf
-        auth_conf: AuthConf = cls.auth_conf
-        basename = aconf.name or aconf.cname_to_pname(cls.__name__)
-        url = f'/{basename}/session'
-        ai_fields = cls.cdef._auth_identity_fields
-        ai_names = [f.name for f in ai_fields]
-        ai_json_names = [f.json_name for f in ai_fields]
-        ai_valid_names = set(ai_names + ai_json_names)
-        ab_fields = cls.cdef._auth_by_fields
-        ab_names = [f.name for f in ab_fields]
-        ab_json_names = [f.json_name for f in ab_fields]
-        ab_valid_names = set(ab_names + ab_json_names)
-        auth_conf.info._identities = ai_names
-        auth_conf.info._bys = ab_names
-        srname = aconf.cname_to_srname(cls.__name__)
-        auth_conf.info._srname = srname
+        desc = cls.rdesc
+        auth_conf.info._identities = list(desc.identities)
+        auth_conf.info._bys = list(desc.bys)
+        auth_conf.info._srname = desc.srname
+        ai_valid_names = desc.identity_names
+        ab_valid_names = desc.by_names
+        key_map = desc.key_map
+        srname = desc.srname
+        url = desc.session_url
+        limits = desc.limits
+        rate_limit = auth_conf.rate_limit or desc.rate_limit
+        route = f'POST {url}'
+        projector = desc.projector
+        signer().fields_of(cls)
         @post(url)
         async def create_session(ctx: Ctx):
+            await check_rate(ctx, rate_limit, route)
+            limit_body(ctx, limits)
             body = cast(dict[str, Any], await ctx.req.dict())
-            ai_set = set(body.keys()).intersection(ai_valid_names)
+            ai_set = ai_valid_names.intersection(body.keys())
             len_ai_set = len(ai_set)
             if len_ai_set < 1:
                 raise AuthenticationException('no identity provided')
             if len_ai_set > 1:
                 raise AuthenticationException('multiple identities provided')
-            ab_set = set(body.keys()).intersection(ab_valid_names)
+            ab_set = ab_valid_names.intersection(body.keys())
             len_ab_set = len(ab_set)
             if len_ab_set < 1:
                 raise AuthenticationException('no authentication provided')
             if len_ab_set > 1:
                 raise AuthenticationException('multiple authentications provided')
-            u_ai_name = ai_set.pop()
-            u_ab_name = ab_set.pop()
+            u_ai_name = next(iter(ai_set))
+            u_ab_name = next(iter(ab_set))
             ai_value = body[u_ai_name]
             ab_value = body[u_ab_name]
-            ai_name = cls.cdef.jconf.input_key_strategy(u_ai_name)
-            ab_name = cls.cdef.jconf.input_key_strategy(u_ab_name)
-            obj = cls.one(**{ai_name: ai_value}).optional.exec()
-            if obj is None:
-                raise AuthenticationException('authorizable unit not found')
-            checker = cls.cdef.field_named(ab_name).fdef.auth_by_checker
-            jctx = JCtx.rootctxp(obj, ab_name, getattr(obj, ab_name), ab_value)
-            newval = checker.modifier.transform(jctx)
-            jctx = JCtx.rootctxp(obj, ab_name, newval, ab_value)
-            checker.modifier.validate(jctx)
-            token = encode_jwt_token(obj, auth_conf.expires_in)
-            srname = auth_conf.info.srname
-            json_obj = obj.opby(obj).tojson()
-            if ctx.req.qs != '':
-                json_obj = cls.id(obj._id, ctx.req.qs).exec().opby(obj).tojson()
-            result = {'token': token, srname: json_obj}
+            ai_name = key_map[u_ai_name]
+            ab_name = key_map[u_ab_name]
+            url_qs = ctx.req.qs
+            check_query(url_qs, limits)
+            # only the output shape is taken from the query string, the
+            # identity lookup can't be filtered by clients
+            query = parse(url_qs) if url_qs != '' else {}
+            reload = {k: v for k, v in query.items() if k in SESSION_PARAMS}
+            projection = projector.project(stringify(reload))
+            def create_session_sync() -> dict[str, Any]:
+                obj = cls.one(**{ai_name: ai_value}).optional.exec()
+                if obj is None:
+                    raise AuthenticationException('authorizable unit not found')
+                checker = cls.cdef.field_named(ab_name).fdef.auth_by_checker
+                jctx = JCtx.rootctxp(obj, ab_name, getattr(obj, ab_name), ab_value)
+                newval = checker.modifier.transform(jctx)
+                jctx = JCtx.rootctxp(obj, ab_name, newval, ab_value)
+                checker.modifier.validate(jctx)
+                token = encode_jwt_token(obj, auth_conf.expires_in)
+                if len(reload) > 0:
+                    obj = cls.id(obj._id, projection.qs).exec()
+                json_obj = projection.trim(obj.opby(obj).tojson())
+                return {'token': token, srname: json_obj}
+            result = await run(create_session_sync)
             ctx.res.json({"data": result})
 
     def record(self: API, cls: type[APIObject], aconf: AConf) -> None:
-        name = aconf.name or aconf.cname_to_pname(cls.__name__)
-        url = f'/{name}'
-        id_url = f'{url}/:id'
-        e_url = f'{url}/ensure'
-        if 'L' in aconf.actions:
-            self.record_l(cls, url)
-        if 'E' in aconf.actions:
-            self.record_e(cls, e_url)
-        if 'R' in aconf.actions:
-            self.record_r(cls, id_url)
-        if 'C' in aconf.actions:
-            self.record_c(cls, url)
-        if 'U' in aconf.actions:
-            self.record_u(cls, id_url)
-            self.record_um(cls, url)
-        if 'D' in aconf.actions:
-            self.record_d(cls, id_url)
-            self.record_dm(cls, url)
-
-    def record_l(self: API, cls: type[APIObject], url: str) -> None:
-        @get(url)
+        desc = RouteDesc(cls, aconf)
+        cls.rdesc = desc
+        actions = desc.actions
+        if 'L' in actions:
+            self.record_l(desc)
+        if desc.changes:
+            self.record_changes(desc)
+        if 'E' in actions:
+            self.record_e(desc)
+        if 'R' in actions:
+            self.record_r(desc)
+        if 'C' in actions:
+            self.record_c(desc)
+        if 'U' in actions:
+            self.record_u(desc)
+            self.record_um(desc)
+        if 'D' in actions:
+            self.record_d(desc)
+            self.record_dm(desc)
+
+    def record_l(self: API, desc: RouteDesc) -> None:
+        cls = desc.cls
+        ttl = desc.cache_ttl
+        read_filter = desc.read_filter
+        encode = desc.encode
+        coalesce = desc.coalesce
+        limits = desc.limits
+        rate_limit = desc.rate_limit
+        route = f'GET {desc.url}'
+        projector = desc.projector
+        @get(desc.url)
         async def list_all(ctx: Ctx):
-            result = cls.find(ctx.req.qs).exec()
-            filtered = []
-            for item in result:
-                try:
-                    filtered.append(item.opby(ctx.state.operator).tojson())
-                except Exception as e:
-                    continue
-            ctx.res.json({ 'data': filtered })
-
-    def record_r(self: API, cls: type[APIObject], url: str) -> None:
-        @get(url)
+            await check_rate(ctx, rate_limit, route)
+            check_query(ctx.req.qs, limits)
+            operator = ctx.state.operator
+            fqs = apply_read_filter(read_filter, cls, operator, ctx.req.qs)
+            visible = fqs is not None
+            qs = fqs if fqs is not None else ctx.req.qs
+            if desc.paginated:
+                page = Page(cls, qs, desc.page_size, desc.max_page_size)
+                projection = projector.project(page.qs)
+                trim = projection.trim
+                def list_page_sync() -> dict[str, Any]:
+                    with timed('query'):
+                        items = cls.find(projection.qs).exec() if visible else []
+                    def fetch(qs: str) -> list[APIObject]:
+                        return cls.find(projector.project(qs).qs).exec()
+                    items, page_info = page.info(items, fetch)
+                    filtered = []
+                    with timed('authorize'):
+                        for item in items:
+                            try:
+                                filtered.append(trim(encode(item.opby(operator))))
+                            except Exception as e:
+                                continue
+                    return {'data': filtered, 'pageInfo': page_info}
+                async def list_page_data() -> dict[str, Any]:
+                    return await run(list_page_sync)
+                if ttl is not None:
+                    await cached(ctx, cls, None, ttl, list_page_data, coalesce)
+                    return
+                if coalesce:
+                    await coalesced(ctx, cls, None, list_page_data)
+                    return
+                ctx.res.json(await list_page_data())
+                return
+            projection = projector.project(qs)
+            qs = projection.qs
+            trim = projection.trim
+            if desc.streaming:
+                def encode_item(item: APIObject) -> dict[str, Any] | None:
+                    try:
+                        return trim(encode(item.opby(operator)))
+                    except Exception as e:
+                        return None
+                def iterate_sync() -> Iterator[APIObject]:
+                    if not visible:
+                        return iter(())
+                    return iter(cls.iterate(**parse(qs)).exec())
+                await stream_items(ctx, await run(iterate_sync), encode_item)
+                return
+            def list_all_sync() -> list[dict[str, Any]]:
+                with timed('query'):
+                    result = cls.find(qs).exec() if visible else []
+                filtered = []
+                with timed('authorize'):
+                    for item in result:
+                        try:
+                            filtered.append(trim(encode(item.opby(operator))))
+                        except Exception as e:
+                            continue
+                return filtered
+            async def list_all_data() -> dict[str, Any]:
+                return {'data': await run(list_all_sync)}
+            if ttl is not None:
+                await cached(ctx, cls, None, ttl, list_all_data, coalesce)
+                return
+            if coalesce:
+                await coalesced(ctx, cls, None, list_all_data)
+                return
+            ctx.res.json(await list_all_data())
+
+    def record_changes(self: API, desc: RouteDesc) -> None:
+        cls = desc.cls
+        read_filter = desc.read_filter
+        encode = desc.encode
+        limits = desc.limits
+        rate_limit = desc.rate_limit
+        route = f'GET {desc.changes_url}'
+        projector = desc.projector
+        names = json_names(cls)
+        @get(desc.changes_url)
+        async def changes(ctx: Ctx):
+            await check_rate(ctx, rate_limit, route)
+            check_query(ctx.req.qs, limits)
+            operator = ctx.state.operator
+            qs = apply_read_filter(read_filter, cls, operator, ctx.req.qs)
+            if qs is None:
+                raise UnauthorizedActionException('changes are not readable')
+            projection = projector.project(qs)
+            query = parse(projection.base_qs) if projection.base_qs != '' else {}
+            subscriber = Subscriber(cls, operator, encode, projection,
+                                    filters(query, names), queue_size())
+            subscribe(ctx, subscriber)
+
+    def record_r(self: API, desc: RouteDesc) -> None:
+        cls = desc.cls
+        ttl = desc.cache_ttl
+        encode = desc.encode
+        coalesce = desc.coalesce
+        limits = desc.limits
+        rate_limit = desc.rate_limit
+        route = f'GET {desc.id_url}'
+        projector = desc.projector
+        @get(desc.id_url)
         async def read_by_id(ctx: Ctx):
+            await check_rate(ctx, rate_limit, route)
             id = ctx.req.args['id']
-            result = cls.id(id, ctx.req.qs).exec().opby(ctx.state.operator)
-            ctx.res.json({'data': result.tojson()})
+            qs = ctx.req.qs
+            check_query(qs, limits)
+            projection = projector.project(qs)
+            operator = ctx.state.operator
+            def read_by_id_sync() -> dict[str, Any]:
+                with timed('query'):
+                    result = cls.id(id, projection.qs).exec()
+                with timed('authorize'):
+                    return projection.trim(encode(result.opby(operator)))
+            async def read_by_id_data() -> dict[str, Any]:
+                return {'data': await run(read_by_id_sync)}
+            if ttl is not None:
+                await cached(ctx, cls, id, ttl, read_by_id_data, coalesce)
+                return
+            if coalesce:
+                await coalesced(ctx, cls, id, read_by_id_data)
+                return
+            ctx.res.json(await read_by_id_data())
 
-    def record_c(self: API, cls: type[APIObject], url: str) -> None:
-        @post(url)
+    def record_c(self: API, desc: RouteDesc) -> None:
+        cls = desc.cls
+        changes = desc.changes
+        limits = desc.limits
+        rate_limit = desc.rate_limit
+        route = f'POST {desc.url}'
+        projector = desc.projector
+        @post(desc.url)
         async def create(ctx: Ctx):
+            await check_rate(ctx, rate_limit, route)
+            limit_body(ctx, limits)
             resource = await ctx.req.dict()
             url_qs = ctx.req.qs
-            upsert: dict[str, Any] = resource.get('_upsert')
-            create = resource.get('_create')
-            if upsert and create is None:
-                qs = stringify(upsert.get('_query'))
-                qs = qs if url_qs == '' else f'{qs}&{url_qs}'
-                input_data = upsert.get('_data')
-                if input_data is not None:
-                    result = cls.one(qs).optional.exec()
-                    if result:
-                        result.opby(ctx.state.operator).set(**input_data).save()
-                    else:
-                        result = cls(**input_data).opby(ctx.state.operator).save()
-                    ctx.res.json({"data": result.tojson()})
-            elif create and upsert is None:
-                if isinstance(create, list):
-                    result: list[dict[str, Any]] = []
-                    for i in create:
-                        i_result = cls(**(i or {})).opby(ctx.state.operator).save()
-                        op = getattr(i_result, '_operator')
+            check_query(url_qs, limits)
+            projection = projector.project(url_qs)
+            trim = projection.trim
+            if isinstance(resource.get('_create'), list):
+                check_batch(len(resource['_create']), limits)
+            operator = ctx.state.operator
+            created: list[APIObject] = []
+            updated: list[APIObject] = []
+            def create_sync() -> Any:
+                upsert: dict[str, Any] = resource.get('_upsert')
+                create = resource.get('_create')
+                if upsert and create is None:
+                    qs = stringify(upsert.get('_query'))
+                    base_qs = projection.base_qs
+                    qs = qs if base_qs == '' else f'{qs}&{base_qs}'
+                    check_query(qs, limits)
+                    input_data = upsert.get('_data')
+                    if input_data is not None:
+                        result = cls.one(qs).optional.exec()
+                        if result:
+                            result.opby(operator).set(**input_data).save()
+                            invalidate_operator(result)
+                            updated.append(result)
+                        else:
+                            result = cls(**input_data).opby(operator).save()
+                            created.append(result)
+                        return trim(result.tojson())
+                elif create and upsert is None:
+                    if isinstance(create, list):
+                        objs = [cls(**(i or {})).opby(operator) for i in create]
+                        objs = save_many(cls, objs)
+                        created.extend(objs)
+                        if url_qs != '':
+                            objs = reload_many(cls, objs, projection.qs)
+                        return [trim(obj.tojson()) for obj in objs]
+                    elif isinstance(create, dict):
+                        data = create.get('_data')
+                        result = cls(**(data or {})).opby(operator).save()
+                        created.append(result)
+                        op = getattr(result, '_operator')
                         if url_qs != '':
-                            i_result = cls.id(i_result._id, url_qs).exec().opby(op)
-                        result.append(i_result.tojson())
-                    ctx.res.json({"data": result})
-                elif isinstance(create, dict):
-                    data = create.get('_data')
-                    result = cls(**(data or {})).opby(ctx.state.operator).save()
+                            result = cls.id(result._id, projection.qs).exec().opby(op)
+                        return trim(result.tojson())
+                else:
+                    result = cls(**(resource or {})).opby(operator).save()
+                    created.append(result)
                     op = getattr(result, '_operator')
                     if url_qs != '':
-                        result = cls.id(result._id, url_qs).exec().opby(op)
-                    ctx.res.json({"data": result.tojson()})
-            else:
-                result = cls(**(resource or {})).opby(ctx.state.operator).save()
-                op = getattr(result, '_operator')
-                if url_qs != '':
-                    result = cls.id(result._id, url_qs).exec().opby(op)
-                ctx.res.json({"data": result.tojson()})
-
-    def record_u(self: API, cls: type[APIObject], url: str) -> None:
-        @patch(url)
+                        result = cls.id(result._id, projection.qs).exec().opby(op)
+                    return trim(result.tojson())
+                return None
+            result = await run(create_sync)
+            await invalidate(cls)
+            if changes:
+                await publish(cls, 'create', created)
+                await publish(cls, 'update', updated)
+            if result is not None:
+                ctx.res.json({"data": result})
+
+    def record_u(self: API, desc: RouteDesc) -> None:
+        cls = desc.cls
+        changes = desc.changes
+        limits = desc.limits
+        rate_limit = desc.rate_limit
+        route = f'PATCH {desc.id_url}'
+        @patch(desc.id_url)
         async def update_one(ctx: Ctx):
+            await check_rate(ctx, rate_limit, route)
             id = ctx.req.args['id']
+            limit_body(ctx, limits)
             body = await ctx.req.dict()
-            result = cls.id(id, ctx.req.qs).exec().opby(ctx.state.operator).set(**(body or {})).save()
-            ctx.res.json({'data': result.tojson()})
+            qs = ctx.req.qs
+            check_query(qs, limits)
+            operator = ctx.state.operator
+            updated: list[APIObject] = []
+            def update_one_sync() -> dict[str, Any]:
+                result = cls.id(id, qs).exec().opby(operator).set(**(body or {})).save()
+                invalidate_operator(result)
+                updated.append(result)
+                return result.tojson()
+            result = await run(update_one_sync)
+            await invalidate(cls)
+            if changes:
+                await publish(cls, 'update', updated)
+            ctx.res.json({'data': result})
 
 
-    def record_um(self: API, cls: type[APIObject], url: str) -> None:
-        @patch(url)
+    def record_um(self: API, desc: RouteDesc) -> None:
+        cls = desc.cls
+        changes = desc.changes
+        limits = desc.limits
+        rate_limit = desc.rate_limit
+        route = f'PATCH {desc.url}'
+        @patch(desc.url)
         async def update_many(ctx: Ctx):
+            await check_rate(ctx, rate_limit, route)
+            limit_body(ctx, limits)
             resource = await ctx.req.dict()
             update = resource.get('_update')
             uq = stringify(update['_query'])
-            qs = uq if ctx.req.qs == '' else f'{uq}&{ctx.req.qs}'
-            result = cls.find(qs).exec()
-            updated = []
-            for item in result:
-                updated.append(item.opby(ctx.state.operator).set(**(update['_data'] or {})).save().tojson())
-            ctx.res.json({'data': updated})
-
-    def record_d(self: API, cls: type[APIObject], url: str) -> None:
-        @delete(url)
+            url_qs, ret = pop_param(ctx.req.qs, '_return')
+            qs = uq if url_qs == '' else f'{uq}&{url_qs}'
+            check_query(qs, limits)
+            data = update['_data'] or {}
+            operator = ctx.state.operator
+            changed: list[APIObject] = []
+            def update_many_sync() -> Any:
+                validate_update(cls, data)
+                updated: list[Any] = []
+                count = 0
+                for chunk in iterate_chunks(cls, qs, chunk_size()):
+                    for item in chunk:
+                        item.opby(operator).set(**data)
+                    save_many(cls, chunk)
+                    if changes:
+                        changed.extend(chunk)
+                    for item in chunk:
+                        invalidate_operator(item)
+                        if ret == 'ids':
+                            updated.append(item._id)
+                        elif ret is None:
+                            updated.append(item.tojson())
+                    count += len(chunk)
+                return {'count': count} if ret == 'count' else updated
+            try:
+                result = await run(update_many_sync)
+            finally:
+                await invalidate(cls)
+                if changes:
+                    await publish(cls, 'update', changed)
+            ctx.res.json({'data': result})
+
+    def record_d(self: API, desc: RouteDesc) -> None:
+        cls = desc.cls
+        changes = desc.changes
+        rate_limit = desc.rate_limit
+        route = f'DELETE {desc.id_url}'
+        @delete(desc.id_url)
         async def delete_by_id(ctx: Ctx) -> None:
+            await check_rate(ctx, rate_limit, route)
             id = ctx.req.args['id']
-            cls.id(id).exec().opby(ctx.state.operator).delete()
+            operator = ctx.state.operator
+            deleted: list[APIObject] = []
+            def delete_by_id_sync() -> None:
+                result = cls.id(id).exec().opby(operator).delete()
+                invalidate_operator(result)
+                deleted.append(result)
+            await run(delete_by_id_sync)
+            await invalidate(cls)
+            if changes:
+                await publish(cls, 'delete', deleted)
             ctx.res.empty()
 
-    def record_dm(self: API, cls: type[APIObject], url: str) -> None:
-        @delete(url)
+    def record_dm(self: API, desc: RouteDesc) -> None:
+        cls = desc.cls
+        changes = desc.changes
+        limits = desc.limits
+        rate_limit = desc.rate_limit
+        route = f'DELETE {desc.url}'
+        @delete(desc.url)
         async def delete_by_id(ctx: Ctx) -> None:
-            result = cls.find(ctx.req.qs).exec()
-            for item in result:
-                item.opby(ctx.state.operator).delete()
-            ctx.res.empty()
+            await check_rate(ctx, rate_limit, route)
+            qs, ret = pop_param(ctx.req.qs, '_return')
+            check_query(qs, limits)
+            operator = ctx.state.operator
+            changed: list[APIObject] = []
+            by_query = ret != 'ids' and can_delete_by_query(cls)
+            def delete_many_sync() -> Any:
+                if by_query:
+                    return {'count': cls.delete_many(qs)}
+                deleted: list[Any] = []
+                count = 0
+                for chunk in iterate_chunks(cls, qs, chunk_size()):
+                    for item in chunk:
+                        item.opby(operator).delete()
+                        invalidate_operator(item)
+                        if changes:
+                            changed.append(item)
+                        if ret == 'ids':
+                            deleted.append(item._id)
+                    count += len(chunk)
+                return deleted if ret == 'ids' else {'count': count}
+            try:
+                result = await run(delete_many_sync)
+            finally:
+                await invalidate(cls)
+                if changes:
+                    # objects deleted by a query aren't known
+                    await publish(cls, 'reset' if by_query else 'delete', changed)
+            if ret is None:
+                ctx.res.empty()
+            else:
+                ctx.res.json({'data': result})
 
-    def record_e(self: API, cls: type[APIObject], url: str) -> None:
-        @post(url)
+    def record_e(self: API, desc: RouteDesc) -> None:
+        cls = desc.cls
+        changes = desc.changes
+        limits = desc.limits
+        rate_limit = desc.rate_limit
+        route = f'POST {desc.e_url}'
+        @post(desc.e_url)
         async def e(ctx: Ctx) -> Any:
+            await check_rate(ctx, rate_limit, route)
+            limit_body(ctx, limits)
             body = await ctx.req.dict()
-            ufields = cls.cdef._unique_fields
-            unames = [f.name for f in ufields]
-            ujsonnames = [f.json_name for f in ufields]
-            uvalidnames = set(unames + ujsonnames)
+            uvalidnames = desc.unique_names
             matcher: dict[str, Any] = {}
             updater: dict[str, Any] = {}
             for k, v in body.items():
@@ -236,12 +523,25 @@ class API:
                         matcher[k] = v
                 else:
                     updater[k] = v
-            result = cls.one(matcher).optional.exec()
-            if result:
-                result.opby(ctx.state.operator).set(**updater).save()
-            else:
-                result = cls(**body).opby(ctx.state.operator).save()
-            ctx.res.json({'data': result.tojson()})
+            operator = ctx.state.operator
+            created: list[APIObject] = []
+            updated: list[APIObject] = []
+            def e_sync() -> dict[str, Any]:
+                result = cls.one(matcher).optional.exec()
+                if result:
+                    result.opby(operator).set(**updater).save()
+                    invalidate_operator(result)
+                    updated.append(result)
+                else:
+                    result = cls(**body).opby(operator).save()
+                    created.append(result)
+                return result.tojson()
+            result = await run(e_sync)
+            await invalidate(cls)
+            if changes:
+                await publish(cls, 'create', created)
+                await publish(cls, 'update', updated)
+            ctx.res.json({'data': result})
 
 
 API.default = API('default')
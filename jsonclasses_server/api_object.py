@@ -3,8 +3,10 @@ from typing import ClassVar, TYPE_CHECKING
 from jsonclasses.orm import ORMObject
 if TYPE_CHECKING:
     from .aconf import AConf
+    from .route_desc import RouteDesc
 
 
 class APIObject(ORMObject):
 
     aconf: ClassVar[AConf]
+    rdesc: ClassVar[RouteDesc]
@@ -2,8 +2,9 @@
 JSONClasses object's authorization configurations.
 """
 from __future__ import annotations
-from typing import final
+from typing import Optional, final
 from datetime import timedelta
+from .ratelimit import RateLimit
 
 
 @final
@@ -35,17 +36,26 @@ class AuthConf:
     configurations.
     """
 
-    def __init__(self: AuthConf, expires_in: timedelta | None = None) -> None:
+    def __init__(self: AuthConf,
+                 expires_in: timedelta | None = None,
+                 rate_limit: Optional[RateLimit] = None) -> None:
         """
         Initialize a new AuthConf configuration object.
         """
         self._expires_in = expires_in
+        self._rate_limit = rate_limit
         self._info = AuthInfo()
 
     @property
     def expires_in(self: AuthConf) -> timedelta:
         return self._expires_in or timedelta(365)
 
+    @property
+    def rate_limit(self: AuthConf) -> Optional[RateLimit]:
+        """The rate limit of the session route.
+        """
+        return self._rate_limit
+
     @property
     def info(self: AuthConf) -> AuthInfo:
         return self._info
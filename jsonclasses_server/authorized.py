@@ -4,6 +4,7 @@ from datetime import timedelta
 from jsonclasses.isjsonclass import isjsonclass
 from .api_object import APIObject
 from .auth_conf import AuthConf
+from .ratelimit import RateLimit
 
 
 @overload
@@ -12,8 +13,9 @@ def authorized(cls: type[APIObject]) -> type[APIObject]: ...
 
 @overload
 def authorized(
-    cls: None,
+    cls: None = None,
     expires_in: Optional[timedelta] = None,
+    rate_limit: Optional[RateLimit] = None,
 ) -> Callable[[type[APIObject]], type[APIObject]]: ...
 
 
@@ -21,12 +23,14 @@ def authorized(
 def authorized(
     cls: type[APIObject],
     expires_in: Optional[timedelta] = None,
+    rate_limit: Optional[RateLimit] = None,
 ) -> type[APIObject]: ...
 
 
 def authorized(
-    cls: Union[type[APIObject], None],
+    cls: Union[type[APIObject], None] = None,
     expires_in: Optional[timedelta] = None,
+    rate_limit: Optional[RateLimit] = None,
 ) -> Union[Callable[[type[APIObject]], type[APIObject]], type[APIObject]]:
     from .api_class import API
     if cls is not None:
@@ -34,11 +38,11 @@ def authorized(
             raise ValueError('@authorized should be used to decorate a '
                              'JSONClass class.')
         cls = cast(type[APIObject], cls)
-        auth_conf = AuthConf(expires_in=expires_in)
+        auth_conf = AuthConf(expires_in=expires_in, rate_limit=rate_limit)
         cls.auth_conf = auth_conf
         API(cls.cdef.jconf.cgraph.name).record_auth(cls, auth_conf)
         return cls
     else:
         def parametered_api(cls):
-            return authorized(cls, expires_in=expires_in)
+            return authorized(cls, expires_in=expires_in, rate_limit=rate_limit)
         return parametered_api
@@ -0,0 +1,152 @@
+"""This module implements batch requests. A batch request carries many
+sub-requests which are dispatched to the route handlers of the app with the
+operator of the batch request, so that the operator is resolved once. Each
+sub-request takes a token of the server rate limit and is recorded in the
+metrics like a request.
+"""
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Optional, Union
+from asyncio import gather
+from re import sub
+from time import perf_counter
+from thunderlight import App, Ctx
+from thunderlight.req import Req
+from thunderlight.res import Res
+from thunderlight.json import JSON
+from jsonclasses.excs import ValidationException
+from .stream import StreamingRes
+from .limits import check_batch, limit_body, server_limits
+from .metrics import metrics, request_route
+from .profiling import profiler
+from .ratelimit import RateLimit, check_rate
+
+
+BATCH_PATH = '/_batch'
+STREAM_SEGMENTS = ('_changes', '_stream')
+json = JSON()
+
+
+def _sub_requests(body: Any) -> tuple[list[dict[str, Any]], bool]:
+    if not isinstance(body, dict) or not isinstance(body.get('requests'), list):
+        raise ValidationException({'requests': 'value is not list'}, None)
+    items = body['requests']
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise ValidationException({f'requests.{index}.path': 'value is not str'}, None)
+    return items, body.get('concurrent') is True
+
+
+def _scope(parent: dict[str, Any], item: dict[str, Any], body: bytes) -> dict[str, Any]:
+    path, _, qs = item['path'].partition('?')
+    qs = item.get('query') or qs
+    headers = [(k, v) for (k, v) in parent['headers']
+               if k not in (b'content-type', b'content-length')]
+    headers.append((b'content-type', b'application/json'))
+    headers.append((b'content-length', str(len(body)).encode('utf-8')))
+    return {
+        **parent,
+        'method': (item.get('method') or 'GET').upper(),
+        'path': path,
+        'raw_path': path.encode('utf-8'),
+        'query_string': qs.encode('utf-8'),
+        'headers': headers
+    }
+
+
+async def _dispatch(app: App,
+                    ctx: Ctx,
+                    item: dict[str, Any],
+                    on_error: Callable[[Ctx, Exception], Awaitable[None]]) -> bytes:
+    body = json.encode(item['body']) if item.get('body') is not None else b''
+    scope = _scope(ctx.req._scope, item, body)
+    async def receive() -> dict[str, Any]:
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    path = scope['path']
+    path = sub('/$', '', path) if len(path) > 1 else path
+    args, handler = app._args_and_handler(scope['method'], path)
+    sctx = Ctx(Req(scope, receive, args, path, json), Res(json))
+    sctx.state.operator = ctx.state.operator
+    if path == BATCH_PATH:
+        _reject(sctx, 'batch requests can\'t be nested')
+    elif path.rsplit('/', 1)[-1] in STREAM_SEGMENTS:
+        _reject(sctx, 'event streams can\'t be batched')
+    else:
+        start = perf_counter()
+        try:
+            await handler(sctx)
+        except Exception as e:
+            await on_error(sctx, e)
+        _observe(app, sctx, perf_counter() - start)
+        res = sctx.res
+        if isinstance(res, StreamingRes) and \
+                res.headers.get('content-type') == 'text/event-stream':
+            # event streams don't end, they can't be collected
+            await res._chunks.aclose()
+            sctx = Ctx(sctx.req, Res(json))
+            _reject(sctx, 'event streams can\'t be batched')
+    return await _result(sctx.res)
+
+
+def _observe(app: App, ctx: Ctx, seconds: float) -> None:
+    recorder = metrics()
+    if recorder.enabled:
+        recorder.observe(ctx.req.method, request_route(app, ctx),
+                         ctx.res.code, seconds)
+    if profiler().enabled:
+        profiler().observe(app, ctx, seconds)
+
+
+def _reject(ctx: Ctx, message: str) -> None:
+    ctx.res.code = 400
+    ctx.res.json({'error': {'type': 'BadRequest', 'message': message}})
+
+
+async def _result(res: Res) -> bytes:
+    if isinstance(res, StreamingRes):
+        body: Union[bytes, str, None] = b''.join([c async for c in res._chunks])
+    else:
+        body = res.body
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    ctype = res.headers.get('content-type')
+    if not body:
+        body = b'null'
+    elif ctype is not None and not ctype.startswith('application/'):
+        body = json.encode(body.decode('utf-8'))
+    return b'{"status":%d,"body":%s}' % (res.code, body)
+
+
+async def handle_batch(app: App,
+                       ctx: Ctx,
+                       on_error: Callable[[Ctx, Exception], Awaitable[None]],
+                       rate_limit: Optional[RateLimit] = None) -> None:
+    """Dispatch the sub-requests of a batch request in order and respond with
+    the status and the body of each. With `concurrent`, each run of adjacent
+    GET sub-requests is dispatched concurrently. `rate_limit` is the server
+    rate limit, which already took a token for the batch request itself.
+    """
+    limits = server_limits()
+    limit_body(ctx, limits)
+    items, concurrent = _sub_requests(await ctx.req.json())
+    check_batch(len(items), limits)
+    await check_rate(ctx, rate_limit, '*', len(items) - 1)
+    results: list[bytes] = []
+    index = 0
+    while index < len(items):
+        end = index + 1
+        if concurrent:
+            while end < len(items) and _is_read(items[index]) and _is_read(items[end]):
+                end += 1
+        group = items[index:end]
+        if len(group) == 1:
+            results.append(await _dispatch(app, ctx, group[0], on_error))
+        else:
+            results.extend(await gather(*[_dispatch(app, ctx, item, on_error)
+                                          for item in group]))
+        index = end
+    ctx.res.headers['content-type'] = 'application/json'
+    ctx.res.body = b'{"data":[' + b','.join(results) + b']}'
+
+
+def _is_read(item: dict[str, Any]) -> bool:
+    return (item.get('method') or 'GET').upper() == 'GET'
@@ -0,0 +1,108 @@
+"""This module contains helpers for writing and reloading many objects of a
+class with as few backend round trips as the ORM integration allows.
+"""
+from __future__ import annotations
+from typing import Any, Iterator
+from qsparser import parse, stringify
+from jsonclasses.excs import ObjectNotFoundException, ValidationException
+from jsonclasses.uconf import uconf
+from .api_object import APIObject
+
+
+def chunk_size() -> int:
+    """The number of objects bulk updates and deletes process at once. It's
+    configured with `bulk.chunkSize` of the user config.
+    """
+    return uconf().get('bulk.chunk_size') or 500
+
+
+def save_many(cls: type[APIObject], objs: list[APIObject]) -> list[APIObject]:
+    """Save objects of `cls`. If the ORM integration provides a batched
+    `save_many` class method, all objects are written with it at once.
+    Otherwise, objects are saved one by one.
+    """
+    if len(objs) == 0:
+        return objs
+    writer = getattr(cls, 'save_many', None)
+    if writer is not None:
+        return writer(objs)
+    return [obj.save() for obj in objs]
+
+
+def reload_many(cls: type[APIObject],
+                objs: list[APIObject],
+                qs: str) -> list[APIObject]:
+    """Refetch saved objects with the includes of `qs` in a single query.
+    The result keeps the order and the operators of `objs`. If an object
+    isn't refetched, `ObjectNotFoundException` is raised.
+    """
+    if len(objs) == 0:
+        return objs
+    fetched: dict[Any, APIObject] = {}
+    for item in cls.ids([obj._id for obj in objs], qs).exec():
+        fetched[item._id] = item
+    result: list[APIObject] = []
+    for obj in objs:
+        item = fetched.get(obj._id)
+        if item is None:
+            raise ObjectNotFoundException(
+                f'{cls.__name__}(_id={obj._id}) not found.')
+        result.append(item.opby(getattr(obj, '_operator')))
+    return result
+
+
+def validate_update(cls: type[APIObject], data: dict[str, Any]) -> None:
+    """Validate update data against the class definition once, before any
+    object is loaded. Only errors of the updated fields are reported.
+    """
+    probe = cls()
+    probe.set(**data)
+    try:
+        probe.validate(all_fields=True)
+    except ValidationException as e:
+        jconf = cls.cdef.jconf
+        names = {jconf.output_key_strategy(jconf.input_key_strategy(k))
+                 for k in data.keys()}
+        messages = {k: v for k, v in e.keypath_messages.items()
+                    if k.split('.')[0] in names}
+        if len(messages) > 0:
+            raise ValidationException(messages, probe) from None
+
+
+def iterate_chunks(cls: type[APIObject],
+                   qs: str,
+                   size: int) -> Iterator[list[APIObject]]:
+    """Iterate objects matching `qs`, `size` objects a time, so that matched
+    objects are never held in memory at once. The ids of matched objects are
+    collected first, so that writing the objects doesn't change which ones
+    are visited. Then objects are fetched by ids chunk by chunk.
+    """
+    query = parse(qs) if qs != '' else {}
+    includes = {k: v for k, v in query.items() if k == '_includes'}
+    query.pop('_includes', None)
+    query['_pick'] = [cls.cdef.primary_field.name]
+    ids = [item._id for item in cls.iterate(**query).exec()]
+    ids_qs = stringify(includes)
+    for start in range(0, len(ids), size):
+        chunk_ids = ids[start:start + size]
+        fetched = {item._id: item for item in cls.ids(chunk_ids, ids_qs).exec()}
+        chunk = [fetched[id] for id in chunk_ids if id in fetched]
+        if len(chunk) > 0:
+            yield chunk
+
+
+def can_delete_by_query(cls: type[APIObject]) -> bool:
+    """Whether objects of `cls` can be deleted with one set based query. This
+    requires a batched `delete_many` class method from the ORM integration,
+    and no per-object authorization, callbacks or delete rules.
+    """
+    if getattr(cls, 'delete_many', None) is None:
+        return False
+    if hasattr(cls, 'auth_conf'):
+        return False
+    cdef = cls.cdef
+    if cdef.jconf.can_delete or cdef.jconf.on_delete:
+        return False
+    if cdef.deny_fields or cdef.nullify_fields or cdef.cascade_fields:
+        return False
+    return True
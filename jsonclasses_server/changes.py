@@ -0,0 +1,425 @@
+"""This module implements change feeds. Classes decorated with
+`@api(changes=True)` publish a change whenever objects are created, updated
+or deleted through the generated routes, and clients subscribe to them with
+server-sent events at `GET /<resource>/_changes` instead of polling the list
+route.
+
+Changes go through a change backend, which fans them out to the change hub
+of each process. The hub encodes each change once per subscribing operator,
+checks that the operator can read the object, applies the subscriber's
+filters and fields, and queues the event on each subscriber. A subscriber's
+queue is bounded. When a slow client falls behind, its queued events are
+dropped and replaced with a `reset` event, which tells the client to fetch
+the list again.
+"""
+from __future__ import annotations
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, final
+from asyncio import Event, TimeoutError, create_task, wait_for
+from collections import deque
+from thunderlight import Ctx
+from thunderlight.json import JSON
+from jsonclasses.uconf import uconf
+from jsonclasses.fdef import FStore
+from jsonclasses.excs import ValidationException, UnauthorizedActionException
+from .api_object import APIObject
+from .executor import run
+from .projection import Projection
+from .stream import stream
+
+
+KINDS = ('create', 'update', 'delete', 'reset')
+json = JSON()
+
+
+@final
+class Change:
+    """A change of objects of a class. `objects` are the changed objects, they
+    are only available in the process which made the change. Backends which
+    send changes to other processes send the other attributes, the objects
+    are fetched again by ids there. Deleted objects can't be fetched, so
+    subscribers in other processes get a reset event instead.
+    """
+
+    def __init__(self: Change,
+                 kind: str,
+                 graph: str,
+                 cls_name: str,
+                 ids: list[Any],
+                 objects: Optional[list[APIObject]] = None) -> None:
+        if kind not in KINDS:
+            raise ValueError(f'kind should be one of {", ".join(KINDS)}.')
+        self._kind = kind
+        self._graph = graph
+        self._cls_name = cls_name
+        self._ids = ids
+        self._objects = objects
+
+    @property
+    def kind(self: Change) -> str:
+        """'create', 'update', 'delete', or 'reset' if objects of the class
+        changed, but which ones isn't known.
+        """
+        return self._kind
+
+    @property
+    def graph(self: Change) -> str:
+        return self._graph
+
+    @property
+    def cls_name(self: Change) -> str:
+        return self._cls_name
+
+    @property
+    def ids(self: Change) -> list[Any]:
+        return self._ids
+
+    @property
+    def objects(self: Change) -> Optional[list[APIObject]]:
+        return self._objects
+
+
+Deliver = Callable[[Change], Awaitable[None]]
+
+
+class ChangeBackend:
+    """The interface of change backends. Subclass this to send changes to
+    the other processes and hosts of the server through a message broker.
+    """
+
+    async def publish(self: ChangeBackend, change: Change) -> None:
+        """Send `change` to the listeners of every process, this one
+        included.
+        """
+        raise NotImplementedError
+
+    def listen(self: ChangeBackend, deliver: Deliver) -> None:
+        """Register the listener of this process. Changes should be delivered
+        on the event loop.
+        """
+        raise NotImplementedError
+
+
+@final
+class MemoryChangeBackend(ChangeBackend):
+    """Delivers changes to the listener of this process only.
+    """
+
+    def __init__(self: MemoryChangeBackend) -> None:
+        self._deliver: Optional[Deliver] = None
+
+    async def publish(self: MemoryChangeBackend, change: Change) -> None:
+        if self._deliver is not None:
+            await self._deliver(change)
+
+    def listen(self: MemoryChangeBackend, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+
+@final
+class Subscriber:
+    """A client of a change feed with a bounded queue of encoded events.
+    """
+
+    def __init__(self: Subscriber,
+                 cls: type[APIObject],
+                 operator: Any,
+                 encode: Callable[[APIObject], dict[str, Any]],
+                 projection: Projection,
+                 filters: dict[str, str],
+                 size: int) -> None:
+        self._cls = cls
+        self._operator = operator
+        self._encode = encode
+        self._projection = projection
+        self._filters = filters
+        self._size = size
+        self._events: deque[bytes] = deque()
+        self._ready = Event()
+        self._closed = False
+
+    @property
+    def cls(self: Subscriber) -> type[APIObject]:
+        return self._cls
+
+    @property
+    def operator(self: Subscriber) -> Any:
+        return self._operator
+
+    @property
+    def encode(self: Subscriber) -> Callable[[APIObject], dict[str, Any]]:
+        return self._encode
+
+    @property
+    def closed(self: Subscriber) -> bool:
+        return self._closed
+
+    def matches(self: Subscriber, data: dict[str, Any]) -> bool:
+        """Whether JSON data of an object matches the filters.
+        """
+        for key, value in self._filters.items():
+            if _text(data.get(key)) != value:
+                return False
+        return True
+
+    def event(self: Subscriber, kind: str, id: Any, data: Any) -> Optional[bytes]:
+        """The event of an object change, or None if it's filtered out.
+        `data` is None if the operator can't read the object.
+        """
+        if data is None:
+            return None
+        if not self.matches(data):
+            return None
+        if kind == 'delete':
+            return frame(kind, {'id': id})
+        return frame(kind, {'id': id, 'data': self._projection.trim(data)})
+
+    def push(self: Subscriber, event: bytes) -> None:
+        if self._closed:
+            return
+        if len(self._events) >= self._size:
+            self._events.clear()
+            event = frame('reset', {})
+        self._events.append(event)
+        self._ready.set()
+
+    async def pop(self: Subscriber, timeout: float) -> Optional[list[bytes]]:
+        """Wait for queued events. An empty list is returned if there is none
+        after `timeout` seconds, None if the subscriber is closed.
+        """
+        if not self._events and not self._closed:
+            try:
+                await wait_for(self._ready.wait(), timeout)
+            except TimeoutError:
+                pass
+        if self._closed:
+            return None
+        events = list(self._events)
+        self._events.clear()
+        self._ready.clear()
+        return events
+
+    def close(self: Subscriber) -> None:
+        self._closed = True
+        self._events.clear()
+        self._ready.set()
+
+
+@final
+class ChangeHub:
+    """Fans changes out to the subscribers of this process.
+    """
+
+    def __init__(self: ChangeHub) -> None:
+        self._subscribers: dict[tuple[str, str], set[Subscriber]] = {}
+
+    def subscribe(self: ChangeHub, subscriber: Subscriber) -> None:
+        key = _key(subscriber.cls)
+        self._subscribers.setdefault(key, set()).add(subscriber)
+
+    def unsubscribe(self: ChangeHub, subscriber: Subscriber) -> None:
+        key = _key(subscriber.cls)
+        subscribers = self._subscribers.get(key)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[key]
+
+    def count(self: ChangeHub, cls: type[APIObject]) -> int:
+        return len(self._subscribers.get(_key(cls), ()))
+
+    async def deliver(self: ChangeHub, change: Change) -> None:
+        subscribers = self._subscribers.get((change.graph, change.cls_name))
+        if not subscribers:
+            return
+        subscribers = list(subscribers)
+        if change.kind == 'reset':
+            event = frame('reset', {})
+            for subscriber in subscribers:
+                subscriber.push(event)
+            return
+        events = await run(_encode_events, change, subscribers)
+        for subscriber, items in zip(subscribers, events):
+            for event in items:
+                subscriber.push(event)
+
+
+def _key(cls: type[APIObject]) -> tuple[str, str]:
+    return (cls.cdef.jconf.cgraph.name, cls.__name__)
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return 'null'
+    return str(value)
+
+
+def _encode_events(change: Change, subscribers: list[Subscriber]) -> list[list[bytes]]:
+    # objects are encoded once for each operator
+    cls = subscribers[0].cls
+    objects = change.objects
+    if objects is None:
+        if change.kind == 'delete':
+            # deleted objects can't be checked, their ids aren't sent
+            return [[frame('reset', {})] for _ in subscribers]
+        objects = [o for o in (cls.id(id).optional.exec() for id in change.ids)
+                   if o is not None]
+    encoded: dict[Any, list[Optional[dict[str, Any]]]] = {}
+    events: list[list[bytes]] = []
+    for subscriber in subscribers:
+        operator = subscriber.operator
+        okey = (subscriber.encode, None) if operator is None \
+            else (subscriber.encode, operator.__class__.__name__, operator._id)
+        datas = encoded.get(okey)
+        if datas is None:
+            datas = []
+            for obj in objects:
+                try:
+                    datas.append(subscriber.encode(obj.opby(operator)))
+                except UnauthorizedActionException:
+                    datas.append(None)
+            encoded[okey] = datas
+        items: list[bytes] = []
+        for obj, data in zip(objects, datas):
+            event = subscriber.event(change.kind, obj._id, data)
+            if event is not None:
+                items.append(event)
+        events.append(items)
+    return events
+
+
+def frame(kind: str, data: Any) -> bytes:
+    """A server-sent event.
+    """
+    return b'event: ' + kind.encode() + b'\ndata: ' + json.encode(data) + b'\n\n'
+
+
+_change_backend: ChangeBackend | None = None
+_change_hub: ChangeHub | None = None
+
+
+def change_hub() -> ChangeHub:
+    """The change hub of this process.
+    """
+    global _change_hub
+    if _change_hub is None:
+        _change_hub = ChangeHub()
+        change_backend().listen(_change_hub.deliver)
+    return _change_hub
+
+
+def change_backend() -> ChangeBackend:
+    """The change backend of this process.
+    """
+    global _change_backend
+    if _change_backend is None:
+        _change_backend = MemoryChangeBackend()
+    return _change_backend
+
+
+def set_change_backend(backend: ChangeBackend) -> None:
+    """Replace the change backend of this process.
+    """
+    global _change_backend
+    _change_backend = backend
+    if _change_hub is not None:
+        backend.listen(_change_hub.deliver)
+
+
+async def publish(cls: type[APIObject], kind: str, objects: list[APIObject]) -> None:
+    """Publish a change of `objects` of `cls`.
+    """
+    if kind != 'reset' and len(objects) == 0:
+        return
+    change_hub()
+    graph, name = _key(cls)
+    await change_backend().publish(
+        Change(kind, graph, name, [o._id for o in objects], objects))
+
+
+def queue_size() -> int:
+    """The number of events queued for a subscriber before they're replaced
+    with a reset event. It's configured with `changes.queueSize` of the user
+    config.
+    """
+    return uconf().get('changes.queue_size') or 256
+
+
+def heartbeat() -> float:
+    """Seconds between comments which keep idle connections open. It's
+    configured with `changes.heartbeat` of the user config.
+    """
+    return uconf().get('changes.heartbeat') or 15
+
+
+def json_names(cls: type[APIObject]) -> dict[str, str]:
+    """Maps Python and JSON names of fields and local keys to JSON names.
+    """
+    jconf = cls.cdef.jconf
+    names: dict[str, str] = {}
+    for field in cls.cdef.fields:
+        names[field.name] = field.json_name
+        names[field.json_name] = field.json_name
+        if field.fdef.fstore == FStore.LOCAL_KEY:
+            rk = jconf.ref_name_strategy(field)
+            names[rk] = jconf.output_key_strategy(rk)
+            names[names[rk]] = names[rk]
+    return names
+
+
+def filters(query: dict[str, Any], names: dict[str, str]) -> dict[str, str]:
+    """Equality filters of a subscription query by JSON name.
+    """
+    result: dict[str, str] = {}
+    for key, value in query.items():
+        if key.startswith('_'):
+            continue
+        name = names.get(key)
+        if name is None:
+            raise ValidationException({key: f'unknown field \'{key}\''}, None)
+        if isinstance(value, (dict, list)):
+            raise ValidationException({key: 'value is not a scalar'}, None)
+        result[name] = _text(value)
+    return result
+
+
+async def _watch_disconnect(ctx: Ctx, subscriber: Subscriber) -> None:
+    # after the body is complete, servers only send a disconnect message,
+    # another message means the receive isn't a client connection
+    receive = ctx.req._receive
+    complete = False
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            subscriber.close()
+            return
+        if complete:
+            return
+        complete = not message.get('more_body', False)
+
+
+def subscribe(ctx: Ctx, subscriber: Subscriber) -> None:
+    """Respond with the events of `subscriber` until the client
+    disconnects.
+    """
+    hub = change_hub()
+    interval = heartbeat()
+    async def events() -> AsyncIterator[bytes]:
+        hub.subscribe(subscriber)
+        watcher = create_task(_watch_disconnect(ctx, subscriber))
+        try:
+            yield b': connected\n\n'
+            while True:
+                items = await subscriber.pop(interval)
+                if items is None:
+                    return
+                yield b''.join(items) if items else b': ping\n\n'
+        finally:
+            watcher.cancel()
+            hub.unsubscribe(subscriber)
+            subscriber.close()
+    ctx.res.headers['cache-control'] = 'no-cache'
+    ctx.res.headers['x-accel-buffering'] = 'no'
+    stream(ctx, events(), 'text/event-stream')
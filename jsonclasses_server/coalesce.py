@@ -0,0 +1,91 @@
+"""This module implements request coalescing for read routes. Identical
+reads which arrive while one is in flight wait for it instead of fetching and
+encoding the same data again.
+"""
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Optional, TypeVar, final
+from asyncio import Future, ensure_future, shield
+from thunderlight import Ctx
+from thunderlight.json import JSON
+from .api_object import APIObject
+from .qsutils import normalize_qs
+from .metrics import metrics, timed
+
+
+T = TypeVar('T')
+json = JSON()
+
+
+@final
+class SingleFlight:
+    """Deduplicate concurrent calls by key. While a call is in flight, later
+    calls with the same key share its result.
+    """
+
+    def __init__(self: SingleFlight) -> None:
+        self._flights: dict[str, Future[Any]] = {}
+
+    async def do(self: SingleFlight,
+                 name: str,
+                 key: str,
+                 fetch: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of the in-flight call with `key`, or call
+        `fetch`. Shared results are counted under `name` in metrics. A call
+        isn't cancelled when the request which started it is.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            metrics().coalesce(name)
+            return await shield(flight)
+        flight = ensure_future(fetch())
+        self._flights[key] = flight
+        def land(f: Future[Any]) -> None:
+            if self._flights.get(key) is f:
+                del self._flights[key]
+            if not f.cancelled():
+                f.exception()
+        flight.add_done_callback(land)
+        return await shield(flight)
+
+
+_single_flight: SingleFlight | None = None
+
+
+def single_flight() -> SingleFlight:
+    """The single flight group of this process.
+    """
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
+
+
+def request_key(cls: type[APIObject],
+                target: Optional[str],
+                qs: str,
+                operator: Any) -> str:
+    """The key of a read. Reads with the same key fetch the same objects and
+    are authorized against the same operator.
+    """
+    if operator is None:
+        opid = '-'
+    else:
+        opid = f'{operator.__class__.__name__}/{operator._id}'
+    return f'{cls.__name__}:{opid}:{target or "*"}:{normalize_qs(qs)}'
+
+
+async def coalesced(ctx: Ctx,
+                    cls: type[APIObject],
+                    target: Optional[str],
+                    fetch: Callable[[], Awaitable[Any]]) -> None:
+    """Respond with the JSON data returned by `fetch`. Identical concurrent
+    reads share one fetch and one encoded body.
+    """
+    async def load() -> bytes:
+        data = await fetch()
+        with timed('serialize'):
+            return json.encode(data)
+    key = request_key(cls, target, ctx.req.qs, ctx.state.operator)
+    body = await single_flight().do(cls.__name__, key, load)
+    ctx.res.headers['content-type'] = 'application/json'
+    ctx.res.body = body
@@ -0,0 +1,213 @@
+"""This module implements response compression. Responses are compressed
+with brotli or gzip, whichever the client prefers in `Accept-Encoding`, when
+they are larger than a threshold. Streamed responses are compressed chunk by
+chunk. Compression of large bodies runs in a worker thread. It's turned on
+with `compression.enabled` of the user config. Brotli is used if the
+`brotli` package is installed.
+"""
+from __future__ import annotations
+from typing import Any, AsyncIterator, Callable, Optional, final
+from asyncio import to_thread
+from functools import partial
+from zlib import compressobj, DEFLATED, Z_SYNC_FLUSH
+from thunderlight import Ctx
+from jsonclasses.uconf import uconf
+from .stream import StreamingRes
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/')
+
+
+@final
+class Compression:
+    """Response compression settings.
+    """
+
+    def __init__(self: Compression,
+                 enabled: bool = False,
+                 min_size: int = 1024,
+                 gzip_level: int = 6,
+                 brotli_quality: int = 4,
+                 thread_size: int = 65536) -> None:
+        self._enabled = enabled
+        self._min_size = min_size
+        self._gzip_level = gzip_level
+        self._brotli_quality = brotli_quality
+        self._thread_size = thread_size
+
+    @property
+    def enabled(self: Compression) -> bool:
+        return self._enabled
+
+    @property
+    def min_size(self: Compression) -> int:
+        """Bodies smaller than this number of bytes are sent uncompressed.
+        """
+        return self._min_size
+
+    @property
+    def gzip_level(self: Compression) -> int:
+        return self._gzip_level
+
+    @property
+    def brotli_quality(self: Compression) -> int:
+        return self._brotli_quality
+
+    @property
+    def thread_size(self: Compression) -> int:
+        """Bodies and chunks of at least this number of bytes are compressed
+        in a worker thread.
+        """
+        return self._thread_size
+
+    @property
+    def encodings(self: Compression) -> tuple[str, ...]:
+        """The supported encodings in order of preference.
+        """
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def compressor(self: Compression, encoding: str) -> Compressor:
+        if encoding == 'br':
+            return Compressor(encoding, self._brotli_quality)
+        return Compressor(encoding, self._gzip_level)
+
+
+@final
+class Compressor:
+    """Compresses a body which is given in one or more chunks. Each chunk is
+    flushed, so that streamed chunks reach the client as they're produced.
+    """
+
+    def __init__(self: Compressor, encoding: str, level: int) -> None:
+        if encoding == 'br':
+            stream = brotli.Compressor(quality=level)
+            self._process = stream.process
+            self._flush = stream.flush
+            self._finish = stream.finish
+        else:
+            stream = compressobj(level, DEFLATED, 31)
+            self._process = stream.compress
+            self._flush = partial(stream.flush, Z_SYNC_FLUSH)
+            self._finish = stream.flush
+
+    def compress(self: Compressor, data: bytes) -> bytes:
+        return self._process(data) + self._flush()
+
+    def finish(self: Compressor) -> bytes:
+        return self._finish()
+
+    def compress_all(self: Compressor, data: bytes) -> bytes:
+        return self._process(data) + self._finish()
+
+
+_compression: Compression | None = None
+
+
+def compression() -> Compression:
+    """The compression settings of this server, configured with the
+    `compression` section of the user config.
+    """
+    global _compression
+    if _compression is None:
+        conf = uconf().get('compression') or {}
+        _compression = Compression(
+            enabled=bool(conf.get('enabled')),
+            min_size=_or(conf.get('min_size'), 1024),
+            gzip_level=_or(conf.get('gzip_level'), 6),
+            brotli_quality=_or(conf.get('brotli_quality'), 4),
+            thread_size=_or(conf.get('thread_size'), 65536))
+    return _compression
+
+
+def _or(value: Optional[int], default: int) -> int:
+    return default if value is None else value
+
+
+def negotiate(header: Optional[str], encodings: tuple[str, ...]) -> Optional[str]:
+    """The encoding in `encodings` which `Accept-Encoding` header `header`
+    accepts with the highest weight. Ties go to the earlier encoding. None is
+    returned if no encoding is accepted.
+    """
+    if not header:
+        return None
+    weights: dict[str, float] = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best: Optional[str] = None
+    best_weight = 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def _compressible(ctx: Ctx) -> bool:
+    res = ctx.res
+    if res.code < 200 or res.code in (204, 206, 304):
+        return False
+    if 'content-encoding' in res.headers:
+        return False
+    ctype = res.headers.get('content-type') or ''
+    return ctype.startswith(COMPRESSIBLE)
+
+
+async def _run(settings: Compression, fn: Callable[[bytes], bytes], data: bytes) -> bytes:
+    if len(data) >= settings.thread_size:
+        return await to_thread(fn, data)
+    return fn(data)
+
+
+async def _compressed(settings: Compression,
+                      compressor: Compressor,
+                      chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        if len(chunk) > 0:
+            yield await _run(settings, compressor.compress, chunk)
+    yield compressor.finish()
+
+
+def _weaken(res: Any) -> None:
+    etag = res.headers.get('etag')
+    if etag is not None and not etag.startswith('W/'):
+        res.headers['etag'] = f'W/{etag}'
+
+
+def compression_middleware(settings: Compression) -> Any:
+    """Create the middleware which compresses responses.
+    """
+    async def compress_middleware(ctx: Ctx, next: Any) -> None:
+        await next(ctx)
+        if ctx.req.method == 'HEAD' or not _compressible(ctx):
+            return
+        res = ctx.res
+        vary = res.headers.get('vary')
+        res.headers['vary'] = 'accept-encoding' if not vary \
+            else f'{vary}, accept-encoding'
+        encoding = negotiate(ctx.req.headers.get('accept-encoding'),
+                             settings.encodings)
+        if encoding is None:
+            return
+        if isinstance(res, StreamingRes):
+            compressor = settings.compressor(encoding)
+            res._chunks = _compressed(settings, compressor, res._chunks)
+        elif len(res.body) >= settings.min_size and res._file_path is None:
+            compressor = settings.compressor(encoding)
+            res.body = await _run(settings, compressor.compress_all, res.body)
+        else:
+            return
+        res.headers['content-encoding'] = encoding
+        _weaken(res)
+    return compress_middleware
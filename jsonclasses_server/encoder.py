@@ -0,0 +1,244 @@
+"""This module implements compiled JSON encoders. An encoder is compiled
+once from a class definition into a flat list of field steps, so that
+encoding an object doesn't walk the modifier chains and build a context for
+each field like `tojson()` does. The output is the same as `tojson()`.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional, final
+from datetime import date, datetime
+from jsonclasses.fdef import FDef, FStore, ReadRule, EnumOutput
+from jsonclasses.types import Types
+from jsonclasses.modifiers.modifier import Modifier
+from jsonclasses.modifiers.chained_modifier import ChainedModifier
+from jsonclasses.modifiers.datetime_modifier import DatetimeModifier
+from jsonclasses.modifiers.date_modifier import DateModifier
+from jsonclasses.modifiers.enum_modifier import EnumModifier
+from jsonclasses.modifiers.instanceof_modifier import InstanceOfModifier
+from jsonclasses.modifiers.listof_modifier import ListOfModifier
+from jsonclasses.modifiers.dictof_modifier import DictOfModifier
+from .api_object import APIObject
+
+
+Convert = Callable[[Any], Any]
+
+
+class _Unsupported(Exception):
+    pass
+
+
+@final
+class Encoder:
+    """The compiled JSON encoder of a class at a position of an include
+    tree. Nested encoders are compiled when a relationship is first seen
+    loaded.
+    """
+
+    def __init__(self: Encoder,
+                 cls: type[APIObject],
+                 chain: tuple[str, ...] = (),
+                 via_fdef: Optional[FDef] = None,
+                 via_key: Optional[str] = None,
+                 in_key: Optional[str] = None) -> None:
+        cdef = cls.cdef
+        jconf = cdef.jconf
+        self._cls = cls
+        self._output_null = bool(jconf.output_null)
+        self._chain = (*chain, cdef.name)
+        self._in_key = in_key
+        self._nested: dict[tuple[type, Optional[FDef], Optional[str], Optional[str]], Encoder] = {}
+        self._steps: list[tuple[str, str, str, Optional[Convert]]] = []
+        no_key_refs = cdef.name in chain
+        for field in cdef.fields:
+            fdef = field.fdef
+            isrf = False
+            foreign_field = field.foreign_field
+            if foreign_field is not None:
+                isrf = foreign_field.fdef == via_fdef
+                if not isrf and via_key is not None:
+                    isrf = foreign_field.name == via_key
+            if fdef.fstore == FStore.LOCAL_KEY:
+                rk = jconf.ref_name_strategy(field)
+                self._steps.append((field.name, rk, jconf.output_key_strategy(rk), None))
+                if isrf or no_key_refs:
+                    continue
+            if fdef.fstore == FStore.FOREIGN_KEY and (isrf or no_key_refs):
+                continue
+            if fdef.read_rule == ReadRule.NO_READ:
+                continue
+            if fdef.fstore == FStore.TEMP:
+                continue
+            convert = self._compile(field.types, fdef, field.name, None)
+            self._steps.append((field.name, field.name, field.json_name, convert))
+
+    @property
+    def cls(self: Encoder) -> type[APIObject]:
+        return self._cls
+
+    def encode(self: Encoder, obj: APIObject) -> dict[str, Any]:
+        """Encode a root object. The object's read permission is checked like
+        `tojson()` does.
+        """
+        obj._can_read_check()
+        try:
+            return self._encode(obj)
+        except _Unsupported:
+            return obj.tojson()
+
+    def _encode(self: Encoder, obj: Any) -> dict[str, Any]:
+        retval: dict[str, Any] = {}
+        picks = obj._partial_picks if obj.is_partial else None
+        output_null = self._output_null
+        for fname, name, json_name, convert in self._steps:
+            if picks is not None and fname not in picks:
+                continue
+            value = getattr(obj, name)
+            if value is not None and convert is not None:
+                value = convert(value)
+            if output_null or value is not None:
+                retval[json_name] = value
+        return retval
+
+    def _nested_encoder(self: Encoder,
+                        cls: type,
+                        via_fdef: Optional[FDef],
+                        via_key: Optional[str],
+                        in_key: Optional[str]) -> Encoder:
+        key = (cls, via_fdef, via_key, in_key)
+        encoder = self._nested.get(key)
+        if encoder is None:
+            encoder = Encoder(cls, self._chain, via_fdef, via_key, in_key)
+            self._nested[key] = encoder
+        return encoder
+
+    def _compile(self: Encoder,
+                 types: Types,
+                 fdef: FDef,
+                 key: Optional[str],
+                 item_of: Optional[str]) -> Optional[Convert]:
+        """Compile the `tojson` of a modifier chain into a function. `key` is
+        the field name if the value is a field. `item_of` is the field name
+        if the value is an item of a field's collection.
+        """
+        modifier = types.modifier
+        modifiers = modifier.vs if isinstance(modifier, ChainedModifier) else [modifier]
+        converts: list[Convert] = []
+        for m in modifiers:
+            mcls = type(m)
+            if mcls.tojson is Modifier.tojson:
+                continue
+            if mcls is DatetimeModifier:
+                converts.append(_datetime)
+            elif mcls is DateModifier:
+                converts.append(_date)
+            elif mcls is EnumModifier:
+                converts.append(_enum(fdef.enum_output))
+            elif mcls is ListOfModifier or mcls is DictOfModifier:
+                item_types = fdef.item_types
+                item = self._compile(item_types, item_types.fdef, None, key)
+                if mcls is ListOfModifier:
+                    converts.append(_list(item))
+                else:
+                    converts.append(_dict(item))
+            elif mcls is InstanceOfModifier:
+                converts.append(self._instance(fdef, key, item_of))
+            else:
+                raise _Unsupported(mcls.__name__)
+        if len(converts) == 0:
+            return None
+        if len(converts) == 1:
+            return converts[0]
+        def convert(value: Any) -> Any:
+            for c in converts:
+                if value is None:
+                    return None
+                value = c(value)
+            return value
+        return convert
+
+    def _instance(self: Encoder,
+                  fdef: FDef,
+                  key: Optional[str],
+                  item_of: Optional[str]) -> Convert:
+        # this mirrors how tojson() detects the reverse side of a relationship
+        # from the context's field definition and key path
+        if key is not None:
+            via_key, in_key = self._in_key, key
+        else:
+            via_key, in_key = item_of, None
+        def convert(value: Any) -> Any:
+            encoder = self._nested_encoder(value.__class__, fdef, via_key, in_key)
+            return encoder._encode(value)
+        return convert
+
+
+def _datetime(value: datetime) -> str:
+    return value.isoformat()[:23] + 'Z'
+
+
+def _date(value: date) -> str:
+    return value.isoformat() + 'T00:00:00.000Z'
+
+
+def _enum(output: Optional[EnumOutput]) -> Convert:
+    if output == EnumOutput.VALUE:
+        return lambda v: v.value
+    if output == EnumOutput.NAME:
+        return lambda v: v.name
+    if output == EnumOutput.LOWERCASE_NAME:
+        return lambda v: v.name.lower()
+    return lambda v: None
+
+
+def _list(item: Optional[Convert]) -> Convert:
+    def convert(value: Any) -> Any:
+        if not isinstance(value, list):
+            return value
+        if item is None:
+            return list(value)
+        return [None if v is None else item(v) for v in value]
+    return convert
+
+
+def _dict(item: Optional[Convert]) -> Convert:
+    def convert(value: Any) -> Any:
+        if not isinstance(value, dict):
+            return value
+        if item is None:
+            return dict(value)
+        return {k: None if v is None else item(v) for k, v in value.items()}
+    return convert
+
+
+def tojson(obj: APIObject) -> dict[str, Any]:
+    return obj.tojson()
+
+
+def json_encoder(cls: type[APIObject], serializer: str) -> Callable[[APIObject], dict[str, Any]]:
+    """The function which converts objects of `cls` into JSON data with
+    `serializer`. The compiled encoder is used if `serializer` is
+    'compiled', otherwise `tojson()` is used. The encoder is compiled on
+    first use, when all referenced classes are defined.
+    """
+    if serializer != 'compiled':
+        return tojson
+    def encode(obj: APIObject) -> dict[str, Any]:
+        compiled = encoder(cls)
+        if compiled is None:
+            return obj.tojson()
+        return compiled.encode(obj)
+    return encode
+
+
+_encoders: dict[type, Optional[Encoder]] = {}
+
+
+def encoder(cls: type[APIObject]) -> Optional[Encoder]:
+    """The compiled encoder of `cls`. None is returned if the class uses
+    field modifiers which can't be compiled, `tojson()` should be used then.
+    """
+    if cls not in _encoders:
+        try:
+            _encoders[cls] = Encoder(cls)
+        except _Unsupported:
+            _encoders[cls] = None
+    return _encoders[cls]
@@ -0,0 +1,153 @@
+"""This module defines `ErrorLog`. The error log records request failures
+as structured log lines. Client errors are sampled and rate limited and are
+logged without tracebacks, while server errors are always logged with their
+tracebacks. Log records are written by a background thread, so logging never
+blocks the event loop.
+"""
+from __future__ import annotations
+from typing import Any, Optional, final
+from logging import Formatter, Logger, StreamHandler, getLogger
+from logging.handlers import QueueHandler, QueueListener
+from json import dumps
+from os import register_at_fork
+from queue import SimpleQueue
+from random import random
+from threading import Lock
+from time import monotonic
+from thunderlight import Ctx
+from jsonclasses.uconf import uconf
+
+
+@final
+class ErrorLog:
+    """A structured, rate limited error log with per exception type
+    counters.
+    """
+
+    def __init__(self: ErrorLog,
+                 sample_rate: float = 1.0,
+                 rate_limit: float = 10.0,
+                 logger: Optional[Logger] = None) -> None:
+        self._sample_rate = sample_rate
+        self._rate_limit = rate_limit
+        self._tokens = rate_limit
+        self._updated = monotonic()
+        self._suppressed = 0
+        self._counts: dict[str, int] = {}
+        self._lock = Lock()
+        self._logger = logger
+        self._listener: Optional[QueueListener] = None
+
+    @property
+    def sample_rate(self: ErrorLog) -> float:
+        """The fraction of client errors which are logged.
+        """
+        return self._sample_rate
+
+    @property
+    def rate_limit(self: ErrorLog) -> float:
+        """The maximum number of client errors logged per second.
+        """
+        return self._rate_limit
+
+    @property
+    def counts(self: ErrorLog) -> dict[str, int]:
+        """The number of failures by exception type.
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    @property
+    def logger(self: ErrorLog) -> Logger:
+        if self._logger is None:
+            queue: SimpleQueue[Any] = SimpleQueue()
+            handler = StreamHandler()
+            handler.setFormatter(Formatter('%(asctime)s %(levelname)s %(message)s'))
+            self._listener = QueueListener(queue, handler)
+            self._listener.start()
+            self._logger = getLogger('jsonclasses_server.errors')
+            self._logger.addHandler(QueueHandler(queue))
+            self._logger.propagate = False
+        return self._logger
+
+    def record(self: ErrorLog, ctx: Ctx, e: Exception, code: int) -> None:
+        """Count and log a request failure.
+        """
+        name = e.__class__.__name__
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + 1
+        fields: dict[str, Any] = {
+            'status': code,
+            'type': name,
+            'message': str(e),
+            'method': ctx.req.method,
+            'path': ctx.req.path
+        }
+        if code >= 500:
+            self.logger.error(dumps(fields), exc_info=e)
+            return
+        if self._sample_rate < 1.0 and random() >= self._sample_rate:
+            return
+        suppressed = self._take()
+        if suppressed is None:
+            return
+        if suppressed > 0:
+            fields['suppressed'] = suppressed
+        self.logger.warning(dumps(fields))
+
+    def stop(self: ErrorLog) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def _after_fork(self: ErrorLog) -> None:
+        # the listener thread doesn't exist in a forked child, start a new one
+        # on the same queue
+        if self._listener is not None:
+            listener = self._listener
+            self._listener = QueueListener(listener.queue, *listener.handlers)
+            self._listener.start()
+
+    def _take(self: ErrorLog) -> Optional[int]:
+        """Take a token from the rate limiting bucket. This returns None if
+        the line should be dropped, or the number of lines dropped since the
+        last logged line.
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self._rate_limit,
+                               self._tokens + (now - self._updated) * self._rate_limit)
+            self._updated = now
+            if self._tokens < 1:
+                self._suppressed += 1
+                return None
+            self._tokens -= 1
+            suppressed = self._suppressed
+            self._suppressed = 0
+            return suppressed
+
+
+_error_log: ErrorLog | None = None
+
+
+def error_log() -> ErrorLog:
+    """The error log of this process. It's configured with the `errorLog`
+    section of the user config.
+    """
+    global _error_log
+    if _error_log is None:
+        conf = uconf().get('error_log') or {}
+        sample_rate = conf.get('sample_rate')
+        rate_limit = conf.get('rate_limit')
+        _error_log = ErrorLog(
+            sample_rate=1.0 if sample_rate is None else sample_rate,
+            rate_limit=10.0 if rate_limit is None else rate_limit)
+    return _error_log
+
+
+def _reset_after_fork() -> None:
+    if _error_log is not None:
+        _error_log._after_fork()
+
+
+register_at_fork(after_in_child=_reset_after_fork)
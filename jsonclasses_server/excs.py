@@ -8,3 +8,24 @@ class AuthenticationException(Exception):
     def __init__(self, message: str) -> None:
         self.message = message
         super().__init__(self.message)
+
+
+class PayloadTooLargeException(Exception):
+    """Payload too large exception is throwed when a request is larger than
+    the server accepts.
+    """
+
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+class TooManyRequestsException(Exception):
+    """Too many requests exception is throwed when a client sends requests
+    faster than its rate limit allows.
+    """
+
+    def __init__(self, retry_after: float) -> None:
+        self.retry_after = retry_after
+        self.message = 'too many requests'
+        super().__init__(self.message)
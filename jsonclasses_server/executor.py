@@ -0,0 +1,107 @@
+"""This module defines `Executor`. The executor decides where the synchronous
+ORM work of generated route handlers runs. In `inline` mode, it runs on the
+event loop like before. In `thread` mode, it runs inside a bounded thread pool
+so that a slow query doesn't stall other requests on the same worker.
+"""
+from __future__ import annotations
+from typing import Any, Callable, TypeVar, Optional, final
+from asyncio import get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+from os import register_at_fork
+from jsonclasses.uconf import uconf
+from .profiling import profiled
+
+
+T = TypeVar('T')
+
+
+@final
+class Executor:
+    """The executor runs synchronous ORM work for route handlers.
+    """
+
+    modes = ('inline', 'thread')
+
+    def __init__(self: Executor,
+                 mode: str = 'inline',
+                 max_workers: Optional[int] = None) -> None:
+        if mode not in self.modes:
+            raise ValueError(f'executor mode should be one of {self.modes}.')
+        self._mode = mode
+        self._max_workers = max_workers or 16
+        self._pool: ThreadPoolExecutor | None = None
+
+    @property
+    def mode(self: Executor) -> str:
+        return self._mode
+
+    @property
+    def max_workers(self: Executor) -> int:
+        return self._max_workers
+
+    @property
+    def pool(self: Executor) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix='jsonclasses-server')
+        return self._pool
+
+    async def run(self: Executor, fn: Callable[..., T], *args: Any) -> T:
+        """Run `fn` with `args` and return its result.
+        """
+        if self._mode == 'inline':
+            return fn(*args)
+        ctx = copy_context()
+        loop = get_running_loop()
+        return await loop.run_in_executor(self.pool,
+                                          partial(ctx.run, profiled(fn), *args))
+
+    def shutdown(self: Executor, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+_executor: Executor | None = None
+
+
+def executor() -> Executor:
+    """The executor of this process. It's configured with the `executor`
+    section of the user config.
+    """
+    global _executor
+    if _executor is None:
+        conf = uconf().get('executor')
+        if conf is None:
+            _executor = Executor()
+        else:
+            _executor = Executor(mode=conf.get('mode') or 'inline',
+                                 max_workers=conf.get('max_workers'))
+    return _executor
+
+
+def _reset_after_fork() -> None:
+    # threads of the thread pool don't exist in a forked child
+    if _executor is not None:
+        _executor._pool = None
+
+
+register_at_fork(after_in_child=_reset_after_fork)
+
+
+def set_executor(new_executor: Executor) -> None:
+    """Replace the executor of this process.
+    """
+    global _executor
+    if _executor is not None and _executor is not new_executor:
+        _executor.shutdown(wait=False)
+    _executor = new_executor
+
+
+async def run(fn: Callable[..., T], *args: Any) -> T:
+    """Run synchronous ORM work with the executor of this process.
+    """
+    return await executor().run(fn, *args)
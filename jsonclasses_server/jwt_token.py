@@ -1,35 +1,289 @@
+"""This module implements operator tokens. Tokens are signed and verified by
+the signer of this process, which is configured once from the `operator`
+section of the user config:
+
+    "operator": {
+        "secretKey": "...",
+        "keys": [{"kid": "2026-10", "secret": "..."}],
+        "signingKey": "2026-10",
+        "embedFields": ["role"],
+        "maxClaimsAge": 300
+    }
+
+`secretKey` verifies tokens without a key id. `keys` are the active keys,
+new tokens are signed with `signingKey` or the first key, tokens are
+verified with the key of their `kid` header. To rotate keys without
+downtime, add a key, then sign with it, then remove the old key after its
+tokens expired. Pass the changed `operator` section to `reload_signer` to
+replace the signer without a restart.
+
+With `embedFields`, tokens carry these fields of the operator, so that read
+routes use an operator built from the token instead of fetching it. Fields
+are named by Python or JSON names and should be scalar fields. Embedded
+fields are trusted for `maxClaimsAge` seconds after the token is signed, or
+until the operator is updated or deleted. After that, the operator is
+fetched again. Updates and deletes reach other worker processes through the
+operator invalidation backend. With the default backend, which reaches this
+process only, other workers trust embedded fields of a changed operator for
+up to `maxClaimsAge` seconds.
+"""
 from __future__ import annotations
+from typing import Any, Optional, Union, final
 from datetime import timedelta, datetime
-from jsonclasses.pkgutils import check_and_install_packages
+from time import time
+from inflection import underscore
 from jsonclasses.cgraph import CGraph
-from jsonclasses.uconf import uconf
+from jsonclasses.uconf import UserConf, uconf
 from jsonclasses.orm import ORMObject
+from jsonclasses.ctx import Ctx as JCtx, CtxCfg
+from jsonclasses.fdef import FType
+from jsonclasses.jfield import JField
+from .operator_cache import operator_cache
 
 
-default_operator_conf = {
-    "secretKey": "!@#$%^&*())(*&^%$#@"
-}
+DEFAULT_SECRET_KEY = '!@#$%^&*())(*&^%$#@'
+EMBEDDABLE = (FType.STR, FType.INT, FType.FLOAT, FType.BOOL, FType.DATE,
+              FType.DATETIME, FType.ENUM)
 
-def decode_jwt_token(token: str, gname: str = 'default') -> ORMObject | None:
-    from jwt import decode
-    operator_conf = uconf().get('operator') or default_operator_conf
-    secret_key = operator_conf.get('secret_key')
-    decoded = decode(token, secret_key, algorithms=['HS256'])
-    id = decoded['id']
-    class_name = decoded['class']
-    expired_at = decoded['expired_at']
+
+@final
+class Signer:
+    """Signs and verifies operator tokens.
+    """
+
+    def __init__(self: Signer,
+                 keys: dict[Optional[str], str],
+                 signing_kid: Optional[str] = None,
+                 algorithm: str = 'HS256',
+                 leeway: float = 0,
+                 embed: tuple[str, ...] = (),
+                 max_claims_age: float = 300) -> None:
+        if len(keys) == 0:
+            raise ValueError('signer should have at least one key.')
+        if signing_kid not in keys:
+            raise ValueError(f'signing key \'{signing_kid}\' is not found.')
+        self._keys = keys
+        self._signing_kid = signing_kid
+        self._algorithm = algorithm
+        self._algorithms = [algorithm]
+        self._leeway = leeway
+        self._embed = embed
+        self._max_claims_age = max_claims_age
+        self._headers = None if signing_kid is None else {'kid': signing_kid}
+        # jwt is imported when a signer is first used, not with the server
+        from jwt import PyJWT
+        self._jwt = PyJWT()
+        self._fields: dict[type, tuple[JField, ...]] = {}
+
+    @property
+    def kids(self: Signer) -> list[Optional[str]]:
+        """The ids of the active keys. None is the id of the key which
+        verifies tokens without a key id.
+        """
+        return list(self._keys)
+
+    @property
+    def signing_kid(self: Signer) -> Optional[str]:
+        return self._signing_kid
+
+    @property
+    def algorithm(self: Signer) -> str:
+        return self._algorithm
+
+    @property
+    def embed(self: Signer) -> tuple[str, ...]:
+        """The names of operator fields which tokens carry.
+        """
+        return self._embed
+
+    @property
+    def max_claims_age(self: Signer) -> float:
+        """Seconds after signing during which embedded fields are trusted.
+        """
+        return self._max_claims_age
+
+    def encode(self: Signer, operator: ORMObject, expired_in: timedelta) -> str:
+        expired_at = (datetime.now() + expired_in).timestamp()
+        data: dict[str, Any] = {
+            'class': operator.__class__.__name__,
+            'id': operator._id,
+            'expired_at': expired_at,
+            'exp': int(expired_at),
+            'iat': int(time())
+        }
+        if self._embed:
+            data['fields'] = {field.name: _to_json(operator, field)
+                              for field in self.fields_of(operator.__class__)}
+        return self._jwt.encode(data, self._keys[self._signing_kid],
+                                algorithm=self._algorithm,
+                                headers=self._headers)
+
+    def decode(self: Signer, token: str) -> dict[str, Any]:
+        """Verify the token's signature and expiration time and return its
+        claims. This doesn't touch the database.
+        """
+        from jwt import DecodeError, ExpiredSignatureError, get_unverified_header
+        kid = get_unverified_header(token).get('kid')
+        key = self._keys.get(kid)
+        if key is None:
+            raise DecodeError(f'key \'{kid}\' is not found')
+        claims = self._jwt.decode(token, key, algorithms=self._algorithms,
+                                  leeway=self._leeway)
+        expired_at = claims.get('expired_at')
+        if expired_at is not None and expired_at + self._leeway <= time():
+            raise ExpiredSignatureError('Signature has expired')
+        return claims
+
+    def fields_of(self: Signer, cls: type) -> tuple[JField, ...]:
+        """The embedded fields of operator class `cls`. Embedded fields are
+        named by Python or JSON names. A ValueError is raised if one isn't
+        a field of `cls` or isn't a scalar.
+        """
+        fields = self._fields.get(cls)
+        if fields is None:
+            named: dict[str, JField] = {}
+            for field in cls.cdef.fields:
+                named[field.name] = field
+                named[field.json_name] = field
+            result: list[JField] = []
+            for name in self._embed:
+                field = named.get(name)
+                if field is None:
+                    raise ValueError(f'embedded field \'{name}\' is not a '
+                                     f'field of {cls.__name__}.')
+                if field.fdef.ftype not in EMBEDDABLE:
+                    raise ValueError(f'embedded field \'{name}\' of '
+                                     f'{cls.__name__} is not a scalar.')
+                result.append(field)
+            fields = tuple(result)
+            self._fields[cls] = fields
+        return fields
+
+
+def _to_json(obj: ORMObject, field: JField) -> Any:
+    ctx = JCtx.rootctx(obj, CtxCfg()).nextvc(getattr(obj, field.name),
+                                             field.name, field.fdef,
+                                             obj.__class__.cdef.name)
+    return field.types.modifier.tojson(ctx)
+
+
+def _from_json(obj: ORMObject, field: JField, value: Any) -> Any:
+    ctx = JCtx.rootctxp(obj, field.name, value, None).alterfdef(field.fdef)
+    return field.types.modifier.transform(ctx)
+
+
+def _load_signer(conf: Optional[UserConf]) -> Signer:
+    if conf is None:
+        return Signer({None: DEFAULT_SECRET_KEY})
+    keys: dict[Optional[str], str] = {}
+    secret_key = conf.get('secret_key')
+    if secret_key is not None:
+        keys[None] = secret_key
+    keys_conf = conf.get('keys')
+    for item in (keys_conf._conf if keys_conf is not None else []):
+        keys[item['kid']] = item['secret']
+    if len(keys) == 0:
+        keys[None] = DEFAULT_SECRET_KEY
+    signing_kid = conf.get('signing_key')
+    if signing_kid is None:
+        signing_kid = next((kid for kid in keys if kid is not None), None)
+    embed = conf.get('embed_fields')
+    max_claims_age = conf.get('max_claims_age')
+    return Signer(keys,
+                  signing_kid=signing_kid,
+                  algorithm=conf.get('algorithm') or 'HS256',
+                  leeway=conf.get('leeway') or 0,
+                  embed=tuple(embed._conf) if embed is not None else (),
+                  max_claims_age=300 if max_claims_age is None else max_claims_age)
+
+
+_signer: Signer | None = None
+
+
+def signer() -> Signer:
+    """The token signer of this process. It's configured once with the
+    `operator` section of the user config.
+    """
+    global _signer
+    if _signer is None:
+        _signer = _load_signer(uconf().get('operator'))
+    return _signer
+
+
+def set_signer(new_signer: Signer) -> None:
+    """Replace the token signer of this process. Cached operators are
+    dropped, so that tokens of removed keys stop working at once.
+    """
+    global _signer
+    _signer = new_signer
+    operator_cache().clear()
+
+
+def reload_signer(conf: Union[dict[str, Any], UserConf, None]) -> Signer:
+    """Replace the token signer with one configured by `conf`, an `operator`
+    section like the one of the user config.
+    """
+    if isinstance(conf, dict):
+        conf = UserConf({underscore(k): v for k, v in conf.items()})
+    set_signer(_load_signer(conf))
+    return signer()
+
+
+def jwt_errors() -> tuple[type[Exception], type[Exception]]:
+    """The exceptions of expired and of invalid tokens. jwt is imported on
+    first use.
+    """
+    from jwt import ExpiredSignatureError, InvalidTokenError
+    return ExpiredSignatureError, InvalidTokenError
+
+
+def decode_jwt_claims(token: str) -> dict[str, Any]:
+    """Verify the token's signature and expiration time and return its
+    claims. This doesn't touch the database.
+    """
+    return signer().decode(token)
+
+
+def fetch_operator(claims: dict[str, Any], gname: str = 'default') -> ORMObject | None:
+    """Fetch the operator that decoded token claims refer to.
+    """
+    id = claims['id']
+    class_name = claims['class']
     graph = CGraph(gname)
     cls = graph.fetch(class_name).cls
     return cls.id(id).exec()
 
 
+def claims_operator(claims: dict[str, Any], gname: str = 'default') -> ORMObject | None:
+    """Build the operator from fields embedded in token claims. It only has
+    the embedded fields and the primary key. None is returned if the token
+    has no embedded fields, or if they can't be trusted anymore.
+    """
+    fields = claims.get('fields')
+    if fields is None:
+        return None
+    issued_at = claims.get('iat')
+    if issued_at is None or time() - issued_at > signer().max_claims_age:
+        return None
+    changed_at = operator_cache().changed_at(claims['class'], claims['id'])
+    if changed_at is not None and changed_at >= issued_at:
+        return None
+    cls = CGraph(gname).fetch(claims['class']).cls
+    primary = cls.cdef.primary_field.name
+    operator = cls()
+    values = {name: _from_json(operator, cls.cdef.field_named(name), value)
+              for name, value in fields.items()}
+    operator.update(**{**values, primary: claims['id']})
+    setattr(operator, '_is_partial', True)
+    setattr(operator, '_partial_picks', [primary, *fields.keys()])
+    operator._mark_not_new()
+    operator._mark_unmodified()
+    return operator
+
+
+def decode_jwt_token(token: str, gname: str = 'default') -> ORMObject | None:
+    return fetch_operator(decode_jwt_claims(token), gname)
+
+
 def encode_jwt_token(operator: ORMObject, expired_in: timedelta) -> str:
-    from jwt import encode
-    operator_conf = uconf().get('operator') or default_operator_conf
-    secret_key = operator_conf.get('secret_key')
-    data = {
-        'class': operator.__class__.__name__,
-        'id': operator._id,
-        'expired_at': (datetime.now() + expired_in).timestamp()
-    }
-    return encode(data, secret_key, algorithm='HS256')
+    return signer().encode(operator, expired_in)
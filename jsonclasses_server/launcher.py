@@ -0,0 +1,194 @@
+"""This module implements a pre-fork launcher. The model graph and the route
+tables are built once in the master process, then workers are forked which
+serve the app with uvicorn on a shared listening socket. Process state which
+can't cross a fork, like database connections and thread pools, is set up in
+each worker after the fork.
+
+    python -m jsonclasses_server app --workers 4
+
+Workers serve with uvicorn, which is installed with the `serve` extra:
+`pip install jsonclasses-server[serve]`.
+
+The master restarts workers which exit unexpectedly. `SIGHUP` replaces all
+workers with new ones, `SIGTERM` and `SIGINT` stop them. Old workers are
+drained: they stop accepting connections and finish in-flight requests
+before they exit, or are killed after the graceful timeout.
+"""
+from __future__ import annotations
+from typing import Any, Callable, final
+from os import fork, kill, waitpid, WNOHANG, _exit
+from signal import signal, SIGHUP, SIGINT, SIGTERM, SIGKILL, SIG_DFL, SIG_IGN
+from socket import socket, create_server
+from sys import stderr
+from time import monotonic, sleep
+from traceback import print_exc
+from thunderlight import App
+
+
+_after_fork: list[Callable[[], None]] = []
+
+
+def after_fork(callback: Callable[[], None]) -> Callable[[], None]:
+    """Register `callback` to run in each worker right after it's forked.
+    Use it to set up per-process resources of your own.
+    """
+    _after_fork.append(callback)
+    return callback
+
+
+def _uvicorn() -> Any:
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise ImportError('uvicorn is required to serve apps, install it '
+                          'with `pip install jsonclasses-server[serve]`.') from e
+    return uvicorn
+
+
+def _disconnect_databases() -> None:
+    from jsonclasses_pymongo.connection import Connection
+    for connection in Connection._graph_map.values():
+        connection.disconnect()
+
+
+@final
+class Launcher:
+    """Serve an app with `workers` forked worker processes.
+    """
+
+    def __init__(self: Launcher,
+                 app: App,
+                 host: str = '127.0.0.1',
+                 port: int = 8000,
+                 workers: int = 1,
+                 graceful_timeout: float = 30.0,
+                 backlog: int = 2048) -> None:
+        if workers < 1:
+            raise ValueError('workers should be at least 1.')
+        self._app = app
+        self._host = host
+        self._port = port
+        self._workers = workers
+        self._graceful_timeout = graceful_timeout
+        self._backlog = backlog
+        self._pids: set[int] = set()
+        self._draining: dict[int, float] = {}
+        self._reload = False
+        self._stop = False
+
+    @property
+    def workers(self: Launcher) -> int:
+        return self._workers
+
+    @property
+    def pids(self: Launcher) -> set[int]:
+        """The process ids of the serving workers.
+        """
+        return set(self._pids)
+
+    def run(self: Launcher) -> None:
+        """Bind the socket, fork the workers and supervise them until the
+        master is asked to stop.
+        """
+        _uvicorn()
+        sock = create_server((self._host, self._port), backlog=self._backlog)
+        sock.set_inheritable(True)
+        _disconnect_databases()
+        signal(SIGHUP, self._handle_reload)
+        signal(SIGTERM, self._handle_stop)
+        signal(SIGINT, self._handle_stop)
+        try:
+            self._spawn(sock)
+            while not self._stop:
+                if self._reload:
+                    self._reload = False
+                    self._drain(self._pids)
+                    self._spawn(sock)
+                self._reap(sock)
+                sleep(0.1)
+            self._drain(self._pids)
+            while len(self._draining) > 0:
+                self._reap(sock)
+                sleep(0.1)
+        finally:
+            for sig in (SIGHUP, SIGTERM, SIGINT):
+                signal(sig, SIG_DFL)
+            sock.close()
+
+    def _handle_reload(self: Launcher, signum: int, frame: Any) -> None:
+        self._reload = True
+
+    def _handle_stop(self: Launcher, signum: int, frame: Any) -> None:
+        self._stop = True
+
+    def _spawn(self: Launcher, sock: socket) -> None:
+        while len(self._pids) < self._workers:
+            pid = fork()
+            if pid == 0:
+                self._serve(sock)
+            self._pids.add(pid)
+
+    def _serve(self: Launcher, sock: socket) -> None:
+        code = 0
+        try:
+            signal(SIGHUP, SIG_IGN)
+            for sig in (SIGTERM, SIGINT):
+                signal(sig, SIG_DFL)
+            for callback in _after_fork:
+                callback()
+            uvicorn = _uvicorn()
+            config = uvicorn.Config(self._app, lifespan='off')
+            uvicorn.Server(config).run(sockets=[sock])
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except ImportError as e:
+            print(e, file=stderr)
+            code = 1
+        except BaseException:
+            print_exc()
+            code = 1
+        finally:
+            _exit(code)
+
+    def _drain(self: Launcher, pids: set[int]) -> None:
+        deadline = monotonic() + self._graceful_timeout
+        for pid in list(pids):
+            self._pids.discard(pid)
+            self._draining[pid] = deadline
+            _signal(pid, SIGTERM)
+
+    def _reap(self: Launcher, sock: socket) -> None:
+        now = monotonic()
+        for pid, deadline in list(self._draining.items()):
+            if deadline <= now:
+                _signal(pid, SIGKILL)
+        while True:
+            try:
+                pid, _ = waitpid(-1, WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self._draining.pop(pid, None)
+            if pid in self._pids:
+                self._pids.discard(pid)
+                if not self._stop:
+                    self._spawn(sock)
+
+
+def _signal(pid: int, sig: int) -> None:
+    try:
+        kill(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def serve(app: App,
+          host: str = '127.0.0.1',
+          port: int = 8000,
+          workers: int = 1,
+          graceful_timeout: float = 30.0) -> None:
+    """Serve `app` with `workers` forked worker processes until the master
+    process is stopped.
+    """
+    Launcher(app, host, port, workers, graceful_timeout).run()
@@ -0,0 +1,148 @@
+"""This module implements request limits. Request bodies, batch lengths,
+include depths and query strings are checked against configured limits
+before they are parsed or passed to the ORM. Server limits are configured
+with the `limits` section of the user config, classes can override them with
+`@api(limits=...)`.
+"""
+from __future__ import annotations
+from typing import Any, Optional, final
+from urllib.parse import unquote
+from thunderlight import Ctx
+from jsonclasses.uconf import uconf
+from jsonclasses.excs import ValidationException
+from .excs import PayloadTooLargeException
+from .metrics import metrics
+
+
+@final
+class Limits:
+    """Request limits. A limit of None means unlimited.
+    """
+
+    def __init__(self: Limits,
+                 max_body_bytes: Optional[int] = None,
+                 max_batch_length: Optional[int] = None,
+                 max_include_depth: Optional[int] = None,
+                 max_query_terms: Optional[int] = None) -> None:
+        self._max_body_bytes = max_body_bytes
+        self._max_batch_length = max_batch_length
+        self._max_include_depth = max_include_depth
+        self._max_query_terms = max_query_terms
+
+    @property
+    def max_body_bytes(self: Limits) -> Optional[int]:
+        """The maximum size of a request body in bytes.
+        """
+        return self._max_body_bytes
+
+    @property
+    def max_batch_length(self: Limits) -> Optional[int]:
+        """The maximum number of objects created by one request, or of
+        sub-requests in a batch request.
+        """
+        return self._max_batch_length
+
+    @property
+    def max_include_depth(self: Limits) -> Optional[int]:
+        """The maximum nesting of `_includes` in a query.
+        """
+        return self._max_include_depth
+
+    @property
+    def max_query_terms(self: Limits) -> Optional[int]:
+        """The maximum number of parameters in a query string.
+        """
+        return self._max_query_terms
+
+    def merge(self: Limits, other: Optional[Limits]) -> Limits:
+        """Limits with the limits which `other` sets replacing these.
+        """
+        if other is None:
+            return self
+        return Limits(
+            max_body_bytes=_pick(other.max_body_bytes, self.max_body_bytes),
+            max_batch_length=_pick(other.max_batch_length, self.max_batch_length),
+            max_include_depth=_pick(other.max_include_depth, self.max_include_depth),
+            max_query_terms=_pick(other.max_query_terms, self.max_query_terms))
+
+
+def _pick(value: Optional[int], default: Optional[int]) -> Optional[int]:
+    return default if value is None else value
+
+
+_server_limits: Limits | None = None
+
+
+def server_limits() -> Limits:
+    """The limits of this server. They're configured with the `limits`
+    section of the user config.
+    """
+    global _server_limits
+    if _server_limits is None:
+        conf = uconf().get('limits') or {}
+        _server_limits = Limits(
+            max_body_bytes=_pick(conf.get('max_body_bytes'), 10 * 1024 * 1024),
+            max_batch_length=_pick(conf.get('max_batch_length'), 1000),
+            max_include_depth=_pick(conf.get('max_include_depth'), 5),
+            max_query_terms=_pick(conf.get('max_query_terms'), 200))
+    return _server_limits
+
+
+def _too_large(reason: str, message: str) -> PayloadTooLargeException:
+    metrics().reject(reason)
+    return PayloadTooLargeException(message)
+
+
+def _invalid(reason: str, key: str, message: str) -> ValidationException:
+    metrics().reject(reason)
+    return ValidationException({key: message}, None)
+
+
+def check_query(qs: str, limits: Limits) -> None:
+    """Check the number of parameters and the include depth of query string
+    `qs` without parsing it.
+    """
+    if qs == '':
+        return
+    max_terms = limits.max_query_terms
+    if max_terms is not None and qs.count('&') >= max_terms:
+        raise _invalid('query_terms', '_query',
+                       f'query has more than {max_terms} terms')
+    max_depth = limits.max_include_depth
+    if max_depth is not None and 'includes' in qs:
+        for token in qs.split('&'):
+            key = unquote(token.partition('=')[0])
+            if key.count('_includes') > max_depth:
+                raise _invalid('include_depth', '_includes',
+                               f'includes are nested deeper than {max_depth}')
+
+
+def check_batch(length: int, limits: Limits) -> None:
+    """Check the number of items of a batch.
+    """
+    max_length = limits.max_batch_length
+    if max_length is not None and length > max_length:
+        raise _too_large('batch_length', f'batch has more than {max_length} items')
+
+
+def limit_body(ctx: Ctx, limits: Limits) -> None:
+    """Limit the size of the request body before it's read. The body is
+    rejected by its declared length, and while it's received if it grows
+    larger than the limit.
+    """
+    max_bytes = limits.max_body_bytes
+    if max_bytes is None:
+        return
+    length = ctx.req.headers.get('content-length')
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise _too_large('body_bytes', f'body is larger than {max_bytes} bytes')
+    receive = ctx.req._receive
+    received = 0
+    async def limited_receive() -> Any:
+        nonlocal received
+        message = await receive()
+        received += len(message.get('body', b''))
+        if received > max_bytes:
+            raise _too_large('body_bytes', f'body is larger than {max_bytes} bytes')
+        return message
+    ctx.req._receive = limited_receive
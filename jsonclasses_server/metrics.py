@@ -0,0 +1,288 @@
+"""This module implements request metrics. Requests are counted and timed
+per route, and request time is broken down into phases. Metrics are exposed
+in the Prometheus text format, with `metrics.token` the endpoint requires it
+in the `X-Metrics-Token` header.
+"""
+from __future__ import annotations
+from typing import Any, ContextManager, Iterator, Optional, final
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+from thunderlight import App, Ctx
+from thunderlight.json import JSON
+from jsonclasses.uconf import uconf
+from .error_log import error_log
+
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0)
+
+
+@final
+class Histogram:
+    """A cumulative histogram with fixed upper bounds.
+    """
+
+    def __init__(self: Histogram, buckets: tuple[float, ...] = BUCKETS) -> None:
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    @property
+    def count(self: Histogram) -> int:
+        return self._count
+
+    @property
+    def sum(self: Histogram) -> float:
+        return self._sum
+
+    def observe(self: Histogram, value: float) -> None:
+        self._counts[bisect_left(self._buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def lines(self: Histogram, name: str, labels: str) -> Iterator[str]:
+        total = 0
+        for bound, count in zip(self._buckets, self._counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {total}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self._count}'
+        yield f'{name}_sum{{{labels}}} {self._sum}'
+        yield f'{name}_count{{{labels}}} {self._count}'
+
+
+@final
+class Metrics:
+    """Request counts, error counts and latency histograms per route.
+    """
+
+    def __init__(self: Metrics,
+                 enabled: bool = False,
+                 path: str = '/metrics',
+                 token: Optional[str] = None) -> None:
+        self._enabled = enabled
+        self._path = path
+        self._token = token
+        self._requests: dict[tuple[str, str], int] = {}
+        self._errors: dict[tuple[str, str, str], int] = {}
+        self._latencies: dict[tuple[str, str], Histogram] = {}
+        self._phases: dict[tuple[str, str, str], Histogram] = {}
+        self._coalesced: dict[str, int] = {}
+        self._rejected: dict[str, int] = {}
+        self._lock = Lock()
+
+    @property
+    def enabled(self: Metrics) -> bool:
+        return self._enabled
+
+    @property
+    def path(self: Metrics) -> str:
+        """The path of the Prometheus endpoint.
+        """
+        return self._path
+
+    @property
+    def token(self: Metrics) -> Optional[str]:
+        """The token which the Prometheus endpoint requires in the
+        `X-Metrics-Token` header. Everyone can read metrics if it's None.
+        """
+        return self._token
+
+    def observe(self: Metrics,
+                method: str,
+                route: str,
+                code: int,
+                seconds: float,
+                phases: Optional[dict[str, float]] = None) -> None:
+        """Record a finished request.
+        """
+        key = (method, route)
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if code >= 400:
+                ekey = (method, route, f'{code // 100}xx')
+                self._errors[ekey] = self._errors.get(ekey, 0) + 1
+            histogram = self._latencies.get(key)
+            if histogram is None:
+                histogram = self._latencies[key] = Histogram()
+            histogram.observe(seconds)
+            for phase, value in (phases or {}).items():
+                pkey = (method, route, phase)
+                histogram = self._phases.get(pkey)
+                if histogram is None:
+                    histogram = self._phases[pkey] = Histogram()
+                histogram.observe(value)
+
+    def coalesce(self: Metrics, name: str) -> None:
+        """Record a read of class `name` which shared an in-flight result.
+        """
+        with self._lock:
+            self._coalesced[name] = self._coalesced.get(name, 0) + 1
+
+    def reject(self: Metrics, reason: str) -> None:
+        """Record a request rejected by a limit.
+        """
+        with self._lock:
+            self._rejected[reason] = self._rejected.get(reason, 0) + 1
+
+    def render(self: Metrics) -> str:
+        """Render metrics in the Prometheus text format.
+        """
+        prefix = 'jsonclasses_server'
+        lines: list[str] = []
+        with self._lock:
+            lines.append(f'# TYPE {prefix}_requests_total counter')
+            for (method, route), count in self._requests.items():
+                lines.append(f'{prefix}_requests_total'
+                             f'{{{_labels(method, route)}}} {count}')
+            lines.append(f'# TYPE {prefix}_errors_total counter')
+            for (method, route, status), count in self._errors.items():
+                labels = _labels(method, route, status=status)
+                lines.append(f'{prefix}_errors_total{{{labels}}} {count}')
+            lines.append(f'# TYPE {prefix}_request_seconds histogram')
+            for (method, route), histogram in self._latencies.items():
+                lines.extend(histogram.lines(f'{prefix}_request_seconds',
+                                             _labels(method, route)))
+            lines.append(f'# TYPE {prefix}_phase_seconds histogram')
+            for (method, route, phase), histogram in self._phases.items():
+                lines.extend(histogram.lines(f'{prefix}_phase_seconds',
+                                             _labels(method, route, phase=phase)))
+            lines.append(f'# TYPE {prefix}_coalesced_total counter')
+            for name, count in self._coalesced.items():
+                lines.append(f'{prefix}_coalesced_total'
+                             f'{{class="{_escape(name)}"}} {count}')
+            lines.append(f'# TYPE {prefix}_rejected_total counter')
+            for reason, count in self._rejected.items():
+                lines.append(f'{prefix}_rejected_total'
+                             f'{{reason="{_escape(reason)}"}} {count}')
+        lines.append(f'# TYPE {prefix}_exceptions_total counter')
+        for name, count in error_log().counts.items():
+            lines.append(f'{prefix}_exceptions_total'
+                         f'{{type="{_escape(name)}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self: Metrics) -> None:
+        with self._lock:
+            self._requests.clear()
+            self._errors.clear()
+            self._latencies.clear()
+            self._phases.clear()
+            self._coalesced.clear()
+            self._rejected.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(method: str, route: str, **extra: str) -> str:
+    items = {'method': method, 'route': route, **extra}
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in items.items())
+
+
+_metrics: Metrics | None = None
+
+
+def metrics() -> Metrics:
+    """The metrics of this process. It's configured with the `metrics`
+    section of the user config.
+    """
+    global _metrics
+    if _metrics is None:
+        conf = uconf().get('metrics') or {}
+        _metrics = Metrics(enabled=bool(conf.get('enabled')),
+                           path=conf.get('path') or '/metrics',
+                           token=conf.get('token'))
+    return _metrics
+
+
+_phases: ContextVar[Optional[dict[str, float]]] = ContextVar('phases', default=None)
+_untimed = nullcontext()
+
+
+@contextmanager
+def _timer(phases: dict[str, float], name: str) -> Iterator[None]:
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + perf_counter() - start
+
+
+def timed(name: str) -> ContextManager[Any]:
+    """Add the time spent in the block to phase `name` of the current
+    request. This does nothing if metrics are not being recorded.
+    """
+    phases = _phases.get()
+    if phases is None:
+        return _untimed
+    return _timer(phases, name)
+
+
+class _TimedJSON(JSON):
+
+    def __init__(self: _TimedJSON) -> None:
+        super().__init__()
+        self._encode = self.encode
+        self.encode = self.timed_encode
+
+    def timed_encode(self: _TimedJSON, data: Any) -> bytes:
+        with timed('serialize'):
+            return self._encode(data)
+
+
+_timed_json = _TimedJSON()
+
+
+def route_of(app: App, method: str, path: str) -> str:
+    """The URL template of the route which handles `path`.
+    """
+    match method:
+        case 'GET':
+            matchers = app._gets
+        case 'POST':
+            matchers = app._posts
+        case 'PATCH':
+            matchers = app._patches
+        case 'DELETE':
+            matchers = app._deletes
+        case _:
+            return '-'
+    for matcher in matchers:
+        if matcher.match(path) is not None:
+            return matcher.rule
+    return '-'
+
+
+def request_route(app: App, ctx: Ctx) -> str:
+    """The URL template of the route which handles the request of `ctx`.
+    It's matched once per request and kept in `ctx.state.route`.
+    """
+    route = getattr(ctx.state, 'route', None)
+    if route is None:
+        req = ctx.req
+        route = route_of(app, req.method, req.path)
+        ctx.state.route = route
+    return route
+
+
+def metrics_middleware(app: App) -> Any:
+    """Create the middleware which records request metrics of `app`.
+    """
+    recorder = metrics()
+    async def record_metrics_middleware(ctx: Ctx, next: Any) -> None:
+        phases: dict[str, float] = {}
+        token = _phases.set(phases)
+        ctx.res._json = _timed_json
+        start = perf_counter()
+        try:
+            await next(ctx)
+        finally:
+            seconds = perf_counter() - start
+            _phases.reset(token)
+            recorder.observe(ctx.req.method, request_route(app, ctx),
+                             ctx.res.code, seconds, phases)
+    return record_metrics_middleware
@@ -0,0 +1,217 @@
+"""This module defines `OperatorCache`. The operator cache maps verified
+authorization tokens to their resolved operator objects, so that
+authenticated requests don't fetch the operator from the database each time.
+
+The cache is kept in each process. When an operator is updated or deleted
+through the API, the invalidation goes through the invalidation backend to
+the cache of each process. The default backend only reaches this process,
+so with several workers, the other workers serve the old operator until the
+entry's time to live passes. Install a backend which sends invalidations
+through a message broker with `set_invalidation_backend` to avoid this.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional, final
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Lock
+from time import time
+from jsonclasses.uconf import uconf
+
+
+CHANGED_SIZE = 4096
+
+
+@final
+class OperatorCache:
+    """A bounded LRU cache of token to operator with time to live. An entry
+    never outlives the token's own expiration time. Each request gets its
+    own copy of the cached operator.
+    """
+
+    def __init__(self: OperatorCache, size: int = 1024, ttl: float = 60) -> None:
+        self._size = size
+        self._ttl = ttl
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._tokens: dict[tuple[str, Any], set[str]] = {}
+        self._changed: OrderedDict[tuple[str, Any], float] = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def size(self: OperatorCache) -> int:
+        return self._size
+
+    @property
+    def ttl(self: OperatorCache) -> float:
+        return self._ttl
+
+    @property
+    def enabled(self: OperatorCache) -> bool:
+        return self._size > 0 and self._ttl > 0
+
+    def get(self: OperatorCache, token: str) -> Optional[Any]:
+        """Get the cached operator of `token`. None is returned if the token
+        is not cached or the entry is expired.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            operator, expires_at = entry
+            if expires_at <= time():
+                self._remove(token)
+                return None
+            self._entries.move_to_end(token)
+        return deepcopy(operator)
+
+    def set(self: OperatorCache,
+            token: str,
+            operator: Any,
+            expired_at: Optional[float] = None) -> None:
+        """Cache the operator of `token` until `expired_at` or time to live.
+        """
+        if not self.enabled or operator is None:
+            return
+        expires_at = time() + self._ttl
+        if expired_at is not None:
+            expires_at = min(expires_at, expired_at)
+        key = self._key(operator)
+        operator = deepcopy(operator)
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (operator, expires_at)
+            self._tokens.setdefault(key, set()).add(token)
+            while len(self._entries) > self._size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self: OperatorCache, operator: Any) -> None:
+        """Remove every cached token of `operator` from this cache. Use
+        `invalidate_operator` to reach the caches of every process.
+        """
+        self.drop(operator.__class__.__name__, operator._id)
+
+    def drop(self: OperatorCache, class_name: str, id: Any) -> None:
+        """Remove every cached token of the operator of class `class_name`
+        and `id`.
+        """
+        key = (class_name, id)
+        with self._lock:
+            self._changed.pop(key, None)
+            self._changed[key] = time()
+            if len(self._changed) > CHANGED_SIZE:
+                self._changed.popitem(last=False)
+            for token in self._tokens.pop(key, set()):
+                self._entries.pop(token, None)
+
+    def changed_at(self: OperatorCache, class_name: str, id: Any) -> Optional[float]:
+        """When the operator was last invalidated in this process. Only the
+        latest invalidations are remembered.
+        """
+        with self._lock:
+            return self._changed.get((class_name, id))
+
+    def clear(self: OperatorCache) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens.clear()
+
+    def _key(self: OperatorCache, operator: Any) -> tuple[str, Any]:
+        return (operator.__class__.__name__, operator._id)
+
+    def _remove(self: OperatorCache, token: str) -> None:
+        operator, _ = self._entries.pop(token)
+        key = self._key(operator)
+        tokens = self._tokens.get(key)
+        if tokens is not None:
+            tokens.discard(token)
+            if len(tokens) == 0:
+                del self._tokens[key]
+
+
+Drop = Callable[[str, Any], None]
+
+
+class InvalidationBackend:
+    """The interface of operator invalidation backends. Subclass this to send
+    invalidations to the other processes and hosts of the server through a
+    message broker.
+    """
+
+    def publish(self: InvalidationBackend, class_name: str, id: Any) -> None:
+        """Send the invalidation of an operator to the listeners of every
+        process, this one included.
+        """
+        raise NotImplementedError
+
+    def listen(self: InvalidationBackend, drop: Drop) -> None:
+        """Register the listener of this process.
+        """
+        raise NotImplementedError
+
+
+@final
+class MemoryInvalidationBackend(InvalidationBackend):
+    """Delivers invalidations to the listener of this process only.
+    """
+
+    def __init__(self: MemoryInvalidationBackend) -> None:
+        self._drop: Optional[Drop] = None
+
+    def publish(self: MemoryInvalidationBackend, class_name: str, id: Any) -> None:
+        if self._drop is not None:
+            self._drop(class_name, id)
+
+    def listen(self: MemoryInvalidationBackend, drop: Drop) -> None:
+        self._drop = drop
+
+
+_invalidation_backend: InvalidationBackend | None = None
+_operator_cache: OperatorCache | None = None
+
+
+def invalidation_backend() -> InvalidationBackend:
+    """The operator invalidation backend of this process.
+    """
+    global _invalidation_backend
+    if _invalidation_backend is None:
+        _invalidation_backend = MemoryInvalidationBackend()
+    return _invalidation_backend
+
+
+def set_invalidation_backend(backend: InvalidationBackend) -> None:
+    """Replace the operator invalidation backend of this process.
+    """
+    global _invalidation_backend
+    _invalidation_backend = backend
+    if _operator_cache is not None:
+        backend.listen(_operator_cache.drop)
+
+
+def invalidate_operator(operator: Any) -> None:
+    """Remove every cached token of `operator` from the caches of every
+    process. This is called when an object is updated or deleted through
+    the API.
+    """
+    operator_cache()
+    invalidation_backend().publish(operator.__class__.__name__, operator._id)
+
+
+def operator_cache() -> OperatorCache:
+    """The operator cache of this process. It's configured with the
+    `operatorCache` section of the user config.
+    """
+    global _operator_cache
+    if _operator_cache is None:
+        conf = uconf().get('operator_cache')
+        if conf is None:
+            _operator_cache = OperatorCache()
+        else:
+            size = conf.get('size')
+            ttl = conf.get('ttl')
+            _operator_cache = OperatorCache(
+                size=1024 if size is None else size,
+                ttl=60 if ttl is None else ttl)
+        invalidation_backend().listen(_operator_cache.drop)
+    return _operator_cache
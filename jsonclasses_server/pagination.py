@@ -0,0 +1,208 @@
+"""This module implements keyset pagination for list routes. A page is
+fetched with a range filter on the sort key instead of a growing skip, so
+that page N is as fast as page 1. The `next` cursor is opaque to clients.
+
+Items which share a value of the sort key come back in no fixed order, and
+ORM queries can't order by the primary key to break ties. A page therefore
+never ends inside a run of tied items: it's cut before the run, or if the
+run fills the page, the whole run is fetched. The next page starts after
+the last value.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional, cast, final
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from binascii import Error as BinasciiError
+from datetime import date, datetime
+from enum import Enum
+from json import dumps, loads
+from qsparser import parse, stringify
+from jsonclasses.cdef import CDef
+from jsonclasses.jfield import JField
+from jsonclasses.excs import ValidationException
+from .api_object import APIObject
+from .qsutils import pop_param
+
+
+DEFAULT_KEY = 'created_at'
+MAX_TIES = 1000
+
+
+def encode_cursor(state: dict[str, Any]) -> str:
+    data = dumps(state, separators=(',', ':')).encode('utf-8')
+    return urlsafe_b64encode(data).decode('utf-8').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict[str, Any]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        state = loads(urlsafe_b64decode(padded.encode('utf-8')))
+    except (BinasciiError, ValueError):
+        state = None
+    if not isinstance(state, dict):
+        raise ValidationException({'_cursor': 'cursor is invalid'}, None)
+    return state
+
+
+def _cursor_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.name
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+@final
+class Page:
+    """A page of a paginated list query. It rewrites the client query into a
+    bounded query and computes page info from the fetched items.
+    """
+
+    def __init__(self: Page,
+                 cls: type[APIObject],
+                 qs: str,
+                 default_size: Optional[int],
+                 max_size: Optional[int]) -> None:
+        self._cls = cls
+        qs, cursor = pop_param(qs, '_cursor')
+        query = parse(qs) if qs != '' else {}
+        size = _pop_int(query, ['_limit', '_page_size', '_pageSize'])
+        if size is None or size <= 0:
+            size = default_size or max_size
+        if max_size is not None:
+            size = min(cast(int, size), max_size)
+        self._size = cast(int, size)
+        page_number = _pop_int(query, ['_page_number', '_pageNumber',
+                                       '_page_no', '_pageNo'])
+        if page_number is not None and page_number > 1:
+            query['_skip'] = (page_number - 1) * self._size
+        self._key, self._direction = self._sort_key(query)
+        self._state = decode_cursor(cursor) if cursor is not None else None
+        if self._state is not None:
+            query.pop('_skip', None)
+        if self._key is not None:
+            self._apply_keyset(query)
+        elif self._state is not None:
+            if not isinstance(self._state.get('o'), int):
+                raise ValidationException({'_cursor': 'cursor is invalid'}, None)
+            query['_skip'] = self._state['o']
+        self._offset = _int(query.get('_skip') or 0)
+        query['_limit'] = self._size + 1
+        self._query = query
+        self._qs = stringify(query)
+
+    @property
+    def qs(self: Page) -> str:
+        """The bounded query string to pass to the ORM.
+        """
+        return self._qs
+
+    @property
+    def size(self: Page) -> int:
+        return self._size
+
+    def _sort_key(self: Page, query: dict[str, Any]) -> tuple[Optional[str], int]:
+        cdef = self._cls.cdef
+        order = query.get('_order')
+        if order is None:
+            field = _field_named(cdef, DEFAULT_KEY)
+            if field is None:
+                return None, 1
+            query['_order'] = field.json_name
+            return field.json_name, 1
+        if not isinstance(order, str):
+            return None, 1
+        direction = -1 if order.startswith('-') else 1
+        key = order.lstrip('-')
+        if _field_named(cdef, cdef.jconf.input_key_strategy(key)) is None:
+            return None, 1
+        return key, direction
+
+    def _apply_keyset(self: Page, query: dict[str, Any]) -> None:
+        state = self._state
+        if state is None:
+            return
+        if state.get('k') != self._key or state.get('d') != self._direction \
+                or 'v' not in state:
+            raise ValidationException({'_cursor': 'cursor does not match '
+                                                  'the query order'}, None)
+        op = '_gt' if self._direction == 1 else '_lt'
+        existing = query.get(self._key)
+        if existing is None:
+            query[self._key] = {op: state['v']}
+        elif isinstance(existing, dict):
+            existing[op] = state['v']
+
+    def info(self: Page,
+             items: list[APIObject],
+             fetch: Callable[[str], list[APIObject]]) -> tuple[list[APIObject], dict[str, Any]]:
+        """Trim the fetched items to the page and return them with the page
+        info. `fetch` runs a query string, it fetches the items tied with
+        the last one if they fill the page.
+        """
+        has_next = len(items) > self._size
+        if has_next and self._key is not None:
+            items = self._cut(items, fetch)
+        else:
+            items = items[:self._size]
+        next_cursor: Optional[str] = None
+        if has_next and len(items) > 0:
+            next_cursor = encode_cursor(self._next_state(items))
+        return items, {
+            'hasNext': has_next,
+            'next': next_cursor,
+            'pageSize': self._size
+        }
+
+    def _value(self: Page, item: APIObject) -> Any:
+        return getattr(item, self._cls.cdef.jconf.input_key_strategy(cast(str, self._key)))
+
+    def _cut(self: Page,
+             items: list[APIObject],
+             fetch: Callable[[str], list[APIObject]]) -> list[APIObject]:
+        last = self._value(items[self._size])
+        page = [item for item in items[:self._size] if self._value(item) != last]
+        if len(page) > 0:
+            return page
+        query = {k: v for k, v in self._query.items() if k != '_skip'}
+        value = _cursor_value(last)
+        query[cast(str, self._key)] = {'_gte': value, '_lte': value}
+        query['_limit'] = MAX_TIES + 1
+        ties = fetch(stringify(query))
+        if len(ties) > MAX_TIES:
+            raise ValidationException({'_order': 'too many items share a '
+                                                 'value of the sort key'}, None)
+        return ties
+
+    def _next_state(self: Page, items: list[APIObject]) -> dict[str, Any]:
+        if self._key is None:
+            return {'o': self._offset + len(items)}
+        return {
+            'k': self._key,
+            'd': self._direction,
+            'v': _cursor_value(self._value(items[-1]))
+        }
+
+
+def _field_named(cdef: CDef, name: str) -> Optional[JField]:
+    try:
+        return cdef.field_named(name)
+    except ValueError:
+        return None
+
+
+def _pop_int(query: dict[str, Any], names: list[str]) -> Optional[int]:
+    result = None
+    for name in names:
+        value = query.pop(name, None)
+        if value is not None:
+            result = _int(value, name)
+    return result
+
+
+def _int(value: Any, name: str = '_skip') -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationException({name: 'value is not int'}, None) from None
@@ -0,0 +1,347 @@
+"""This module implements request profiling. A request is profiled with
+cProfile when it's sampled, when it has the profiling header, or when its
+route is hot: a request to the route took longer than the threshold, so the
+next few requests to it are profiled. Only the work of the profiled request
+is recorded, on the event loop and in executor threads. Each executor call
+is recorded into its own profile, these are merged when the request ends.
+The slowest profiles are kept and can be downloaded from the profiles
+endpoint. It's turned on with `profiling.enabled` of the user config, which
+requires `profiling.token`.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Coroutine, Generator, Optional, TypeVar, final
+from contextvars import ContextVar
+from cProfile import Profile
+from datetime import datetime, timezone
+from heapq import heappush, heappushpop
+from hmac import compare_digest
+from io import StringIO
+from itertools import count
+from marshal import dumps
+from pstats import Stats
+from random import random
+from threading import Lock
+from time import perf_counter
+from thunderlight import App, Ctx
+from jsonclasses.uconf import uconf
+from .metrics import request_route
+
+
+T = TypeVar('T')
+
+
+@final
+class Capture:
+    """A captured request profile.
+    """
+
+    def __init__(self: Capture,
+                 id: int,
+                 method: str,
+                 route: str,
+                 path: str,
+                 operator: Optional[str],
+                 trigger: str,
+                 code: int,
+                 seconds: float,
+                 stats: dict[Any, Any]) -> None:
+        self._id = id
+        self._method = method
+        self._route = route
+        self._path = path
+        self._operator = operator
+        self._trigger = trigger
+        self._code = code
+        self._seconds = seconds
+        self._stats = stats
+        self._time = datetime.now(timezone.utc)
+
+    @property
+    def id(self: Capture) -> int:
+        return self._id
+
+    @property
+    def seconds(self: Capture) -> float:
+        return self._seconds
+
+    def summary(self: Capture) -> dict[str, Any]:
+        return {
+            'id': self._id,
+            'method': self._method,
+            'route': self._route,
+            'path': self._path,
+            'operator': self._operator,
+            'trigger': self._trigger,
+            'status': self._code,
+            'ms': self._seconds * 1000,
+            'time': self._time.isoformat()
+        }
+
+    def dump(self: Capture) -> bytes:
+        """The profile in the `pstats` file format.
+        """
+        return dumps(self._stats)
+
+    def text(self: Capture, lines: int = 40) -> str:
+        """The functions with the most cumulative time.
+        """
+        stream = StringIO()
+        stats = Stats(_Source(self._stats), stream=stream)
+        stats.sort_stats('cumulative').print_stats(lines)
+        return stream.getvalue()
+
+
+@final
+class _Source:
+    # pstats loads stats from objects which have `create_stats`
+    def __init__(self: _Source, stats: dict[Any, Any]) -> None:
+        self.stats = stats
+
+    def create_stats(self: _Source) -> None:
+        pass
+
+
+def _merged(profiles: list[Profile]) -> dict[Any, Any]:
+    stats = Stats()
+    for profile in profiles:
+        profile.create_stats()
+        # pstats refuses to load empty stats
+        if len(profile.stats) > 0:
+            stats.add(_Source(profile.stats))
+    return stats.stats
+
+
+@final
+class Profiler:
+    """Decides which requests are profiled and keeps the slowest profiles.
+    """
+
+    def __init__(self: Profiler,
+                 enabled: bool = False,
+                 path: str = '/_profiles',
+                 size: int = 20,
+                 sample_rate: float = 0.0,
+                 threshold: Optional[float] = None,
+                 hot_count: int = 3,
+                 header: str = 'x-profile',
+                 token: Optional[str] = None) -> None:
+        if enabled and not token:
+            raise ValueError('profiling.token is required when profiling '
+                             'is enabled.')
+        self._enabled = enabled
+        self._path = path
+        self._size = size
+        self._sample_rate = sample_rate
+        self._threshold = threshold
+        self._hot_count = hot_count
+        self._header = header
+        self._token = token
+        self._hot: dict[tuple[str, str], int] = {}
+        self._captures: list[tuple[float, int, Capture]] = []
+        self._ids = count(1)
+        self._lock = Lock()
+
+    @property
+    def enabled(self: Profiler) -> bool:
+        return self._enabled
+
+    @property
+    def path(self: Profiler) -> str:
+        """The path of the profiles endpoint.
+        """
+        return self._path
+
+    @property
+    def token(self: Profiler) -> Optional[str]:
+        """The token which the profiling header and the profiles endpoint
+        require. It's only None if profiling is disabled.
+        """
+        return self._token
+
+    @property
+    def captures(self: Profiler) -> list[Capture]:
+        """The kept profiles, the slowest first.
+        """
+        with self._lock:
+            items = sorted(self._captures, reverse=True)
+        return [capture for _, _, capture in items]
+
+    def capture(self: Profiler, id: int) -> Optional[Capture]:
+        with self._lock:
+            for _, _, capture in self._captures:
+                if capture.id == id:
+                    return capture
+        return None
+
+    def trigger(self: Profiler, app: App, ctx: Ctx) -> Optional[str]:
+        """Why the request of `ctx` is profiled, or None if it isn't.
+        """
+        req = ctx.req
+        value = req.headers.get(self._header)
+        if value is not None and (self._token is None or
+                                  compare_digest(value.encode(), self._token.encode())):
+            return 'header'
+        if self._sample_rate > 0 and random() < self._sample_rate:
+            return 'sample'
+        if self._hot:
+            key = (req.method, request_route(app, ctx))
+            with self._lock:
+                remaining = self._hot.get(key)
+                if remaining is not None:
+                    if remaining <= 1:
+                        del self._hot[key]
+                    else:
+                        self._hot[key] = remaining - 1
+                    return 'hot'
+        return None
+
+    def observe(self: Profiler, app: App, ctx: Ctx, seconds: float) -> None:
+        """Make the route of an unprofiled request hot if the request was
+        slower than the threshold.
+        """
+        if self._threshold is None or seconds < self._threshold:
+            return
+        key = (ctx.req.method, request_route(app, ctx))
+        with self._lock:
+            self._hot[key] = self._hot_count
+
+    def keep(self: Profiler,
+             app: App,
+             ctx: Ctx,
+             trigger: str,
+             seconds: float,
+             profiles: list[Profile]) -> None:
+        """Keep the profiles of a request merged if it's among the slowest.
+        """
+        with self._lock:
+            if len(self._captures) >= self._size \
+                    and seconds <= self._captures[0][0]:
+                return
+        req = ctx.req
+        operator = getattr(ctx.state, 'operator', None)
+        capture = Capture(next(self._ids), req.method,
+                          request_route(app, ctx), req.path,
+                          None if operator is None else operator.__class__.__name__,
+                          trigger, ctx.res.code, seconds, _merged(profiles))
+        item = (seconds, capture.id, capture)
+        with self._lock:
+            if len(self._captures) < self._size:
+                heappush(self._captures, item)
+            else:
+                heappushpop(self._captures, item)
+
+    def clear(self: Profiler) -> None:
+        with self._lock:
+            self._captures.clear()
+            self._hot.clear()
+
+
+_profiler: Profiler | None = None
+
+
+def profiler() -> Profiler:
+    """The profiler of this process, configured with the `profiling`
+    section of the user config.
+    """
+    global _profiler
+    if _profiler is None:
+        conf = uconf().get('profiling') or {}
+        threshold_ms = conf.get('threshold_ms')
+        _profiler = Profiler(
+            enabled=bool(conf.get('enabled')),
+            path=conf.get('path') or '/_profiles',
+            size=conf.get('size') or 20,
+            sample_rate=conf.get('sample_rate') or 0.0,
+            threshold=None if threshold_ms is None else threshold_ms / 1000,
+            hot_count=conf.get('hot_count') or 3,
+            header=(conf.get('header') or 'x-profile').lower(),
+            token=conf.get('token'))
+    return _profiler
+
+
+_profiles: ContextVar[Optional[list[Profile]]] = ContextVar('profiles', default=None)
+_running = Lock()
+
+
+def profiled(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap `fn` which runs in another thread, so that it's recorded into a
+    profile of its own, which is merged into the profile of the current
+    request. A profile is never enabled in two threads at once.
+    """
+    profiles = _profiles.get()
+    if profiles is None:
+        return fn
+    def run_profiled(*args: Any) -> T:
+        profile = Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active in this thread
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+            profiles.append(profile)
+    return run_profiled
+
+
+class _Profiled:
+    # runs a coroutine with the profile enabled only while the coroutine
+    # itself runs, not while other tasks run on the event loop
+    def __init__(self: _Profiled,
+                 coro: Coroutine[Any, Any, T],
+                 profile: Profile) -> None:
+        self._coro = coro
+        self._profile = profile
+
+    def __await__(self: _Profiled) -> Generator[Any, Any, T]:
+        coro = self._coro
+        profile = self._profile
+        value: Any = None
+        error: Optional[BaseException] = None
+        while True:
+            profile.enable()
+            try:
+                if error is not None:
+                    yielded = coro.throw(error)
+                else:
+                    yielded = coro.send(value)
+            except StopIteration as e:
+                return e.value
+            finally:
+                profile.disable()
+            try:
+                value = yield yielded
+                error = None
+            except BaseException as e:
+                value = None
+                error = e
+
+
+def profiling_middleware(app: App) -> Any:
+    """Create the middleware which profiles requests of `app`.
+    """
+    recorder = profiler()
+    async def profile_middleware(ctx: Ctx, next: Any) -> None:
+        trigger = recorder.trigger(app, ctx)
+        # one request is profiled at a time, profilers can't nest
+        if trigger is None or not _running.acquire(blocking=False):
+            start = perf_counter()
+            try:
+                await next(ctx)
+            finally:
+                recorder.observe(app, ctx, perf_counter() - start)
+            return
+        profile = Profile()
+        profiles = [profile]
+        token = _profiles.set(profiles)
+        start = perf_counter()
+        try:
+            await _Profiled(next(ctx), profile)
+        finally:
+            seconds = perf_counter() - start
+            _profiles.reset(token)
+            _running.release()
+            recorder.keep(app, ctx, trigger, seconds, list(profiles))
+    return profile_middleware
@@ -0,0 +1,149 @@
+"""This module implements sparse fieldsets. A client asks for some fields of
+a class with `_fields` or `_pick`, like `?_fields=id,name`. The names are
+validated against the class definition and passed to the ORM as a `_pick`
+projection, so that other fields aren't fetched, decoded or serialized.
+Fields which the server needs are fetched too: the primary key, the sort key,
+the local keys of picked and included relationships and the fields a route
+asks for. If the class has read guards or a calculated field is picked, which
+may depend on any field, whole objects are fetched instead and only the
+picked fields are output.
+"""
+from __future__ import annotations
+from typing import Any, Iterable, Optional, final
+from qsparser import parse, stringify
+from jsonclasses.fdef import FStore
+from jsonclasses.excs import ValidationException
+from .api_object import APIObject
+
+
+PARAMS = ('_fields', '_pick')
+
+
+@final
+class Projection:
+    """The projection of a request. `qs` is passed to the ORM and `trim`
+    removes fields which weren't picked from output JSON data.
+    """
+
+    def __init__(self: Projection,
+                 qs: str,
+                 base_qs: str,
+                 keep: Optional[frozenset[str]]) -> None:
+        self._qs = qs
+        self._base_qs = base_qs
+        self._keep = keep
+
+    @property
+    def qs(self: Projection) -> str:
+        """The query string with the projection.
+        """
+        return self._qs
+
+    @property
+    def base_qs(self: Projection) -> str:
+        """The query string without the projection, for fetching objects
+        which are written.
+        """
+        return self._base_qs
+
+    @property
+    def keep(self: Projection) -> Optional[frozenset[str]]:
+        """The JSON names which are output, or None to output every field.
+        """
+        return self._keep
+
+    def trim(self: Projection, data: Any) -> Any:
+        keep = self._keep
+        if keep is None or not isinstance(data, dict):
+            return data
+        return {k: v for k, v in data.items() if k in keep}
+
+
+@final
+class Projector:
+    """Compiles projections of a class from query strings.
+    """
+
+    def __init__(self: Projector, cls: type[APIObject]) -> None:
+        cdef = cls.cdef
+        jconf = cdef.jconf
+        self._cls = cls
+        self._primary = cdef.primary_field.name
+        self._primary_json = cdef.primary_field.json_name
+        self._guarded = len(jconf.can_read) > 0
+        self._fields: dict[str, tuple[str, ...]] = {}
+        self._json_names: dict[str, tuple[str, ...]] = {}
+        self._calculated: set[str] = set()
+        for field in cdef.fields:
+            names: tuple[str, ...] = (field.name,)
+            json_names: tuple[str, ...] = (field.json_name,)
+            if field.fdef.fstore == FStore.LOCAL_KEY:
+                rk = jconf.ref_name_strategy(field)
+                names = (field.name, rk)
+                json_names = (field.json_name, jconf.output_key_strategy(rk))
+            if field.fdef.fstore == FStore.CALCULATED:
+                self._calculated.add(field.name)
+            for key in (field.name, field.json_name):
+                self._fields[key] = names
+                self._json_names[key] = json_names
+
+    def project(self: Projector,
+                qs: str,
+                needs: Iterable[str] = ()) -> Projection:
+        """The projection which the `_fields` or `_pick` parameter of `qs`
+        asks for. Fields named in `needs` are always fetched.
+        """
+        if '_fields' not in qs and '_pick' not in qs:
+            return Projection(qs, qs, None)
+        query = parse(qs)
+        requested: list[str] = []
+        for param in PARAMS:
+            requested.extend(_names(query.pop(param, None), param))
+        base_qs = stringify(query)
+        if len(requested) == 0:
+            return Projection(base_qs, base_qs, None)
+        picks: set[str] = {self._primary}
+        keep: set[str] = {self._primary_json}
+        full = self._guarded
+        for name in [*requested, *_includes(query)]:
+            names = self._fields.get(name)
+            if names is None:
+                raise ValidationException(
+                    {'_fields': f'unknown field \'{name}\''}, None)
+            picks.update(names)
+            keep.update(self._json_names[name])
+            full = full or names[0] in self._calculated
+        order = query.get('_order')
+        for key in (order if isinstance(order, list) else [order]):
+            if isinstance(key, str) and key.lstrip('-') in self._fields:
+                picks.update(self._fields[key.lstrip('-')])
+        for name in needs:
+            picks.update(self._fields[name])
+        if not full:
+            query['_pick'] = sorted(picks)
+        return Projection(stringify(query), base_qs, frozenset(keep))
+
+
+def _names(value: Any, param: str) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [name.strip() for name in value.split(',') if name.strip() != '']
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return value
+    raise ValidationException({param: 'value is not a list of field names'},
+                              None)
+
+
+def _includes(query: dict[str, Any]) -> list[str]:
+    includes = query.get('_includes')
+    if includes is None:
+        return []
+    items = includes if isinstance(includes, list) else [includes]
+    names: list[str] = []
+    for item in items:
+        if isinstance(item, str):
+            names.append(item)
+        elif isinstance(item, dict):
+            names.extend(item.keys())
+    return names
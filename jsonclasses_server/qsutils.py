@@ -0,0 +1,34 @@
+"""This module contains helpers for handling the server's own parameters in
+query strings before they are passed to the ORM.
+"""
+from __future__ import annotations
+from typing import Optional
+from json import dumps
+from urllib.parse import unquote
+from qsparser import parse
+
+
+def pop_param(qs: str, name: str) -> tuple[str, Optional[str]]:
+    """Remove the top level parameter `name` from the query string `qs`.
+    Returns the rest of the query string and the parameter's value.
+    """
+    if name not in qs:
+        return qs, None
+    kept: list[str] = []
+    value: Optional[str] = None
+    for token in qs.split('&'):
+        key, _, val = token.partition('=')
+        if unquote(key) == name:
+            value = unquote(val)
+        elif token != '':
+            kept.append(token)
+    return '&'.join(kept), value
+
+
+def normalize_qs(qs: str) -> str:
+    """A canonical form of the query string `qs` which doesn't depend on
+    the order of parameters.
+    """
+    if qs == '':
+        return ''
+    return dumps(parse(qs), sort_keys=True, separators=(',', ':'))
@@ -0,0 +1,195 @@
+"""This module implements rate limiting with token buckets. Each bucket holds
+up to `burst` tokens and is refilled with `rate` tokens per second, a request
+takes one token or is rejected with 429. Buckets are keyed by operator, client
+IP or route. The server limit is configured with the `rateLimit` section of
+the user config, classes can limit their routes with `@api(rate_limit=...)`
+and their session route with `@authorized(rate_limit=...)`.
+"""
+from __future__ import annotations
+from typing import Any, Optional, final
+from collections import OrderedDict
+from math import ceil
+from threading import Lock
+from time import monotonic
+from thunderlight import Ctx
+from jsonclasses.uconf import uconf
+from .excs import TooManyRequestsException
+from .metrics import metrics
+
+
+KEYS = ('operator', 'ip', 'route')
+
+
+@final
+class RateLimit:
+    """A token bucket rate limit. `rate` is the number of requests allowed
+    per second in the long run, `burst` is the number of requests allowed at
+    once. `key` is what the buckets are kept for: 'operator' keys buckets by
+    the operator, or the client IP for anonymous requests, 'ip' by the client
+    IP and 'route' shares one bucket among all clients of a route.
+    """
+
+    def __init__(self: RateLimit,
+                 rate: float,
+                 burst: Optional[int] = None,
+                 key: str = 'operator') -> None:
+        if rate <= 0:
+            raise ValueError('rate should be greater than 0.')
+        if key not in KEYS:
+            raise ValueError(f'key should be one of {", ".join(KEYS)}.')
+        self._rate = rate
+        self._burst = max(1, ceil(rate)) if burst is None else burst
+        self._key = key
+
+    @property
+    def rate(self: RateLimit) -> float:
+        return self._rate
+
+    @property
+    def burst(self: RateLimit) -> int:
+        return self._burst
+
+    @property
+    def key(self: RateLimit) -> str:
+        return self._key
+
+
+class RateLimitBackend:
+    """The interface of rate limit backends. Subclass this to keep buckets
+    in a store which is shared by processes or hosts.
+    """
+
+    async def take(self: RateLimitBackend,
+                   key: str,
+                   rate: float,
+                   burst: int,
+                   count: int = 1) -> float:
+        """Take `count` tokens from bucket `key`. Returns 0 if the tokens are
+        taken, otherwise the number of seconds until they are available.
+        """
+        raise NotImplementedError
+
+
+@final
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Bounded in-process token buckets. The least recently used bucket is
+    dropped when there are more than `size`, it starts full when it's used
+    again.
+    """
+
+    def __init__(self: MemoryRateLimitBackend, size: int = 65536) -> None:
+        self._size = size
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def size(self: MemoryRateLimitBackend) -> int:
+        return self._size
+
+    async def take(self: MemoryRateLimitBackend,
+                   key: str,
+                   rate: float,
+                   burst: int,
+                   count: int = 1) -> float:
+        now = monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = float(burst)
+            else:
+                tokens, stamp = bucket
+                tokens = min(float(burst), tokens + (now - stamp) * rate)
+            if tokens >= count:
+                tokens -= count
+                wait = 0.0
+            else:
+                wait = (count - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self._size:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+_rate_limiter: RateLimitBackend | None = None
+
+
+def rate_limiter() -> RateLimitBackend:
+    """The rate limit backend of this process. The default in-process
+    backend is configured with `rateLimit.size` of the user config.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        size = uconf().get('rate_limit.size')
+        _rate_limiter = MemoryRateLimitBackend(65536 if size is None else size)
+    return _rate_limiter
+
+
+def set_rate_limiter(backend: RateLimitBackend) -> None:
+    """Replace the rate limit backend of this process.
+    """
+    global _rate_limiter
+    _rate_limiter = backend
+
+
+def server_rate_limit() -> Optional[RateLimit]:
+    """The rate limit of all requests to this server, configured with
+    `rateLimit.rate`, `rateLimit.burst` and `rateLimit.key` of the user
+    config. Server buckets are keyed by operator or client IP.
+    """
+    conf = uconf().get('rate_limit') or {}
+    if conf.get('rate') is None:
+        return None
+    key = conf.get('key') or 'operator'
+    if key == 'route':
+        raise ValueError('rateLimit.key should be operator or ip.')
+    return RateLimit(conf['rate'], conf.get('burst'), key)
+
+
+def client_ip(ctx: Ctx) -> str:
+    """The IP address of the client. The first address of the
+    `X-Forwarded-For` header is used if `rateLimit.trustProxy` is set.
+    """
+    if uconf().get('rate_limit.trust_proxy'):
+        forwarded = ctx.req.headers.get('x-forwarded-for')
+        if forwarded:
+            return forwarded.partition(',')[0].strip()
+    client = ctx.req._scope.get('client')
+    return client[0] if client else '-'
+
+
+def bucket_key(ctx: Ctx, limit: RateLimit, route: str) -> str:
+    """The key of the bucket which a request to `route` takes from.
+    """
+    if limit.key == 'route':
+        return route
+    if limit.key == 'operator':
+        operator = ctx.state.operator
+        if operator is not None:
+            return f'{route}|{operator.__class__.__name__}/{operator._id}'
+    return f'{route}|{client_ip(ctx)}'
+
+
+async def check_rate(ctx: Ctx,
+                     limit: Optional[RateLimit],
+                     route: str,
+                     count: int = 1) -> None:
+    """Take a token for each of `count` requests to `route`, or raise
+    `TooManyRequestsException` if the bucket hasn't enough tokens.
+    """
+    if limit is None or count <= 0:
+        return
+    key = bucket_key(ctx, limit, route)
+    wait = await rate_limiter().take(key, limit.rate, limit.burst, count)
+    if wait > 0:
+        metrics().reject('rate_limit')
+        raise TooManyRequestsException(wait)
+
+
+def rate_limit_middleware(limit: RateLimit) -> Any:
+    """Create the middleware which limits the rate of all requests.
+    """
+    async def limit_rate_middleware(ctx: Ctx, next: Any) -> None:
+        await check_rate(ctx, limit, '*')
+        await next(ctx)
+    return limit_rate_middleware
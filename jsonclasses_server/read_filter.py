@@ -0,0 +1,51 @@
+"""This module implements read filters. A read filter turns the read
+permission of a class into a query predicate for an operator, so that list
+routes only fetch objects the operator can see.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional, Union
+from qsparser import parse, stringify
+from .api_object import APIObject
+
+
+ReadFilter = Callable[[type[APIObject], Any], Union[dict[str, Any], bool, None]]
+"""A read filter is called with the class and the operator. It returns a
+query which is merged into the list query, False if the operator can't read
+any object, or None if the permission can't be expressed as a query. In the
+last case, objects are only checked one by one after they are fetched.
+"""
+
+
+def owned_by(name: str) -> ReadFilter:
+    """A read filter which only allows operators to read objects whose field
+    `name` refers to the operator.
+    """
+    def read_filter(cls: type[APIObject], operator: Any) -> Union[dict[str, Any], bool, None]:
+        if operator is None:
+            return False
+        field = cls.cdef.field_named(name)
+        if field.is_local_many_ref or field.is_foreign_key_store:
+            return None
+        key = field.ref_name if field.is_local_one_ref else field.name
+        return {key: operator._id}
+    return read_filter
+
+
+def apply_read_filter(read_filter: Optional[ReadFilter],
+                      cls: type[APIObject],
+                      operator: Any,
+                      qs: str) -> Optional[str]:
+    """Merge the query of `read_filter` into `qs`. Keys of the read filter
+    take precedence over the client query. None is returned if the operator
+    can't read any object.
+    """
+    if read_filter is None:
+        return qs
+    query = read_filter(cls, operator)
+    if query is False:
+        return None
+    if query is None or query is True:
+        return qs
+    merged = parse(qs) if qs != '' else {}
+    merged.update(query)
+    return stringify(merged)
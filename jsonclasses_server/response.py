@@ -0,0 +1,33 @@
+"""This module installs custom responses onto thunderlight contexts.
+thunderlight sends a response by calling `ctx.res`, and has neither a hook
+to send custom bodies nor a way to replace the response of a context. A
+custom response is therefore installed by changing the class of the
+existing response. This relies on the attribute layout of thunderlight's
+`Res`, which is checked by the tests.
+"""
+from __future__ import annotations
+from typing import Any, TypeVar
+from thunderlight import Ctx
+from thunderlight.res import Res
+
+
+R = TypeVar('R', bound=Res)
+
+
+RES_ATTRS = ('_code', '_body', '_headers', '_json', '_file_path',
+             '_file_not_found')
+"""Attributes of thunderlight's `Res` which custom responses inherit."""
+
+
+def install_res(ctx: Ctx, cls: type[R], **attrs: Any) -> R:
+    """Turn the response of `ctx` into a `cls` response and set `attrs` on
+    it. `cls` must subclass `Res` and must not define `__init__`, as the
+    existing response is never initialized again.
+    """
+    if not issubclass(cls, Res) or '__init__' in vars(cls):
+        raise TypeError(f'{cls.__name__} can\'t be installed as a response.')
+    res = ctx.res
+    res.__class__ = cls
+    for name, value in attrs.items():
+        setattr(res, name, value)
+    return res
@@ -0,0 +1,187 @@
+"""This module implements response caching for read routes. Encoded
+responses are cached by class, object id or normalized query string and
+operator. Each class has a generation number which is bumped whenever the
+class is written through the API, entries of older generations are never
+read again.
+"""
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Optional, final
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from time import time
+from thunderlight import Ctx
+from thunderlight.json import JSON
+from jsonclasses.uconf import uconf
+from .api_object import APIObject
+from .qsutils import normalize_qs
+from .coalesce import request_key, single_flight
+from .metrics import timed
+
+
+Entry = tuple[str, bytes]
+json = JSON()
+
+
+class CacheBackend:
+    """The interface of response cache backends. Subclass this to store
+    responses in an external store.
+    """
+
+    async def get(self: CacheBackend, key: str) -> Optional[Entry]:
+        raise NotImplementedError
+
+    async def set(self: CacheBackend, key: str, entry: Entry, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def generation(self: CacheBackend, name: str) -> int:
+        raise NotImplementedError
+
+    async def bump(self: CacheBackend, name: str) -> None:
+        raise NotImplementedError
+
+
+@final
+class MemoryCacheBackend(CacheBackend):
+    """A bounded in-process LRU response cache.
+    """
+
+    def __init__(self: MemoryCacheBackend, size: int = 1024) -> None:
+        self._size = size
+        self._entries: OrderedDict[str, tuple[Entry, float]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._lock = Lock()
+
+    @property
+    def size(self: MemoryCacheBackend) -> int:
+        return self._size
+
+    async def get(self: MemoryCacheBackend, key: str) -> Optional[Entry]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if expires_at <= time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    async def set(self: MemoryCacheBackend, key: str, entry: Entry, ttl: float) -> None:
+        if self._size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (entry, time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    async def generation(self: MemoryCacheBackend, name: str) -> int:
+        return self._generations.get(name, 0)
+
+    async def bump(self: MemoryCacheBackend, name: str) -> None:
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+
+_response_cache: CacheBackend | None = None
+
+
+def response_cache() -> CacheBackend:
+    """The response cache backend of this process. The default in-process
+    backend is configured with `responseCache.size` of the user config.
+    """
+    global _response_cache
+    if _response_cache is None:
+        size = uconf().get('response_cache.size')
+        _response_cache = MemoryCacheBackend(1024 if size is None else size)
+    return _response_cache
+
+
+def set_response_cache(backend: CacheBackend) -> None:
+    """Replace the response cache backend of this process.
+    """
+    global _response_cache
+    _response_cache = backend
+
+
+def _graph(cls: type[APIObject]) -> str:
+    return f'@{cls.cdef.jconf.cgraph.name}'
+
+
+async def invalidate(cls: type[APIObject]) -> None:
+    """Invalidate cached responses after `cls` is written. Responses with
+    includes may embed objects of any class on the graph, so the graph
+    generation is bumped, too.
+    """
+    cache = response_cache()
+    await cache.bump(cls.__name__)
+    await cache.bump(_graph(cls))
+
+
+async def cache_key(cls: type[APIObject],
+                    target: Optional[str],
+                    qs: str,
+                    operator: Any) -> str:
+    cache = response_cache()
+    generation = str(await cache.generation(cls.__name__))
+    if '_includes' in qs:
+        generation += '.' + str(await cache.generation(_graph(cls)))
+    return f'{generation}:{request_key(cls, target, qs, operator)}'
+
+
+def etag(body: bytes) -> str:
+    return '"' + blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def respond(ctx: Ctx, entry: Entry) -> None:
+    """Respond with a cached entry, or with `304 Not Modified` if the client
+    already has it.
+    """
+    tag, body = entry
+    res = ctx.res
+    res.headers['etag'] = tag
+    if matches_etag(ctx.req.headers.get('if-none-match'), tag):
+        res.code = 304
+        return
+    res.headers['content-type'] = 'application/json'
+    res.body = body
+
+
+def matches_etag(header: Optional[str], tag: str) -> bool:
+    if header is None:
+        return False
+    for item in header.split(','):
+        item = item.strip()
+        if item == '*' or item.removeprefix('W/') == tag:
+            return True
+    return False
+
+
+async def cached(ctx: Ctx,
+                 cls: type[APIObject],
+                 target: Optional[str],
+                 ttl: float,
+                 fetch: Callable[[], Awaitable[Any]],
+                 coalesce: bool = False) -> None:
+    """Respond from the cache, or respond with the JSON data returned by
+    `fetch` and cache it for `ttl` seconds. With `coalesce`, concurrent
+    misses of the same entry share one fetch.
+    """
+    cache = response_cache()
+    key = await cache_key(cls, target, ctx.req.qs, ctx.state.operator)
+    async def load() -> Entry:
+        data = await fetch()
+        with timed('serialize'):
+            body = json.encode(data)
+        entry = (etag(body), body)
+        await cache.set(key, entry, ttl)
+        return entry
+    entry = await cache.get(key)
+    if entry is None:
+        if coalesce:
+            entry = await single_flight().do(cls.__name__, key, load)
+        else:
+            entry = await load()
+    respond(ctx, entry)
@@ -0,0 +1,194 @@
+"""This module defines `RouteDesc`. A route descriptor holds everything the
+generated routes of a class need that doesn't change between requests. It's
+compiled once when a class is decorated with `@api`, so that handlers don't
+rebuild field name sets or walk API configurations on each request.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Mapping, Optional, final
+from types import MappingProxyType
+from jsonclasses.jfield import JField
+from .api_object import APIObject
+from .aconf import AConf
+from .read_filter import ReadFilter
+from .encoder import json_encoder
+from .limits import Limits, server_limits
+from .ratelimit import RateLimit
+from .projection import Projector
+
+
+@final
+class RouteDesc:
+    """The compiled route descriptor of an API class. Its properties are
+    read only, it's never changed after it's compiled.
+    """
+
+    def __init__(self: RouteDesc, cls: type[APIObject], aconf: AConf) -> None:
+        cdef = cls.cdef
+        self._cls = cls
+        self._name = aconf.name
+        self._url = f'/{self._name}'
+        self._id_url = f'{self._url}/:id'
+        self._e_url = f'{self._url}/ensure'
+        self._session_url = f'{self._url}/session'
+        self._changes_url = f'{self._url}/_changes'
+        self._srname = aconf.cname_to_srname(cls.__name__)
+        self._actions = frozenset(aconf.actions)
+        self._unique_names = _valid_names(cdef.unique_fields)
+        self._identity_names = _valid_names(cdef.auth_identity_fields)
+        self._by_names = _valid_names(cdef.auth_by_fields)
+        self._identities = tuple(f.name for f in cdef.auth_identity_fields)
+        self._bys = tuple(f.name for f in cdef.auth_by_fields)
+        key_map: dict[str, str] = {}
+        for field in cdef.fields:
+            key_map[field.name] = field.name
+            key_map[field.json_name] = field.name
+        self._key_map = MappingProxyType(key_map)
+        self._streaming = aconf.streaming
+        self._page_size = aconf.page_size
+        self._max_page_size = aconf.max_page_size
+        self._paginated = aconf.paginated
+        self._cache_ttl = aconf.cache_ttl
+        self._read_filter = aconf.read_filter
+        self._serializer = aconf.serializer
+        self._encode = json_encoder(cls, self._serializer)
+        self._coalesce = aconf.coalesce
+        self._limits = server_limits().merge(aconf.limits)
+        self._rate_limit = aconf.rate_limit
+        self._projector = Projector(cls)
+        self._changes = aconf.changes
+
+    @property
+    def cls(self: RouteDesc) -> type[APIObject]:
+        return self._cls
+
+    @property
+    def name(self: RouteDesc) -> str:
+        """The resolved path name of the class.
+        """
+        return self._name
+
+    @property
+    def url(self: RouteDesc) -> str:
+        return self._url
+
+    @property
+    def id_url(self: RouteDesc) -> str:
+        return self._id_url
+
+    @property
+    def e_url(self: RouteDesc) -> str:
+        return self._e_url
+
+    @property
+    def session_url(self: RouteDesc) -> str:
+        return self._session_url
+
+    @property
+    def changes_url(self: RouteDesc) -> str:
+        return self._changes_url
+
+    @property
+    def srname(self: RouteDesc) -> str:
+        """The singular resource name used in session responses.
+        """
+        return self._srname
+
+    @property
+    def actions(self: RouteDesc) -> frozenset[str]:
+        return self._actions
+
+    @property
+    def unique_names(self: RouteDesc) -> frozenset[str]:
+        """Python and JSON names of the unique fields.
+        """
+        return self._unique_names
+
+    @property
+    def identity_names(self: RouteDesc) -> frozenset[str]:
+        """Python and JSON names of the auth identity fields.
+        """
+        return self._identity_names
+
+    @property
+    def by_names(self: RouteDesc) -> frozenset[str]:
+        """Python and JSON names of the auth by fields.
+        """
+        return self._by_names
+
+    @property
+    def identities(self: RouteDesc) -> tuple[str, ...]:
+        return self._identities
+
+    @property
+    def bys(self: RouteDesc) -> tuple[str, ...]:
+        return self._bys
+
+    @property
+    def key_map(self: RouteDesc) -> Mapping[str, str]:
+        """Maps Python and JSON field names to Python field names.
+        """
+        return self._key_map
+
+    @property
+    def streaming(self: RouteDesc) -> bool:
+        return self._streaming
+
+    @property
+    def page_size(self: RouteDesc) -> Optional[int]:
+        return self._page_size
+
+    @property
+    def max_page_size(self: RouteDesc) -> Optional[int]:
+        return self._max_page_size
+
+    @property
+    def paginated(self: RouteDesc) -> bool:
+        return self._paginated
+
+    @property
+    def cache_ttl(self: RouteDesc) -> Optional[float]:
+        return self._cache_ttl
+
+    @property
+    def read_filter(self: RouteDesc) -> Optional[ReadFilter]:
+        return self._read_filter
+
+    @property
+    def serializer(self: RouteDesc) -> str:
+        return self._serializer
+
+    @property
+    def encode(self: RouteDesc) -> Callable[[APIObject], dict[str, Any]]:
+        """Converts an object into JSON data with the class's serializer.
+        """
+        return self._encode
+
+    @property
+    def coalesce(self: RouteDesc) -> bool:
+        return self._coalesce
+
+    @property
+    def limits(self: RouteDesc) -> Limits:
+        """The server's request limits with the class's limits applied.
+        """
+        return self._limits
+
+    @property
+    def rate_limit(self: RouteDesc) -> Optional[RateLimit]:
+        return self._rate_limit
+
+    @property
+    def projector(self: RouteDesc) -> Projector:
+        """Compiles the sparse fieldsets of requests.
+        """
+        return self._projector
+
+    @property
+    def changes(self: RouteDesc) -> bool:
+        """Whether writes publish changes to the change feed route.
+        """
+        return self._changes
+
+
+def _valid_names(fields: list[JField]) -> frozenset[str]:
+    return frozenset([f.name for f in fields] + [f.json_name for f in fields])
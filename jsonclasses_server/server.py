@@ -1,16 +1,29 @@
 from __future__ import annotations
-from traceback import print_exception
+from typing import Optional
+from math import ceil
+from hmac import compare_digest
 from os import getcwd
 from os.path import join
-from thunderlight import Ctx, Next, gimme, use, get, App
+from thunderlight import Ctx, Next, gimme, use, get, post, App
 from jsonclasses.uconf import uconf
 from jsonclasses.excs import (ObjectNotFoundException,
                               ValidationException,
                               UniqueConstraintException,
                               UnauthorizedActionException)
-from jwt import DecodeError
-from .excs import AuthenticationException
-from .jwt_token import decode_jwt_token
+from .excs import (AuthenticationException,
+                   PayloadTooLargeException,
+                   TooManyRequestsException)
+from .jwt_token import (claims_operator, decode_jwt_claims, fetch_operator,
+                        jwt_errors)
+from .operator_cache import operator_cache
+from .executor import run
+from .metrics import metrics, metrics_middleware, timed
+from .error_log import error_log
+from .batch import BATCH_PATH, handle_batch
+from .static import StaticRoot, serve_file
+from .ratelimit import rate_limit_middleware, server_rate_limit
+from .compress import compression, compression_middleware
+from .profiling import profiler, profiling_middleware
 
 
 def _error_content(type: str, msg: str) -> dict[str, str]:
@@ -21,25 +34,102 @@ def _error_content(type: str, msg: str) -> dict[str, str]:
             }
         }
 
+
+def _error_code(e: Exception) -> int:
+    if isinstance(e, ObjectNotFoundException):
+        return 404
+    if isinstance(e, (ValidationException, UniqueConstraintException,
+                      AuthenticationException)):
+        return 400
+    if isinstance(e, UnauthorizedActionException):
+        return 401
+    if isinstance(e, PayloadTooLargeException):
+        return 413
+    if isinstance(e, TooManyRequestsException):
+        return 429
+    return 500
+
+
+def _token_allowed(ctx: Ctx, token: Optional[str], given: str, name: str) -> bool:
+    if token is None:
+        return True
+    if compare_digest(given.encode(), token.encode()):
+        return True
+    ctx.res.code = 401
+    ctx.res.json(_error_content('Unauthorized', f'{name} token is invalid'))
+    return False
+
+
+if metrics().enabled:
+    use(metrics_middleware(gimme()))
+
+    @get(metrics().path)
+    async def metrics_endpoint(ctx: Ctx):
+        given = ctx.req.headers.get('x-metrics-token') or ''
+        if not _token_allowed(ctx, metrics().token, given, 'metrics'):
+            return
+        ctx.res.text(metrics().render())
+        ctx.res.headers['content-type'] = 'text/plain; version=0.0.4'
+
+
+def _profile_allowed(ctx: Ctx) -> bool:
+    given = ctx.req.headers.get('x-profile-token') or ''
+    return _token_allowed(ctx, profiler().token, given, 'profile')
+
+
+if profiler().enabled:
+    use(profiling_middleware(gimme()))
+
+    @get(profiler().path)
+    async def profiles_endpoint(ctx: Ctx):
+        if not _profile_allowed(ctx):
+            return
+        ctx.res.json({'data': [c.summary() for c in profiler().captures]})
+
+    @get(f'{profiler().path}/:id')
+    async def profile_endpoint(ctx: Ctx):
+        if not _profile_allowed(ctx):
+            return
+        id = ctx.req.args['id']
+        capture = profiler().capture(int(id)) if id.isdigit() else None
+        if capture is None:
+            ctx.res.code = 404
+            ctx.res.json(_error_content('ObjectNotFoundException',
+                                        f'profile \'{id}\' is not found'))
+            return
+        if ctx.req.qs == 'format=text':
+            ctx.res.text(capture.text())
+            return
+        ctx.res.body = capture.dump()
+        ctx.res.headers['content-type'] = 'application/octet-stream'
+        ctx.res.headers['content-disposition'] = \
+            f'attachment; filename="profile-{capture.id}.prof"'
+
+
+if compression().enabled:
+    use(compression_middleware(compression()))
+
+
+async def _respond_error(ctx: Ctx, e: Exception) -> None:
+    code = _error_code(e)
+    error_log().record(ctx, e, code)
+    if code == 500:
+        content = _error_content('Internal Server Error', 'There is an internal server error.')
+    else:
+        content = _error_content(e.__class__.__name__, str(e))
+    if isinstance(e, ValidationException) or isinstance(e, UniqueConstraintException):
+        content['error']['fields'] = e.keypath_messages
+    if isinstance(e, TooManyRequestsException):
+        ctx.res.headers['retry-after'] = str(ceil(e.retry_after))
+    ctx.res.code = code
+    ctx.res.json(content)
+
 @use
 async def error_handler(ctx: Ctx, next: Next) -> None:
     try:
         await next(ctx)
     except Exception as e:
-        print_exception(type[e], value=e, tb=e.__traceback__)
-        code = 500
-        code = 404 if isinstance(e, ObjectNotFoundException) else code
-        code = 400 if isinstance(e, ValidationException) else code
-        code = 400 if isinstance(e, UniqueConstraintException) else code
-        code = 401 if isinstance(e, UnauthorizedActionException) else code
-        code = 400 if isinstance(e, AuthenticationException) else code
-        if code == 500:
-            content = _error_content('Internal Server Error', 'There is an internal server error.')
-        content = _error_content(e.__class__.__name__, str(e))
-        if isinstance(e, ValidationException) or isinstance(e, UniqueConstraintException):
-            content['error']['fields'] = e.keypath_messages
-        ctx.res.code = code
-        ctx.res.json(content)
+        await _respond_error(ctx, e)
 
 
 @use
@@ -58,6 +148,16 @@ async def handle_cors_headers_middleware(ctx: Ctx, next: Next) -> None:
     await next(ctx)
 
 
+_server_rate_limit = server_rate_limit()
+# ip keyed buckets don't need the operator, floods are rejected before their
+# tokens are decoded
+if _server_rate_limit is not None and _server_rate_limit.key == 'ip':
+    use(rate_limit_middleware(_server_rate_limit))
+
+
+_READ_METHODS = ('GET', 'HEAD')
+
+
 @use
 async def set_operator_middleware(ctx: Ctx, next: Next) -> None:
     if 'authorization' not in ctx.req.headers:
@@ -66,31 +166,74 @@ async def set_operator_middleware(ctx: Ctx, next: Next) -> None:
     else:
         authorization = ctx.req.headers['authorization']
         token = authorization[7:]
+        cache = operator_cache()
         try:
-            decoded = decode_jwt_token(token)
-            ctx.state.operator = decoded
-        except DecodeError:
+            with timed('auth'):
+                operator = cache.get(token)
+                if operator is None:
+                    claims = decode_jwt_claims(token)
+                    # read routes trust the operator fields in the token,
+                    # it's only partial, so it isn't cached for writes
+                    if ctx.req.method in _READ_METHODS:
+                        operator = claims_operator(claims)
+                    if operator is None:
+                        operator = await run(fetch_operator, claims)
+                        cache.set(token, operator, claims.get('expired_at'))
+            ctx.state.operator = operator
+        # the clauses are evaluated on errors only, jwt is imported lazily
+        except jwt_errors()[0]:
+            ctx.state.operator = None
+            content = _error_content('Unauthorized', 'authorization token is expired')
+            ctx.res.code = 401
+            ctx.res.json(content)
+            return
+        except jwt_errors()[1]:
             ctx.state.operator = None
             content = _error_content('Unauthorized', 'authorization token is invalid')
             ctx.res.code = 401
             ctx.res.json(content)
+            return
         except ObjectNotFoundException:
             ctx.state.operator = None
             content = _error_content('Unauthorized', 'user is not authorized')
             ctx.res.code = 401
             ctx.res.json(content)
+            return
         await next(ctx)
 
 
+if _server_rate_limit is not None and _server_rate_limit.key == 'operator':
+    use(rate_limit_middleware(_server_rate_limit))
+
+
+@post(BATCH_PATH)
+async def batch(ctx: Ctx) -> None:
+    await handle_batch(gimme(), ctx, _respond_error, _server_rate_limit)
+
+
+def _serve_static(root: StaticRoot) -> None:
+    @get(f'/public/{root.name}/*')
+    async def static_file_serving(ctx: Ctx):
+        await serve_file(ctx, root, ctx.req.args['*'])
+
+
 uploaders_conf = uconf().get('uploaders')
 if uploaders_conf is not None:
-    for k, v in uploaders_conf._conf.items():
+    for v in uploaders_conf._conf.values():
         if v['client'] == 'localfs':
-            @get(f'/public/{v["config"]["dir"]}/*')
-            async def static_file_serving(ctx: Ctx):
-                ctx.res.code = 200
-                ctx.res.file(join(getcwd(), 'public', v["config"]["dir"], ctx.req.args['*']))
+            config = v['config']
+            _serve_static(StaticRoot(join(getcwd(), 'public', config['dir']),
+                                     config['dir'],
+                                     config.get('max_age', 3600)))
 
 
-def server() -> App:
+def server(workers: Optional[int] = None,
+           host: str = '127.0.0.1',
+           port: int = 8000) -> App:
+    """The server app. With `workers`, the app is served by that many forked
+    worker processes, and this returns when the server is stopped.
+    """
+    if workers is not None:
+        from .launcher import serve
+        serve(gimme(), host, port, workers)
     return gimme()
@@ -0,0 +1,202 @@
+"""This module implements static file serving for `localfs` uploaders. Files
+are served with validators and cache headers, conditional requests are
+answered with `304 Not Modified`, and single byte ranges are supported for
+media. File bodies are sent with the ASGI zero-copy send extension when the
+server supports it, and streamed in chunks otherwise.
+"""
+from __future__ import annotations
+from typing import Optional, final
+from os import stat, stat_result
+from os.path import commonpath, join, realpath
+from stat import S_ISREG
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from anyio import open_file, to_thread
+from thunderlight import Ctx
+from thunderlight.res import Res
+from thunderlight.asgi import Scope, Receive, Send
+from jsonclasses.excs import ObjectNotFoundException
+from .response import install_res
+from .response_cache import matches_etag
+
+
+CHUNK_SIZE = 64 * 1024
+ZEROCOPY = 'http.response.zerocopysend'
+
+
+@final
+class StaticRoot:
+    """A directory of static files. The directory is resolved once, file
+    paths are checked to stay inside it.
+    """
+
+    def __init__(self: StaticRoot,
+                 directory: str,
+                 name: str,
+                 max_age: int = 3600) -> None:
+        self._directory = realpath(directory)
+        self._name = name
+        self._max_age = max_age
+
+    @property
+    def name(self: StaticRoot) -> str:
+        """The path name the files are served under.
+        """
+        return self._name
+
+    @property
+    def directory(self: StaticRoot) -> str:
+        return self._directory
+
+    @property
+    def max_age(self: StaticRoot) -> int:
+        return self._max_age
+
+    def resolve(self: StaticRoot, name: str) -> Optional[str]:
+        """The real path of file `name`. None is returned if the path leaves
+        the directory.
+        """
+        path = realpath(join(self._directory, name))
+        if commonpath([self._directory, path]) != self._directory:
+            return None
+        return path
+
+
+class FileRes(Res):
+    """A response whose body is a byte range of a file.
+    """
+
+    _path: str
+    _offset: int
+    _count: int
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.code,
+            "headers": list(self.headers.items()),
+        })
+        if ZEROCOPY in (scope.get('extensions') or {}):
+            # the file is opened and closed off the event loop
+            file = await to_thread.run_sync(open, self._path, 'rb')
+            try:
+                await send({
+                    "type": ZEROCOPY,
+                    "file": file,
+                    "offset": self._offset,
+                    "count": self._count,
+                    "more_body": False
+                })
+            finally:
+                await to_thread.run_sync(file.close)
+            return
+        async with await open_file(self._path, mode='rb') as file:
+            await file.seek(self._offset)
+            remaining = self._count
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                remaining = remaining - len(chunk) if len(chunk) > 0 else 0
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0
+                })
+        if self._count == 0:
+            await send({
+                "type": "http.response.body",
+                "body": b'',
+                "more_body": False
+            })
+
+
+def etag_of(result: stat_result) -> str:
+    return f'"{result.st_mtime_ns:x}-{result.st_size:x}"'
+
+
+def byte_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Parse a single range `Range` header into the first byte and the byte
+    count. None is returned if the whole file should be sent. ValueError is
+    raised if the range can't be satisfied.
+    """
+    if header is None or not header.startswith('bytes='):
+        return None
+    spec = header[6:].strip()
+    if ',' in spec:
+        return None
+    first, sep, last = spec.partition('-')
+    if sep != '-':
+        return None
+    try:
+        start = int(first) if first != '' else None
+        end = int(last) if last != '' else None
+    except ValueError:
+        return None
+    if start is None:
+        if end is None or end <= 0:
+            raise ValueError('range is not satisfiable')
+        start, end = max(size - end, 0), size - 1
+    else:
+        end = size - 1 if end is None else min(end, size - 1)
+    if start < 0 or start >= size or end < start:
+        raise ValueError('range is not satisfiable')
+    return start, end - start + 1
+
+
+def _not_modified(ctx: Ctx, tag: str, mtime: float) -> bool:
+    headers = ctx.req.headers
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        return matches_etag(if_none_match, tag)
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+def _range_applies(ctx: Ctx, tag: str, last_modified: str) -> bool:
+    if_range = ctx.req.headers.get('if-range')
+    return if_range is None or if_range == tag or if_range == last_modified
+
+
+async def serve_file(ctx: Ctx, root: StaticRoot, name: str) -> None:
+    """Respond with file `name` of `root`.
+    """
+    path = root.resolve(name)
+    if path is None:
+        raise ObjectNotFoundException('File not found.')
+    try:
+        result = await to_thread.run_sync(stat, path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise ObjectNotFoundException('File not found.')
+    if not S_ISREG(result.st_mode):
+        raise ObjectNotFoundException('File not found.')
+    res = ctx.res
+    tag = etag_of(result)
+    last_modified = formatdate(result.st_mtime, usegmt=True)
+    res.headers['etag'] = tag
+    res.headers['last-modified'] = last_modified
+    res.headers['cache-control'] = f'public, max-age={root.max_age}'
+    res.headers['accept-ranges'] = 'bytes'
+    if _not_modified(ctx, tag, result.st_mtime):
+        res.code = 304
+        return
+    size = result.st_size
+    offset, count = 0, size
+    if _range_applies(ctx, tag, last_modified):
+        try:
+            part = byte_range(ctx.req.headers.get('range'), size)
+        except ValueError:
+            res.code = 416
+            res.headers['content-range'] = f'bytes */{size}'
+            return
+        if part is not None:
+            offset, count = part
+            res.code = 206
+            res.headers['content-range'] = f'bytes {offset}-{offset + count - 1}/{size}'
+    res.headers['content-type'] = guess_type(path)[0] or 'application/octet-stream'
+    res.headers['content-length'] = str(count)
+    install_res(ctx, FileRes, _path=path, _offset=offset, _count=count)
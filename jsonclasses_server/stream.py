@@ -0,0 +1,105 @@
+"""This module adds streaming responses to thunderlight. A streaming response
+sends its body in chunks as they are produced instead of buffering the whole
+body in memory.
+"""
+from __future__ import annotations
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+from thunderlight import Ctx
+from thunderlight.res import Res
+from thunderlight.json import JSON
+from thunderlight.asgi import Scope, Receive, Send
+from jsonclasses.uconf import uconf
+from .executor import run
+from .response import install_res
+
+
+json = JSON()
+
+
+class StreamingRes(Res):
+    """A response whose body is sent chunk by chunk.
+    """
+
+    _chunks: AsyncIterator[bytes]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.code,
+            "headers": list(self.headers.items()),
+        })
+        async for chunk in self._chunks:
+            if len(chunk) > 0:
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": True
+                })
+        await send({
+            "type": "http.response.body",
+            "body": b'',
+            "more_body": False
+        })
+
+
+def stream(ctx: Ctx, chunks: AsyncIterator[bytes], content_type: str) -> None:
+    """Respond with a body streamed from `chunks`.
+    """
+    res = install_res(ctx, StreamingRes, _chunks=chunks)
+    res.headers['content-type'] = content_type
+    res.headers.pop('content-length', None)
+
+
+def chunk_size() -> int:
+    """The number of items serialized for each flushed chunk. It's configured
+    with `stream.chunkSize` of the user config.
+    """
+    return uconf().get('stream.chunk_size') or 100
+
+
+def wants_ndjson(ctx: Ctx) -> bool:
+    return 'application/x-ndjson' in ctx.req.headers.get('accept', '')
+
+
+async def stream_items(ctx: Ctx,
+                       items: Iterator[Any],
+                       encode: Callable[[Any], Optional[Any]]) -> None:
+    """Stream `items` as a JSON array under `data`, or as newline delimited
+    JSON when the client accepts `application/x-ndjson`. `encode` converts
+    an item into JSON data, returning None drops the item. Items are pulled
+    and encoded in chunks with the executor. The first chunk is produced
+    before the response starts, so query errors are still reported with
+    error status codes.
+    """
+    ndjson = wants_ndjson(ctx)
+    size = chunk_size()
+
+    def next_chunk() -> Optional[list[bytes]]:
+        encoded: list[bytes] = []
+        for item in items:
+            data = encode(item)
+            if data is not None:
+                encoded.append(json.encode(data))
+            if len(encoded) == size:
+                return encoded
+        return encoded if len(encoded) > 0 else None
+
+    first = await run(next_chunk)
+
+    async def chunks() -> AsyncIterator[bytes]:
+        chunk = first
+        if not ndjson:
+            yield b'{"data":['
+        started = False
+        while chunk is not None:
+            if ndjson:
+                yield b'\n'.join(chunk) + b'\n'
+            else:
+                yield (b',' if started else b'') + b','.join(chunk)
+                started = True
+            chunk = await run(next_chunk)
+        if not ndjson:
+            yield b']}'
+
+    content_type = 'application/x-ndjson' if ndjson else 'application/json'
+    stream(ctx, chunks(), content_type)
@@ -15,7 +15,7 @@ setup(name='jsonclasses-server',
       author='Fillmula Inc.',
       author_email='victor.teo@fillmula.com',
       license='MIT',
-      packages=find_packages(exclude=("tests")),
+      packages=find_packages(exclude=("tests", "benchmarks")),
       package_data={'jsonclasses_server': ['py.typed']},
       zip_safe=False,
       url='https://github.com/fillmula/jsonclasses-server',
@@ -27,4 +27,7 @@ setup(name='jsonclasses-server',
           'qsparser>=1.0.1,<2.0.0',
           'thunderlight>=0.6.0,<0.7.0',
           'pyjwt>=2.3.0,<3.0.0'
-      ])
+      ],
+      extras_require={
+          'serve': ['uvicorn>=0.17.0']
+      })
@@ -0,0 +1,91 @@
+from asyncio import run, wait_for
+from json import loads
+from unittest import TestCase
+from thunderlight import App, Ctx
+from thunderlight.req import Req
+from thunderlight.res import Res
+from thunderlight.json import JSON
+from jsonclasses.excs import ValidationException
+from jsonclasses_server.batch import _dispatch, _sub_requests, _scope, handle_batch
+from jsonclasses_server.excs import TooManyRequestsException
+from jsonclasses_server.ratelimit import (
+    MemoryRateLimitBackend, RateLimit, check_rate, rate_limiter,
+    set_rate_limiter
+)
+from jsonclasses_server.stream import stream
+
+
+def _batch_ctx(body: bytes = b'') -> Ctx:
+    scope = {'type': 'http', 'method': 'POST', 'path': '/_batch',
+             'query_string': b'', 'headers': []}
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    ctx = Ctx(Req(scope, receive, {}, '/_batch', JSON()), Res(JSON()))
+    ctx.state.operator = None
+    return ctx
+
+
+async def _on_error(ctx, e):
+    raise e
+
+
+class TestBatch(TestCase):
+
+    def test_sub_requests_requires_list_of_requests(self):
+        with self.assertRaises(ValidationException):
+            _sub_requests({'requests': {}})
+        with self.assertRaises(ValidationException):
+            _sub_requests({'requests': [{'method': 'GET'}]})
+
+    def test_sub_requests_are_sequential_by_default(self):
+        items, concurrent = _sub_requests({'requests': [{'path': '/songs'}]})
+        self.assertEqual(items, [{'path': '/songs'}])
+        self.assertFalse(concurrent)
+
+    def test_scope_takes_query_from_path_or_query(self):
+        parent = {'type': 'http', 'method': 'POST', 'path': '/_batch',
+                  'query_string': b'', 'headers': [(b'authorization', b'Bearer t'),
+                                                   (b'content-length', b'100')]}
+        scope = _scope(parent, {'path': '/songs?year=2'}, b'')
+        self.assertEqual(scope['method'], 'GET')
+        self.assertEqual(scope['path'], '/songs')
+        self.assertEqual(scope['query_string'], b'year=2')
+        self.assertIn((b'authorization', b'Bearer t'), scope['headers'])
+        self.assertIn((b'content-length', b'0'), scope['headers'])
+        scope = _scope(parent, {'method': 'patch', 'path': '/songs', 'query': 'a=1'}, b'{}')
+        self.assertEqual(scope['method'], 'PATCH')
+        self.assertEqual(scope['query_string'], b'a=1')
+
+    def test_event_streams_are_rejected(self):
+        app = App()
+        @app.get('/notes/events')
+        async def events(ctx):
+            async def chunks():
+                while True:
+                    yield b': ping\n\n'
+            stream(ctx, chunks(), 'text/event-stream')
+        for path in ('/notes/_changes', '/notes/events'):
+            result = run(wait_for(_dispatch(app, _batch_ctx(), {'path': path},
+                                            _on_error), 3))
+            self.assertEqual(loads(result)['status'], 400)
+
+    def test_sub_requests_take_tokens_of_the_server_rate_limit(self):
+        app = App()
+        @app.get('/notes')
+        async def notes(ctx):
+            ctx.res.json({'data': []})
+        previous = rate_limiter()
+        set_rate_limiter(MemoryRateLimitBackend())
+        self.addCleanup(set_rate_limiter, previous)
+        limit = RateLimit(0.001, 4, 'ip')
+        async def request(count):
+            body = JSON().encode({'requests': [{'path': '/notes'}] * count})
+            ctx = _batch_ctx(body)
+            # the middleware takes a token for the batch request itself
+            await check_rate(ctx, limit, '*')
+            await handle_batch(app, ctx, _on_error, limit)
+            return ctx
+        ctx = run(request(3))
+        self.assertEqual(len(loads(ctx.res.body)['data']), 3)
+        with self.assertRaises(TooManyRequestsException):
+            run(request(2))
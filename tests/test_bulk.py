@@ -0,0 +1,190 @@
+from __future__ import annotations
+from typing import Any, Iterator
+from types import SimpleNamespace
+from unittest import TestCase
+from jsonclasses import jsonclass, types
+from jsonclasses.excs import ObjectNotFoundException, ValidationException
+from jsonclasses_server.bulk import (save_many, reload_many, validate_update,
+                                     iterate_chunks, can_delete_by_query)
+
+
+class Query:
+
+    def __init__(self, result: list[Item]) -> None:
+        self.result = result
+
+    def exec(self) -> list[Item]:
+        return self.result
+
+
+class Item:
+
+    queries: list[tuple[list[str], str]] = []
+
+    def __init__(self, id: str) -> None:
+        self._id = id
+        self._operator = None
+        self.saved = False
+
+    def save(self) -> Item:
+        self.saved = True
+        return self
+
+    def opby(self, operator) -> Item:
+        self._operator = operator
+        return self
+
+    @classmethod
+    def ids(cls, ids: list[str], qs: str) -> Query:
+        cls.queries.append((ids, qs))
+        return Query([Item(id) for id in reversed(ids)])
+
+
+class MissingItem(Item):
+
+    @classmethod
+    def ids(cls, ids: list[str], qs: str) -> Query:
+        return Query([MissingItem(id) for id in ids[1:]])
+
+
+class BatchItem(Item):
+
+    batches: list[list[Item]] = []
+
+    @classmethod
+    def save_many(cls, objs: list[Item]) -> list[Item]:
+        cls.batches.append(objs)
+        return objs
+
+
+class ScoredItem:
+    """Objects of this class are scanned in score order, like a database
+    cursor walking an index, so a write which moves an object ahead of the
+    cursor makes it visited again.
+    """
+
+    cdef = SimpleNamespace(primary_field=SimpleNamespace(name='id'))
+    scores: dict[str, int] = {}
+    queries: list[dict[str, Any]] = []
+    id_queries: list[tuple[list[str], str]] = []
+
+    def __init__(self, id: str, score: int) -> None:
+        self._id = id
+        self.score = score
+
+    def save(self) -> ScoredItem:
+        ScoredItem.scores[self._id] = self.score
+        return self
+
+    @classmethod
+    def iterate(cls, **query: Any) -> Query:
+        cls.queries.append(query)
+        def scan() -> Iterator[ScoredItem]:
+            last = None
+            while True:
+                keys = sorted((s, i) for i, s in cls.scores.items()
+                              if last is None or (s, i) > last)
+                if len(keys) == 0:
+                    return
+                last = keys[0]
+                yield ScoredItem(last[1], last[0])
+        return Query(scan())
+
+    @classmethod
+    def ids(cls, ids: list[str], qs: str) -> Query:
+        cls.id_queries.append((ids, qs))
+        return Query([ScoredItem(id, cls.scores[id])
+                      for id in reversed(ids) if id in cls.scores])
+
+
+@jsonclass(class_graph='test_bulk')
+class BulkSong:
+    id: str = types.readonly.str.primary.required
+    name: str = types.str.maxlength(5).required
+    rank: int = types.int.min(0)
+
+
+@jsonclass(class_graph='test_bulk')
+class BulkDeletableSong:
+    id: str = types.readonly.str.primary.required
+
+    @classmethod
+    def delete_many(cls, qs: str) -> None:
+        pass
+
+
+@jsonclass(class_graph='test_bulk', can_delete=lambda obj, ctx: True)
+class BulkGuardedSong:
+    id: str = types.readonly.str.primary.required
+
+    @classmethod
+    def delete_many(cls, qs: str) -> None:
+        pass
+
+
+class TestBulk(TestCase):
+
+    def test_save_many_saves_each_object_without_batched_writer(self):
+        objs = save_many(Item, [Item('1'), Item('2')])
+        self.assertEqual([o.saved for o in objs], [True, True])
+
+    def test_save_many_uses_batched_writer_if_provided(self):
+        objs = [BatchItem('1'), BatchItem('2')]
+        save_many(BatchItem, objs)
+        self.assertEqual(BatchItem.batches, [objs])
+        self.assertEqual([o.saved for o in objs], [False, False])
+
+    def test_reload_many_uses_one_query_and_keeps_order(self):
+        Item.queries = []
+        objs = [Item('1').opby('a'), Item('2').opby('b'), Item('3').opby('c')]
+        result = reload_many(Item, objs, '_includes[0]=tags')
+        self.assertEqual(Item.queries, [(['1', '2', '3'], '_includes[0]=tags')])
+        self.assertEqual([r._id for r in result], ['1', '2', '3'])
+        self.assertEqual([r._operator for r in result], ['a', 'b', 'c'])
+        self.assertIsNot(result[0], objs[0])
+
+    def test_reload_many_raises_if_an_object_is_not_refetched(self):
+        with self.assertRaises(ObjectNotFoundException):
+            reload_many(MissingItem, [MissingItem('1'), MissingItem('2')], '')
+
+    def test_validate_update_reports_errors_of_updated_fields_only(self):
+        validate_update(BulkSong, {'rank': 1})
+        with self.assertRaises(ValidationException) as context:
+            validate_update(BulkSong, {'rank': -1})
+        self.assertEqual(list(context.exception.keypath_messages.keys()),
+                         ['rank'])
+
+    def test_iterate_chunks_collects_ids_before_yielding(self):
+        ScoredItem.scores = {str(n): n for n in range(5)}
+        ScoredItem.queries = []
+        ScoredItem.id_queries = []
+        visited: list[str] = []
+        for chunk in iterate_chunks(ScoredItem, 'score[_gte]=0', 2):
+            for item in chunk:
+                visited.append(item._id)
+                item.score += 10
+                item.save()
+        self.assertEqual(visited, ['0', '1', '2', '3', '4'])
+        self.assertEqual(ScoredItem.queries,
+                         [{'score': {'_gte': '0'}, '_pick': ['id']}])
+        self.assertEqual([ids for ids, _ in ScoredItem.id_queries],
+                         [['0', '1'], ['2', '3'], ['4']])
+
+    def test_iterate_chunks_skips_removed_objects_and_keeps_includes(self):
+        ScoredItem.scores = {str(n): n for n in range(3)}
+        ScoredItem.queries = []
+        ScoredItem.id_queries = []
+        chunks = iterate_chunks(ScoredItem, '_includes[0]=tags', 2)
+        first = next(chunks)
+        del ScoredItem.scores['2']
+        self.assertEqual([i._id for i in first], ['0', '1'])
+        self.assertEqual(list(chunks), [])
+        self.assertEqual(ScoredItem.queries, [{'_pick': ['id']}])
+        self.assertEqual(ScoredItem.id_queries[0][1], '_includes[0]=tags')
+
+    def test_can_delete_by_query_requires_a_batched_delete(self):
+        self.assertFalse(can_delete_by_query(BulkSong))
+        self.assertTrue(can_delete_by_query(BulkDeletableSong))
+
+    def test_can_delete_by_query_is_false_with_delete_rules(self):
+        self.assertFalse(can_delete_by_query(BulkGuardedSong))
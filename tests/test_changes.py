@@ -0,0 +1,113 @@
+from __future__ import annotations
+from asyncio import run, wait_for
+from types import SimpleNamespace
+from unittest import TestCase
+from jsonclasses import jsonclass, types
+from jsonclasses.excs import ValidationException, UnauthorizedActionException
+from jsonclasses_server.changes import (
+    Change, ChangeHub, Subscriber, _watch_disconnect, filters, frame,
+    json_names
+)
+from jsonclasses_server.projection import Projector
+
+
+@jsonclass(class_graph='changes')
+class ChangedNote:
+    id: str = types.str.primary.required
+    text: str
+    tag: str
+
+
+def _encode(note: ChangedNote) -> dict:
+    operator = getattr(note, '_operator')
+    if operator is not None and operator._id == 'stranger':
+        raise UnauthorizedActionException('unauthorized')
+    return note.tojson()
+
+
+def _subscriber(operator=None, qs='', size=10) -> Subscriber:
+    projection = Projector(ChangedNote).project(qs)
+    query = {'tag': 'a'} if 'tag=a' in qs else {}
+    return Subscriber(ChangedNote, operator, _encode, projection,
+                      filters(query, json_names(ChangedNote)), size)
+
+
+def _change(kind: str, *notes: ChangedNote) -> Change:
+    return Change(kind, 'changes', 'ChangedNote', [n.id for n in notes], list(notes))
+
+
+class TestChanges(TestCase):
+
+    def test_full_queue_is_replaced_with_a_reset(self):
+        subscriber = _subscriber(size=2)
+        subscriber.push(b'1')
+        subscriber.push(b'2')
+        subscriber.push(b'3')
+        self.assertEqual(run(subscriber.pop(0)), [frame('reset', {})])
+        subscriber.push(b'4')
+        self.assertEqual(run(subscriber.pop(0)), [b'4'])
+        self.assertEqual(run(subscriber.pop(0)), [])
+        subscriber.close()
+        self.assertIsNone(run(subscriber.pop(0)))
+
+    def test_filters_are_validated(self):
+        names = json_names(ChangedNote)
+        self.assertEqual(filters({'tag': 'a', '_fields': 'text'}, names), {'tag': 'a'})
+        with self.assertRaises(ValidationException):
+            filters({'nope': 'a'}, names)
+        with self.assertRaises(ValidationException):
+            filters({'tag': {'_gt': 'a'}}, names)
+
+    def test_hub_delivers_readable_matching_changes(self):
+        hub = ChangeHub()
+        everyone = _subscriber()
+        tagged = _subscriber(qs='tag=a&_fields=text')
+        stranger = _subscriber(SimpleNamespace(_id='stranger'))
+        for subscriber in (everyone, tagged, stranger):
+            hub.subscribe(subscriber)
+        a = ChangedNote(id='1', text='x', tag='a')
+        b = ChangedNote(id='2', text='y', tag='b')
+        run(hub.deliver(_change('create', a, b)))
+        self.assertEqual(len(run(everyone.pop(0))), 2)
+        self.assertEqual(run(tagged.pop(0)), [frame('create', {
+            'id': '1', 'data': {'id': '1', 'text': 'x'}})])
+        self.assertEqual(run(stranger.pop(0)), [])
+        run(hub.deliver(_change('delete', b)))
+        self.assertEqual(run(everyone.pop(0)), [frame('delete', {'id': '2'})])
+        self.assertEqual(run(tagged.pop(0)), [])
+
+    def test_hub_delivers_resets_and_forgets_unsubscribed(self):
+        hub = ChangeHub()
+        subscriber = _subscriber()
+        hub.subscribe(subscriber)
+        run(hub.deliver(Change('reset', 'changes', 'ChangedNote', [])))
+        self.assertEqual(run(subscriber.pop(0)), [frame('reset', {})])
+        hub.unsubscribe(subscriber)
+        self.assertEqual(hub.count(ChangedNote), 0)
+        run(hub.deliver(_change('create', ChangedNote(id='1', text='x', tag='a'))))
+        self.assertEqual(run(subscriber.pop(0)), [])
+
+    def test_disconnect_watcher_stops_on_a_receive_without_disconnect(self):
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        ctx = SimpleNamespace(req=SimpleNamespace(_receive=receive))
+        subscriber = _subscriber()
+        run(wait_for(_watch_disconnect(ctx, subscriber), 3))
+        self.assertFalse(subscriber.closed)
+
+    def test_remote_deletes_become_resets(self):
+        hub = ChangeHub()
+        subscriber = _subscriber()
+        hub.subscribe(subscriber)
+        run(hub.deliver(Change('delete', 'changes', 'ChangedNote', ['1'])))
+        self.assertEqual(run(subscriber.pop(0)), [frame('reset', {})])
+
+    def test_encoding_errors_are_not_hidden(self):
+        def broken(note):
+            raise KeyError('bug')
+        hub = ChangeHub()
+        subscriber = Subscriber(ChangedNote, None, broken,
+                                Projector(ChangedNote).project(''), {}, 10)
+        hub.subscribe(subscriber)
+        with self.assertRaises(KeyError):
+            run(hub.deliver(_change('create', ChangedNote(id='1', text='x', tag='a'))))
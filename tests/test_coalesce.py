@@ -0,0 +1,40 @@
+from __future__ import annotations
+from asyncio import gather, sleep
+from unittest import IsolatedAsyncioTestCase
+from jsonclasses_server.coalesce import SingleFlight
+from jsonclasses_server.metrics import metrics
+
+
+class TestCoalesce(IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_with_same_key_share_one_fetch(self):
+        flights = SingleFlight()
+        calls = []
+        async def fetch():
+            calls.append(1)
+            await sleep(0.01)
+            return b'{}'
+        results = await gather(*[flights.do('Song', 'k', fetch) for _ in range(5)])
+        self.assertEqual(results, [b'{}'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertIn('jsonclasses_server_coalesced_total{class="Song"}',
+                      metrics().render())
+
+    async def test_calls_after_landing_fetch_again(self):
+        flights = SingleFlight()
+        calls = []
+        async def fetch():
+            calls.append(1)
+            return len(calls)
+        self.assertEqual(await flights.do('Song', 'k', fetch), 1)
+        self.assertEqual(await flights.do('Song', 'k', fetch), 2)
+
+    async def test_errors_are_shared(self):
+        flights = SingleFlight()
+        async def fetch():
+            await sleep(0.01)
+            raise ValueError('x')
+        results = await gather(flights.do('Song', 'k', fetch),
+                               flights.do('Song', 'k', fetch),
+                               return_exceptions=True)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
@@ -0,0 +1,28 @@
+from __future__ import annotations
+from gzip import decompress
+from unittest import TestCase
+from jsonclasses_server.compress import Compression, negotiate
+
+
+class TestCompress(TestCase):
+
+    def test_negotiate_picks_highest_weight(self):
+        self.assertEqual(negotiate('gzip, br', ('br', 'gzip')), 'br')
+        self.assertEqual(negotiate('gzip;q=1, br;q=0.5', ('br', 'gzip')), 'gzip')
+        self.assertEqual(negotiate('br;q=0', ('br', 'gzip')), None)
+        self.assertEqual(negotiate('*', ('gzip',)), 'gzip')
+        self.assertEqual(negotiate('identity', ('br', 'gzip')), None)
+        self.assertEqual(negotiate(None, ('gzip',)), None)
+
+    def test_gzip_compressor_streams_decodable_chunks(self):
+        compressor = Compression().compressor('gzip')
+        body = compressor.compress(b'{"data":[') + compressor.compress(b'1,2') \
+            + compressor.compress(b']}') + compressor.finish()
+        self.assertEqual(decompress(body), b'{"data":[1,2]}')
+
+    def test_gzip_compressor_compresses_whole_body(self):
+        compressor = Compression(gzip_level=9).compressor('gzip')
+        data = b'{"name":"jsonclasses"}' * 100
+        body = compressor.compress_all(data)
+        self.assertLess(len(body), len(data))
+        self.assertEqual(decompress(body), data)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+from unittest import TestCase
+from datetime import date, datetime
+from enum import Enum
+from jsonclasses import jsonclass, types
+from jsonclasses_server.encoder import Encoder, encoder
+
+
+class EncodedGenre(Enum):
+    POP = 'pop'
+    ROCK = 'rock'
+
+
+@jsonclass
+class EncodedArtist:
+    id: str = types.readonly.str.primary.mongoid.required
+    name: str
+    secret: str = types.writeonly.str
+    albums: list[EncodedAlbum] = types.listof('EncodedAlbum').linkedby('artist')
+
+
+@jsonclass
+class EncodedAlbum:
+    id: str = types.readonly.str.primary.mongoid.required
+    title: str
+    genre: EncodedGenre = types.enum(EncodedGenre)
+    released_on: date
+    tags: list[str]
+    scores: dict[str, int]
+    artist: EncodedArtist = types.objof('EncodedArtist').linkto
+    created_at: datetime = types.readonly.datetime.tscreated.required
+
+
+@jsonclass(output_null=True)
+class EncodedNullable:
+    id: str = types.readonly.str.primary.mongoid.required
+    name: str
+
+
+class TestEncoder(TestCase):
+
+    def album(self) -> EncodedAlbum:
+        return EncodedAlbum(title='a', genre=EncodedGenre.ROCK,
+                            released_on=date(2021, 5, 1), tags=['x', 'y'],
+                            scores={'a': 1})
+
+    def test_encoder_matches_tojson_for_scalar_fields(self):
+        album = self.album()
+        self.assertEqual(Encoder(EncodedAlbum).encode(album), album.tojson())
+
+    def test_encoder_matches_tojson_for_linked_objects(self):
+        artist = EncodedArtist(name='n', secret='s')
+        albums = [self.album(), self.album()]
+        artist.albums = albums
+        self.assertEqual(Encoder(EncodedArtist).encode(artist), artist.tojson())
+        self.assertEqual(Encoder(EncodedAlbum).encode(albums[0]),
+                         albums[0].tojson())
+
+    def test_encoder_matches_tojson_with_output_null(self):
+        obj = EncodedNullable()
+        self.assertEqual(Encoder(EncodedNullable).encode(obj), obj.tojson())
+
+    def test_encoders_are_compiled_once(self):
+        self.assertIs(encoder(EncodedAlbum), encoder(EncodedAlbum))
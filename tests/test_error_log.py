@@ -0,0 +1,55 @@
+from __future__ import annotations
+from unittest import TestCase
+from logging import Handler, LogRecord, getLogger
+from jsonclasses_server.error_log import ErrorLog
+
+
+class ListHandler(Handler):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[LogRecord] = []
+
+    def emit(self, record: LogRecord) -> None:
+        self.records.append(record)
+
+
+class FakeReq:
+    method = 'GET'
+    path = '/songs/1'
+
+
+class FakeCtx:
+    req = FakeReq()
+
+
+class TestErrorLog(TestCase):
+
+    def setUp(self) -> None:
+        self.handler = ListHandler()
+        self.logger = getLogger(f'test_error_log.{self.id()}')
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+
+    def test_client_errors_are_rate_limited(self):
+        log = ErrorLog(rate_limit=2, logger=self.logger)
+        for _ in range(5):
+            log.record(FakeCtx(), ValueError('bad'), 400)
+        self.assertEqual(len(self.handler.records), 2)
+        self.assertIsNone(self.handler.records[0].exc_info)
+        self.assertEqual(log.counts, {'ValueError': 5})
+
+    def test_client_errors_can_be_sampled_out(self):
+        log = ErrorLog(sample_rate=0.0, logger=self.logger)
+        log.record(FakeCtx(), ValueError('bad'), 404)
+        self.assertEqual(len(self.handler.records), 0)
+        self.assertEqual(log.counts, {'ValueError': 1})
+
+    def test_server_errors_are_logged_with_tracebacks(self):
+        log = ErrorLog(rate_limit=0, sample_rate=0.0, logger=self.logger)
+        try:
+            raise RuntimeError('boom')
+        except RuntimeError as e:
+            log.record(FakeCtx(), e, 500)
+        self.assertEqual(len(self.handler.records), 1)
+        self.assertIsNotNone(self.handler.records[0].exc_info)
@@ -0,0 +1,26 @@
+from unittest import IsolatedAsyncioTestCase
+from threading import get_ident
+from jsonclasses_server.executor import Executor
+
+
+class TestExecutor(IsolatedAsyncioTestCase):
+
+    async def test_executor_runs_inline_on_the_event_loop_thread(self):
+        executor = Executor(mode='inline')
+        self.assertEqual(await executor.run(get_ident), get_ident())
+
+    async def test_executor_runs_in_thread_pool_off_the_event_loop(self):
+        executor = Executor(mode='thread', max_workers=2)
+        self.assertNotEqual(await executor.run(get_ident), get_ident())
+        executor.shutdown()
+
+    async def test_executor_passes_arguments_and_raises(self):
+        executor = Executor(mode='thread', max_workers=1)
+        self.assertEqual(await executor.run(pow, 2, 3), 8)
+        with self.assertRaises(ZeroDivisionError):
+            await executor.run(divmod, 1, 0)
+        executor.shutdown()
+
+    def test_executor_rejects_unknown_modes(self):
+        with self.assertRaises(ValueError):
+            Executor(mode='process')
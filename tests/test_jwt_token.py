@@ -0,0 +1,163 @@
+from __future__ import annotations
+from asyncio import run
+from datetime import datetime, timedelta
+from enum import Enum
+from importlib import import_module
+from subprocess import run as run_process
+from sys import executable
+from time import time
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+from jwt import DecodeError, ExpiredSignatureError, encode
+from thunderlight import gimme
+from thunderlight.json import JSON
+from thunderlight.res import Res
+from jsonclasses import jsonclass, types
+from jsonclasses.excs import ObjectNotFoundException
+from jsonclasses_server.jwt_token import (
+    Signer, claims_operator, reload_signer, set_signer, signer
+)
+from jsonclasses_server.operator_cache import operator_cache
+
+
+OLD = 'old-secret-key-which-is-long-enough-for-hs256'
+NEW = 'new-secret-key-which-is-long-enough-for-hs256'
+
+
+class TokenRole(Enum):
+    ADMIN = 'admin'
+    GUEST = 'guest'
+
+
+@jsonclass(class_graph='jwt')
+class TokenUser:
+    id: str = types.readonly.str.primary.required
+    name: str
+    role: TokenRole = types.enum(TokenRole)
+    created_at: datetime
+    tags: list[str]
+
+
+@jsonclass
+class ClaimsOperator:
+    id: str = types.readonly.str.primary.required
+    role: str
+
+
+def _user() -> TokenUser:
+    user = TokenUser(name='n', role=TokenRole.ADMIN,
+                     created_at=datetime(2026, 1, 2, 3, 4, 5))
+    user.update(id='u1')
+    return user
+
+
+class TestJWTToken(TestCase):
+
+    def test_tokens_are_verified_with_the_key_of_their_kid(self):
+        old = Signer({'old': OLD}, 'old')
+        token = old.encode(_user(), timedelta(hours=1))
+        rotating = Signer({'old': OLD, 'new': NEW}, 'new')
+        self.assertEqual(rotating.decode(token)['id'], 'u1')
+        new_token = rotating.encode(_user(), timedelta(hours=1))
+        self.assertEqual(Signer({'new': NEW}, 'new').decode(new_token)['id'], 'u1')
+        with self.assertRaises(DecodeError):
+            Signer({'new': NEW}, 'new').decode(token)
+
+    def test_tokens_without_kid_use_the_secret_key(self):
+        token = encode({'class': 'TokenUser', 'id': 'u1'}, OLD, algorithm='HS256')
+        self.assertEqual(Signer({None: OLD, 'new': NEW}, 'new').decode(token)['id'], 'u1')
+        with self.assertRaises(DecodeError):
+            Signer({'new': NEW}, 'new').decode(token)
+
+    def test_expired_tokens_are_rejected(self):
+        signer = Signer({None: OLD})
+        token = signer.encode(_user(), timedelta(seconds=-10))
+        with self.assertRaises(ExpiredSignatureError):
+            signer.decode(token)
+        legacy = encode({'class': 'TokenUser', 'id': 'u1', 'expired_at': 1}, OLD,
+                        algorithm='HS256')
+        with self.assertRaises(ExpiredSignatureError):
+            signer.decode(legacy)
+
+    def test_signing_key_should_exist(self):
+        with self.assertRaises(ValueError):
+            Signer({None: OLD}, 'missing')
+
+    def test_embedded_fields_build_a_partial_operator(self):
+        signer = Signer({None: OLD}, embed=('role', 'createdAt'))
+        claims = signer.decode(signer.encode(_user(), timedelta(hours=1)))
+        self.assertEqual(claims['fields'], {
+            'role': 'ADMIN', 'created_at': '2026-01-02T03:04:05Z'})
+        operator = claims_operator(claims, 'jwt')
+        self.assertIsInstance(operator, TokenUser)
+        self.assertEqual(operator.id, 'u1')
+        self.assertEqual(operator.role, TokenRole.ADMIN)
+        self.assertEqual(operator.created_at.replace(tzinfo=None), _user().created_at)
+        self.assertIsNone(operator.name)
+        self.assertFalse(operator.is_new)
+        plain = Signer({None: OLD})
+        self.assertIsNone(claims_operator(
+            plain.decode(plain.encode(_user(), timedelta(hours=1))), 'jwt'))
+
+    def test_embedded_fields_should_be_scalar_fields(self):
+        with self.assertRaises(ValueError):
+            Signer({None: OLD}, embed=('missing',)).fields_of(TokenUser)
+        with self.assertRaises(ValueError):
+            Signer({None: OLD}, embed=('tags',)).fields_of(TokenUser)
+
+    def test_embedded_fields_are_trusted_for_max_claims_age(self):
+        signer = Signer({None: OLD}, embed=('role',))
+        claims = signer.decode(signer.encode(_user(), timedelta(hours=1)))
+        self.assertIsNotNone(claims_operator(claims, 'jwt'))
+        self.assertIsNone(claims_operator({**claims, 'iat': time() - 301}, 'jwt'))
+        del claims['iat']
+        self.assertIsNone(claims_operator(claims, 'jwt'))
+
+    def test_reads_refetch_an_invalidated_operator(self):
+        server = import_module('jsonclasses_server.server')
+        middleware = next(m for m in gimme()._middlewares
+                          if m.__name__ == 'set_operator_middleware')
+        previous = signer()
+        set_signer(Signer({None: OLD}, embed=('role',)))
+        self.addCleanup(set_signer, previous)
+        operator = ClaimsOperator(role='admin')
+        operator.update(id='c1')
+        token = signer().encode(operator, timedelta(hours=1))
+        def deleted(claims, gname='default'):
+            raise ObjectNotFoundException('not found')
+        def get():
+            headers = {'authorization': f'Bearer {token}'}
+            ctx = SimpleNamespace(req=SimpleNamespace(method='GET', headers=headers),
+                                  res=Res(JSON()), state=SimpleNamespace())
+            async def next(ctx):
+                ctx.res.code = 200
+            run(middleware(ctx, next))
+            return ctx
+        with patch.object(server, 'fetch_operator', deleted):
+            ctx = get()
+            self.assertEqual(ctx.res.code, 200)
+            self.assertEqual(ctx.state.operator.role, 'admin')
+            # the delete route invalidates the operator
+            operator_cache().invalidate(operator)
+            ctx = get()
+            self.assertEqual(ctx.res.code, 401)
+            self.assertIsNone(ctx.state.operator)
+
+    def test_signer_is_reloaded_with_the_given_config(self):
+        previous = signer()
+        self.addCleanup(set_signer, previous)
+        reloaded = reload_signer({'keys': [{'kid': 'new', 'secret': NEW}],
+                                  'signingKey': 'new', 'embedFields': ['role'],
+                                  'maxClaimsAge': 10})
+        self.assertIs(signer(), reloaded)
+        self.assertEqual(reloaded.kids, ['new'])
+        self.assertEqual(reloaded.signing_kid, 'new')
+        self.assertEqual(reloaded.embed, ('role',))
+        self.assertEqual(reloaded.max_claims_age, 10)
+        self.assertEqual(reload_signer(None).kids, [None])
+
+    def test_importing_the_package_doesnt_import_jwt(self):
+        code = 'import sys, jsonclasses_server; assert "jwt" not in sys.modules'
+        result = run_process([executable, '-c', code], capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
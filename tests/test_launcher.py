@@ -0,0 +1,26 @@
+from __future__ import annotations
+from unittest import TestCase
+from unittest.mock import patch
+from thunderlight import gimme
+from jsonclasses_server.launcher import Launcher, after_fork, _after_fork, _uvicorn
+
+
+class TestLauncher(TestCase):
+
+    def test_launcher_requires_a_worker(self):
+        with self.assertRaises(ValueError):
+            Launcher(gimme(), workers=0)
+
+    def test_after_fork_registers_callback(self):
+        def callback():
+            pass
+        self.assertIs(after_fork(callback), callback)
+        self.assertIn(callback, _after_fork)
+        _after_fork.remove(callback)
+
+    def test_missing_uvicorn_points_to_the_serve_extra(self):
+        with patch.dict('sys.modules', {'uvicorn': None}):
+            with self.assertRaisesRegex(ImportError, r'jsonclasses-server\[serve\]'):
+                _uvicorn()
+            with self.assertRaises(ImportError):
+                Launcher(gimme()).run()
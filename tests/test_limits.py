@@ -0,0 +1,37 @@
+from __future__ import annotations
+from unittest import TestCase
+from jsonclasses.excs import ValidationException
+from jsonclasses_server.excs import PayloadTooLargeException
+from jsonclasses_server.limits import Limits, check_batch, check_query
+from jsonclasses_server.metrics import metrics
+
+
+class TestLimits(TestCase):
+
+    def test_merge_replaces_limits_which_are_set(self):
+        limits = Limits(100, 10, 2, 20).merge(Limits(max_batch_length=5))
+        self.assertEqual(limits.max_body_bytes, 100)
+        self.assertEqual(limits.max_batch_length, 5)
+        self.assertEqual(limits.max_include_depth, 2)
+        self.assertEqual(limits.max_query_terms, 20)
+
+    def test_check_query_rejects_too_many_terms(self):
+        limits = Limits(max_query_terms=3)
+        check_query('a=1&b=2&c=3', limits)
+        with self.assertRaises(ValidationException):
+            check_query('a=1&b=2&c=3&d=4', limits)
+        self.assertIn('jsonclasses_server_rejected_total{reason="query_terms"}',
+                      metrics().render())
+
+    def test_check_query_rejects_deep_includes(self):
+        limits = Limits(max_include_depth=1)
+        check_query('_includes[0]=posts', limits)
+        with self.assertRaises(ValidationException):
+            check_query('_includes%5B0%5D%5Bposts%5D%5B_includes%5D%5B0%5D=comments',
+                        limits)
+
+    def test_check_batch_rejects_long_batches(self):
+        check_batch(2, Limits(max_batch_length=2))
+        with self.assertRaises(PayloadTooLargeException):
+            check_batch(3, Limits(max_batch_length=2))
+        check_batch(3, Limits())
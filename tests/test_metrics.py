@@ -0,0 +1,48 @@
+from __future__ import annotations
+from unittest import TestCase
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest.mock import patch
+from thunderlight import App
+from jsonclasses_server.metrics import (Histogram, Metrics, request_route,
+                                        route_of, timed)
+
+
+class TestMetrics(TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram((0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        lines = list(histogram.lines('t', 'a="b"'))
+        self.assertEqual(lines[0], 't_bucket{a="b",le="0.1"} 1')
+        self.assertEqual(lines[1], 't_bucket{a="b",le="1.0"} 2')
+        self.assertEqual(lines[2], 't_bucket{a="b",le="+Inf"} 3')
+        self.assertEqual(lines[4], 't_count{a="b"} 3')
+
+    def test_metrics_count_requests_and_errors_by_route(self):
+        metrics = Metrics(enabled=True)
+        metrics.observe('GET', '/songs/:id', 200, 0.01, {'query': 0.005})
+        metrics.observe('GET', '/songs/:id', 404, 0.01)
+        text = metrics.render()
+        self.assertIn('jsonclasses_server_requests_total'
+                      '{method="GET",route="/songs/:id"} 2', text)
+        self.assertIn('jsonclasses_server_errors_total'
+                      '{method="GET",route="/songs/:id",status="4xx"} 1', text)
+        self.assertIn('jsonclasses_server_phase_seconds_count'
+                      '{method="GET",route="/songs/:id",phase="query"} 1', text)
+
+    def test_timed_does_nothing_outside_recorded_requests(self):
+        self.assertIsInstance(timed('query'), nullcontext)
+
+    def test_request_route_is_matched_once_per_request(self):
+        app = App()
+        app.get('/songs/:id')(lambda ctx: None)
+        ctx = SimpleNamespace(req=SimpleNamespace(method='GET', path='/songs/1'),
+                              state=SimpleNamespace())
+        with patch('jsonclasses_server.metrics.route_of', wraps=route_of) as match:
+            self.assertEqual(request_route(app, ctx), '/songs/:id')
+            self.assertEqual(request_route(app, ctx), '/songs/:id')
+        self.assertEqual(match.call_count, 1)
+        self.assertEqual(ctx.state.route, '/songs/:id')
@@ -0,0 +1,79 @@
+from unittest import TestCase
+from time import time
+from jsonclasses_server.operator_cache import (
+    MemoryInvalidationBackend, OperatorCache, invalidate_operator,
+    invalidation_backend, operator_cache, set_invalidation_backend
+)
+
+
+class Operator:
+
+    def __init__(self, id: str) -> None:
+        self._id = id
+
+
+class TestOperatorCache(TestCase):
+
+    def test_operator_cache_returns_a_copy_of_cached_operator(self):
+        cache = OperatorCache(size=2, ttl=60)
+        operator = Operator('1')
+        cache.set('t1', operator)
+        operator._id = 'changed'
+        first = cache.get('t1')
+        self.assertEqual(first._id, '1')
+        first._id = 'mutated'
+        self.assertEqual(cache.get('t1')._id, '1')
+        self.assertIsNone(cache.get('t2'))
+
+    def test_operator_cache_evicts_least_recently_used(self):
+        cache = OperatorCache(size=2, ttl=60)
+        cache.set('t1', Operator('1'))
+        cache.set('t2', Operator('2'))
+        cache.get('t1')
+        cache.set('t3', Operator('3'))
+        self.assertIsNotNone(cache.get('t1'))
+        self.assertIsNone(cache.get('t2'))
+        self.assertIsNotNone(cache.get('t3'))
+
+    def test_operator_cache_honours_token_expiration(self):
+        cache = OperatorCache(size=2, ttl=60)
+        cache.set('t1', Operator('1'), expired_at=time() - 1)
+        self.assertIsNone(cache.get('t1'))
+
+    def test_operator_cache_invalidates_every_token_of_operator(self):
+        cache = OperatorCache(size=4, ttl=60)
+        cache.set('t1', Operator('1'))
+        cache.set('t2', Operator('1'))
+        cache.set('t3', Operator('2'))
+        cache.invalidate(Operator('1'))
+        self.assertIsNone(cache.get('t1'))
+        self.assertIsNone(cache.get('t2'))
+        self.assertIsNotNone(cache.get('t3'))
+
+    def test_operator_cache_can_be_disabled(self):
+        cache = OperatorCache(size=0)
+        cache.set('t1', Operator('1'))
+        self.assertIsNone(cache.get('t1'))
+
+    def test_operator_cache_remembers_invalidations(self):
+        cache = OperatorCache(size=0)
+        self.assertIsNone(cache.changed_at('Operator', '1'))
+        cache.invalidate(Operator('1'))
+        self.assertLessEqual(cache.changed_at('Operator', '1'), time())
+        self.assertIsNone(cache.changed_at('Operator', '2'))
+
+    def test_invalidations_go_through_the_backend(self):
+        class Recording(MemoryInvalidationBackend):
+            published = []
+            def publish(self, class_name, id):
+                self.published.append((class_name, id))
+                super().publish(class_name, id)
+        previous = invalidation_backend()
+        backend = Recording()
+        set_invalidation_backend(backend)
+        self.addCleanup(set_invalidation_backend, previous)
+        operator_cache().set('t1', Operator('b1'))
+        invalidate_operator(Operator('b1'))
+        self.assertEqual(backend.published, [('Operator', 'b1')])
+        self.assertIsNone(operator_cache().get('t1'))
+        self.assertIsNotNone(operator_cache().changed_at('Operator', 'b1'))
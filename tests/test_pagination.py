@@ -0,0 +1,95 @@
+from __future__ import annotations
+from unittest import TestCase
+from datetime import datetime
+from qsparser import parse
+from jsonclasses import jsonclass, types
+from jsonclasses.excs import ValidationException
+from jsonclasses_server.pagination import Page, encode_cursor, decode_cursor
+
+
+@jsonclass
+class PaginatedPost:
+    id: str = types.readonly.str.primary.mongoid.required
+    score: int
+    created_at: datetime = types.readonly.datetime.tscreated.required
+
+
+@jsonclass
+class UndatedPost:
+    id: str = types.readonly.str.primary.mongoid.required
+    score: int
+
+
+def _no_fetch(qs):
+    raise AssertionError('tied items should not be fetched')
+
+
+class TestPagination(TestCase):
+
+    def test_cursor_can_be_encoded_and_decoded(self):
+        state = {'k': 'score', 'd': 1, 'v': 5}
+        self.assertEqual(decode_cursor(encode_cursor(state)), state)
+
+    def test_invalid_cursor_raises_validation_exception(self):
+        with self.assertRaises(ValidationException):
+            decode_cursor('not a cursor')
+
+    def test_page_uses_default_size_and_default_key(self):
+        page = Page(PaginatedPost, '', 10, 50)
+        self.assertEqual(parse(page.qs), {'_order': 'createdAt', '_limit': '11'})
+
+    def test_page_clamps_size_to_max_size(self):
+        page = Page(PaginatedPost, '_limit=1000', 10, 50)
+        self.assertEqual(page.size, 50)
+
+    def test_page_applies_keyset_filter_from_cursor(self):
+        page = Page(PaginatedPost, '_order=-score', 2, None)
+        items = [PaginatedPost(score=9), PaginatedPost(score=8),
+                 PaginatedPost(score=7)]
+        items, info = page.info(items, _no_fetch)
+        self.assertEqual([i.score for i in items], [9, 8])
+        self.assertTrue(info['hasNext'])
+        next_page = Page(PaginatedPost, f'_order=-score&_cursor={info["next"]}', 2, None)
+        self.assertEqual(parse(next_page.qs), {
+            '_order': '-score',
+            'score': {'_lt': '8'},
+            '_limit': '3'
+        })
+
+    def test_page_ends_before_tied_items(self):
+        page = Page(PaginatedPost, '_order=-score', 3, None)
+        items = [PaginatedPost(score=9), PaginatedPost(score=7),
+                 PaginatedPost(score=7), PaginatedPost(score=7)]
+        items, info = page.info(items, _no_fetch)
+        self.assertEqual([i.score for i in items], [9])
+        next_page = Page(PaginatedPost, f'_order=-score&_cursor={info["next"]}', 3, None)
+        self.assertEqual(parse(next_page.qs)['score'], {'_lt': '9'})
+
+    def test_page_of_tied_items_fetches_all_of_them(self):
+        page = Page(PaginatedPost, '_order=score&score[_gte]=2', 2, None)
+        queries = []
+        def fetch(qs):
+            queries.append(parse(qs))
+            return [PaginatedPost(score=5) for _ in range(4)]
+        items, info = page.info([PaginatedPost(score=5) for _ in range(3)], fetch)
+        self.assertEqual(len(items), 4)
+        self.assertEqual(queries, [{'_order': 'score',
+                                    'score': {'_gte': '5', '_lte': '5'},
+                                    '_limit': '1001'}])
+        next_page = Page(PaginatedPost, f'_order=score&_cursor={info["next"]}', 2, None)
+        self.assertEqual(parse(next_page.qs)['score'], {'_gt': '5'})
+
+    def test_page_rejects_cursor_of_another_order(self):
+        page = Page(PaginatedPost, '_order=score', 1, None)
+        _, info = page.info([PaginatedPost(score=1), PaginatedPost(score=2)], _no_fetch)
+        with self.assertRaises(ValidationException):
+            Page(PaginatedPost, f'_order=-score&_cursor={info["next"]}', 1, None)
+
+    def test_class_without_default_key_pages_by_offset(self):
+        page = Page(UndatedPost, '', 2, None)
+        self.assertEqual(parse(page.qs), {'_limit': '3'})
+        items = [UndatedPost(score=n) for n in range(3)]
+        items, info = page.info(items, _no_fetch)
+        self.assertEqual(len(items), 2)
+        next_page = Page(UndatedPost, f'_cursor={info["next"]}', 2, None)
+        self.assertEqual(parse(next_page.qs), {'_skip': '2', '_limit': '3'})
@@ -0,0 +1,118 @@
+from __future__ import annotations
+from asyncio import run, sleep
+from cProfile import Profile
+from marshal import loads
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from types import SimpleNamespace
+from unittest import TestCase
+from thunderlight import App
+from jsonclasses_server.profiling import Profiler, _Profiled, profiled, _profiles
+
+
+def _ctx(method: str = 'GET', path: str = '/songs', headers=None, code=200):
+    req = SimpleNamespace(method=method, path=path, headers=headers or {})
+    return SimpleNamespace(req=req, res=SimpleNamespace(code=code),
+                           state=SimpleNamespace(operator=None))
+
+
+def _work() -> int:
+    return sum(range(1000))
+
+
+class TestProfiling(TestCase):
+
+    def test_header_triggers_profiling(self):
+        app = App()
+        self.assertEqual(Profiler().trigger(app, _ctx(headers={'x-profile': '1'})),
+                         'header')
+        self.assertIsNone(Profiler().trigger(app, _ctx()))
+        locked = Profiler(token='secret')
+        self.assertIsNone(locked.trigger(app, _ctx(headers={'x-profile': '1'})))
+        self.assertEqual(locked.trigger(app, _ctx(headers={'x-profile': 'secret'})),
+                         'header')
+
+    def test_sample_rate_triggers_profiling(self):
+        app = App()
+        self.assertEqual(Profiler(sample_rate=1.0).trigger(app, _ctx()), 'sample')
+        self.assertIsNone(Profiler(sample_rate=0.0).trigger(app, _ctx()))
+
+    def test_slow_request_makes_route_hot(self):
+        app = App()
+        profiler = Profiler(threshold=0.5, hot_count=2)
+        profiler.observe(app, _ctx(), 0.1)
+        self.assertIsNone(profiler.trigger(app, _ctx()))
+        profiler.observe(app, _ctx(), 0.6)
+        self.assertIsNone(profiler.trigger(app, _ctx('POST')))
+        self.assertEqual(profiler.trigger(app, _ctx()), 'hot')
+        self.assertEqual(profiler.trigger(app, _ctx()), 'hot')
+        self.assertIsNone(profiler.trigger(app, _ctx()))
+
+    def test_keeps_slowest_profiles(self):
+        app = App()
+        profiler = Profiler(size=2)
+        for seconds in (0.3, 0.1, 0.5, 0.2):
+            profile = Profile()
+            profile.runcall(_work)
+            profiler.keep(app, _ctx(), 'sample', seconds, [profile, Profile()])
+        self.assertEqual([c.seconds for c in profiler.captures], [0.5, 0.3])
+        capture = profiler.captures[0]
+        self.assertIs(profiler.capture(capture.id), capture)
+        self.assertIsNone(profiler.capture(999))
+        self.assertEqual(capture.summary()['route'], '-')
+        self.assertIn('_work', capture.text())
+        self.assertIsInstance(loads(capture.dump()), dict)
+
+    def test_profiled_coroutine_records_its_steps(self):
+        async def handle() -> int:
+            await sleep(0)
+            return _work()
+        profile = Profile()
+        self.assertEqual(run(_wrap(handle(), profile)), 499500)
+        profile.create_stats()
+        names = {key[2] for key in profile.stats}
+        self.assertIn('_work', names)
+
+    def test_profiled_function_records_in_thread(self):
+        profiles = [Profile()]
+        token = _profiles.set(profiles)
+        try:
+            fn = profiled(_work)
+        finally:
+            _profiles.reset(token)
+        self.assertIsNot(fn, _work)
+        self.assertIs(profiled(_work), _work)
+        fn()
+        self.assertEqual(len(profiles), 2)
+        profiles[1].create_stats()
+        self.assertIn('_work', {key[2] for key in profiles[1].stats})
+
+    def test_profiled_functions_in_threads_are_merged(self):
+        barrier = Barrier(2)
+        def work() -> int:
+            barrier.wait()
+            return _work()
+        profiles: list[Profile] = []
+        token = _profiles.set(profiles)
+        try:
+            fns = [profiled(work), profiled(work)]
+        finally:
+            _profiles.reset(token)
+        with ThreadPoolExecutor(2) as executor:
+            results = list(executor.map(lambda fn: fn(), fns))
+        self.assertEqual(results, [499500, 499500])
+        self.assertEqual(len(profiles), 2)
+        profiler = Profiler()
+        profiler.keep(App(), _ctx(), 'sample', 0.1, profiles)
+        stats = loads(profiler.captures[0].dump())
+        calls = [v[1] for k, v in stats.items() if k[2] == '_work']
+        self.assertEqual(calls, [2])
+
+    def test_enabled_profiler_requires_a_token(self):
+        with self.assertRaises(ValueError):
+            Profiler(enabled=True)
+        self.assertEqual(Profiler(enabled=True, token='secret').token, 'secret')
+
+
+async def _wrap(coro, profile):
+    return await _Profiled(coro, profile)
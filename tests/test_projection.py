@@ -0,0 +1,77 @@
+from __future__ import annotations
+from unittest import TestCase
+from qsparser import parse
+from jsonclasses import jsonclass, types
+from jsonclasses.excs import ValidationException
+from jsonclasses_server.projection import Projector
+
+
+@jsonclass(class_graph='projection')
+class ProjectedAuthor:
+    id: str = types.readonly.str.primary.mongoid.required
+    name: str
+    posts: list[ProjectedPost] = types.listof('ProjectedPost').linkedby('author')
+
+
+@jsonclass(class_graph='projection')
+class ProjectedPost:
+    id: str = types.readonly.str.primary.mongoid.required
+    title: str
+    body: str
+    created_at: str
+    author: ProjectedAuthor = types.objof('ProjectedAuthor').linkto
+    summary: str = types.str.getter(lambda p: p.body[:10])
+
+
+@jsonclass(class_graph='projection', can_read=types.getop.isobj(types.this))
+class GuardedPost:
+    id: str = types.readonly.str.primary.mongoid.required
+    title: str
+    body: str
+
+
+class TestProjection(TestCase):
+
+    def test_query_without_fields_is_unchanged(self):
+        projection = Projector(ProjectedPost).project('title=a')
+        self.assertEqual(projection.qs, 'title=a')
+        self.assertIsNone(projection.keep)
+
+    def test_fields_become_a_pick_with_the_primary_key(self):
+        projection = Projector(ProjectedPost).project('_fields=title&title=a')
+        query = parse(projection.qs)
+        self.assertEqual(query['_pick'], ['id', 'title'])
+        self.assertEqual(query['title'], 'a')
+        self.assertEqual(projection.keep, frozenset({'id', 'title'}))
+        self.assertEqual(projection.base_qs, 'title=a')
+
+    def test_pick_accepts_json_names_lists_sort_keys_and_local_keys(self):
+        projection = Projector(ProjectedPost).project(
+            '_pick[0]=author&_order=-createdAt')
+        self.assertEqual(parse(projection.qs)['_pick'],
+                         ['author', 'author_id', 'created_at', 'id'])
+        self.assertEqual(projection.keep, frozenset({'id', 'author', 'authorId'}))
+
+    def test_included_relationships_are_kept(self):
+        projection = Projector(ProjectedAuthor).project(
+            '_fields=name&_includes[0]=posts')
+        self.assertEqual(parse(projection.qs)['_pick'], ['id', 'name', 'posts'])
+        self.assertEqual(projection.keep, frozenset({'id', 'name', 'posts'}))
+
+    def test_needed_fields_are_fetched_but_not_output(self):
+        projection = Projector(ProjectedPost).project('_fields=title', ('body',))
+        self.assertEqual(parse(projection.qs)['_pick'], ['body', 'id', 'title'])
+        self.assertEqual(projection.trim({'id': '1', 'title': 't', 'body': 'b'}),
+                         {'id': '1', 'title': 't'})
+
+    def test_calculated_fields_and_read_guards_fetch_whole_objects(self):
+        projection = Projector(ProjectedPost).project('_fields=summary')
+        self.assertNotIn('_pick', parse(projection.qs))
+        self.assertEqual(projection.keep, frozenset({'id', 'summary'}))
+        projection = Projector(GuardedPost).project('_fields=title')
+        self.assertEqual(projection.qs, '')
+        self.assertEqual(projection.keep, frozenset({'id', 'title'}))
+
+    def test_unknown_fields_are_rejected(self):
+        with self.assertRaises(ValidationException):
+            Projector(ProjectedPost).project('_fields=title,secret')
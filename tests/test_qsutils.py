@@ -0,0 +1,20 @@
+from unittest import TestCase
+from jsonclasses_server.qsutils import pop_param
+
+
+class TestQSUtils(TestCase):
+
+    def test_pop_param_removes_parameter_and_returns_value(self):
+        qs, value = pop_param('name=a&_return=ids&year=2', '_return')
+        self.assertEqual(qs, 'name=a&year=2')
+        self.assertEqual(value, 'ids')
+
+    def test_pop_param_keeps_query_string_without_parameter(self):
+        qs, value = pop_param('name=a&_returns=1', '_return')
+        self.assertEqual(qs, 'name=a&_returns=1')
+        self.assertIsNone(value)
+
+    def test_pop_param_unquotes_value(self):
+        qs, value = pop_param('_cursor=a%3Db', '_cursor')
+        self.assertEqual(qs, '')
+        self.assertEqual(value, 'a=b')
@@ -0,0 +1,67 @@
+from __future__ import annotations
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+from thunderlight import Ctx
+from thunderlight.req import Req
+from thunderlight.res import Res
+from thunderlight.json import JSON
+from jsonclasses_server.excs import TooManyRequestsException
+from jsonclasses_server.ratelimit import (MemoryRateLimitBackend, RateLimit,
+                                          rate_limit_middleware,
+                                          set_rate_limiter)
+
+
+class TestRateLimit(IsolatedAsyncioTestCase):
+
+    async def test_bucket_allows_burst_then_rejects(self):
+        backend = MemoryRateLimitBackend()
+        results = [await backend.take('k', 1, 3) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+
+    async def test_bucket_refills_at_rate(self):
+        backend = MemoryRateLimitBackend()
+        with patch('jsonclasses_server.ratelimit.monotonic', return_value=100.0):
+            await backend.take('k', 2, 1)
+            self.assertAlmostEqual(await backend.take('k', 2, 1), 0.5)
+        with patch('jsonclasses_server.ratelimit.monotonic', return_value=100.5):
+            self.assertEqual(await backend.take('k', 2, 1), 0)
+
+    async def test_bucket_takes_many_tokens_at_once(self):
+        backend = MemoryRateLimitBackend()
+        with patch('jsonclasses_server.ratelimit.monotonic', return_value=100.0):
+            self.assertEqual(await backend.take('k', 1, 3, 2), 0)
+            self.assertAlmostEqual(await backend.take('k', 1, 3, 2), 1)
+            self.assertEqual(await backend.take('k', 1, 3), 0)
+
+    async def test_buckets_are_separate_by_key(self):
+        backend = MemoryRateLimitBackend()
+        self.assertEqual(await backend.take('a', 1, 1), 0)
+        self.assertEqual(await backend.take('b', 1, 1), 0)
+        self.assertGreater(await backend.take('a', 1, 1), 0)
+
+    async def test_least_recently_used_buckets_are_dropped(self):
+        backend = MemoryRateLimitBackend(size=2)
+        for key in ('a', 'b', 'c'):
+            await backend.take(key, 1, 1)
+        self.assertEqual(await backend.take('a', 1, 1), 0)
+
+    def test_rate_limit_rejects_unknown_keys(self):
+        with self.assertRaises(ValueError):
+            RateLimit(1, key='user')
+        self.assertEqual(RateLimit(2.5).burst, 3)
+
+    async def test_ip_limit_runs_before_the_operator_is_set(self):
+        scope = {'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'',
+                 'headers': [], 'client': ('10.0.0.1', 1234)}
+        set_rate_limiter(MemoryRateLimitBackend())
+        middleware = rate_limit_middleware(RateLimit(1, 1, 'ip'))
+        calls = []
+        async def next(ctx):
+            calls.append(ctx)
+        ctx = Ctx(Req(scope, None, {}, '/', JSON()), Res(JSON()))
+        await middleware(ctx, next)
+        with self.assertRaises(TooManyRequestsException):
+            await middleware(Ctx(Req(scope, None, {}, '/', JSON()), Res(JSON())), next)
+        self.assertEqual(calls, [ctx])
+        self.assertNotIn('operator', ctx.state)
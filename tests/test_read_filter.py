@@ -0,0 +1,39 @@
+from __future__ import annotations
+from unittest import TestCase
+from qsparser import parse
+from jsonclasses import jsonclass, types
+from jsonclasses_server.read_filter import owned_by, apply_read_filter
+
+
+@jsonclass
+class FilteredOwner:
+    id: str = types.readonly.str.primary.mongoid.required
+    posts: list[FilteredPost] = types.listof('FilteredPost').linkedby('owner')
+
+
+@jsonclass
+class FilteredPost:
+    id: str = types.readonly.str.primary.mongoid.required
+    title: str
+    owner: FilteredOwner = types.objof('FilteredOwner').linkto.required
+
+
+class TestReadFilter(TestCase):
+
+    def test_owned_by_filters_by_reference_key(self):
+        owner = FilteredOwner()
+        qs = apply_read_filter(owned_by('owner'), FilteredPost, owner, 'title=a')
+        self.assertEqual(parse(qs), {'title': 'a', 'owner_id': owner.id})
+
+    def test_owned_by_hides_everything_from_anonymous_operators(self):
+        qs = apply_read_filter(owned_by('owner'), FilteredPost, None, '')
+        self.assertIsNone(qs)
+
+    def test_read_filter_takes_precedence_over_client_query(self):
+        qs = apply_read_filter(lambda cls, op: {'title': 'b'}, FilteredPost,
+                               None, 'title=a')
+        self.assertEqual(parse(qs), {'title': 'b'})
+
+    def test_read_filter_can_fall_back_to_per_object_checks(self):
+        qs = apply_read_filter(lambda cls, op: None, FilteredPost, None, 'title=a')
+        self.assertEqual(qs, 'title=a')
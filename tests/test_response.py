@@ -0,0 +1,65 @@
+from __future__ import annotations
+from asyncio import run
+from unittest import TestCase
+from thunderlight import App, Ctx, Next
+from thunderlight.res import Res
+from thunderlight.json import JSON
+from thunderlight.asgi import Scope, Receive, Send
+from jsonclasses_server.response import RES_ATTRS, install_res
+
+
+class GreetingRes(Res):
+
+    _name: str
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({'type': 'http.response.start', 'status': self.code,
+                    'headers': list(self.headers.items())})
+        await send({'type': 'http.response.body',
+                    'body': f'hello {self._name}'.encode(),
+                    'more_body': False})
+
+
+class InitRes(Res):
+
+    def __init__(self, json: JSON) -> None:
+        super().__init__(json)
+
+
+def _get(app: App, path: str) -> list[dict]:
+    scope = {'type': 'http', 'method': 'GET', 'path': path,
+             'query_string': b'', 'headers': []}
+    sent: list[dict] = []
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+    async def send(message: dict) -> None:
+        sent.append(message)
+    async def request() -> None:
+        await app(scope)(receive, send)
+    run(request())
+    return sent
+
+
+class TestResponse(TestCase):
+
+    def test_thunderlight_res_layout_is_known(self):
+        self.assertEqual(set(vars(Res(JSON())).keys()), set(RES_ATTRS))
+
+    def test_installed_res_is_sent_by_thunderlight(self):
+        app = App()
+        async def passthrough(ctx: Ctx, next: Next) -> None:
+            await next(ctx)
+        app.use(passthrough)
+        @app.get('/greet')
+        async def greet(ctx: Ctx) -> None:
+            ctx.res.headers['x-greeting'] = 'yes'
+            install_res(ctx, GreetingRes, _name='bob')
+            ctx.res.code = 201
+        sent = _get(app, '/greet')
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertIn(('x-greeting', 'yes'), sent[0]['headers'])
+        self.assertEqual(sent[1]['body'], b'hello bob')
+
+    def test_res_with_own_init_is_rejected(self):
+        with self.assertRaises(TypeError):
+            install_res(Ctx(None, Res(JSON())), InitRes)
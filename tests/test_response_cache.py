@@ -0,0 +1,52 @@
+from __future__ import annotations
+from unittest import IsolatedAsyncioTestCase
+from jsonclasses import jsonclass, types
+from jsonclasses_server.response_cache import (
+    MemoryCacheBackend, set_response_cache, cache_key, invalidate,
+    normalize_qs, etag
+)
+
+
+@jsonclass
+class CachedArticle:
+    id: str = types.readonly.str.primary.mongoid.required
+    title: str
+
+
+class TestResponseCache(IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        set_response_cache(MemoryCacheBackend(size=2))
+
+    async def test_memory_backend_evicts_least_recently_used(self):
+        cache = MemoryCacheBackend(size=2)
+        await cache.set('a', ('"a"', b'a'), 60)
+        await cache.set('b', ('"b"', b'b'), 60)
+        await cache.get('a')
+        await cache.set('c', ('"c"', b'c'), 60)
+        self.assertIsNone(await cache.get('b'))
+        self.assertEqual(await cache.get('a'), ('"a"', b'a'))
+
+    async def test_memory_backend_expires_entries(self):
+        cache = MemoryCacheBackend()
+        await cache.set('a', ('"a"', b'a'), 0)
+        self.assertIsNone(await cache.get('a'))
+
+    def test_query_strings_are_normalized(self):
+        self.assertEqual(normalize_qs('b=1&a=2'), normalize_qs('a=2&b=1'))
+
+    def test_etag_is_stable(self):
+        self.assertEqual(etag(b'abc'), etag(b'abc'))
+        self.assertNotEqual(etag(b'abc'), etag(b'abd'))
+
+    async def test_cache_key_changes_after_invalidation(self):
+        before = await cache_key(CachedArticle, '1', '', None)
+        await invalidate(CachedArticle)
+        after = await cache_key(CachedArticle, '1', '', None)
+        self.assertNotEqual(before, after)
+
+    async def test_cache_key_includes_operator(self):
+        operator = CachedArticle(title='op')
+        anonymous = await cache_key(CachedArticle, None, '', None)
+        authorized = await cache_key(CachedArticle, None, '', operator)
+        self.assertNotEqual(anonymous, authorized)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+from unittest import TestCase
+from thunderlight import gimme
+from jsonclasses import jsonclass, types
+from jsonclasses_server.aconf import AConf
+from jsonclasses_server.api_class import API
+from jsonclasses_server.nameutils import (
+    cname_to_pname, cname_to_srname, fname_to_pname, pname_to_cname,
+    pname_to_fname
+)
+from jsonclasses_server.route_desc import RouteDesc
+
+
+@jsonclass
+class DescribedUser:
+    id: str = types.readonly.str.primary.mongoid.required
+    email_address: str = types.str.unique.authidentity.required
+    password: str = types.writeonly.str.authby(types.checkpw(types.passin)).required
+    display_name: str
+
+
+@jsonclass
+class RecordedSong:
+    id: str = types.readonly.str.primary.mongoid.required
+    name: str
+
+
+def aconf(cls: type = DescribedUser, **kwargs) -> AConf:
+    return AConf(cls=cls, name=kwargs.get('name'),
+                 enable=kwargs.get('enable'), disable=kwargs.get('disable'),
+                 cname_to_pname=cname_to_pname, fname_to_pname=fname_to_pname,
+                 pname_to_cname=pname_to_cname, pname_to_fname=pname_to_fname,
+                 cname_to_srname=cname_to_srname)
+
+
+class TestRouteDesc(TestCase):
+
+    def test_route_desc_resolves_urls(self):
+        desc = RouteDesc(DescribedUser, aconf())
+        self.assertEqual(desc.url, '/described-users')
+        self.assertEqual(desc.id_url, '/described-users/:id')
+        self.assertEqual(desc.e_url, '/described-users/ensure')
+        self.assertEqual(desc.session_url, '/described-users/session')
+        self.assertEqual(desc.srname, 'describedUser')
+
+    def test_route_desc_resolves_actions(self):
+        desc = RouteDesc(DescribedUser, aconf(disable='UD'))
+        self.assertEqual(desc.actions, frozenset('CRL'))
+
+    def test_route_desc_freezes_field_names(self):
+        desc = RouteDesc(DescribedUser, aconf())
+        names = frozenset(['email_address', 'emailAddress'])
+        self.assertEqual(desc.unique_names, names)
+        self.assertEqual(desc.identity_names, names)
+        self.assertEqual(desc.by_names, frozenset(['password']))
+        self.assertEqual(desc.key_map['displayName'], 'display_name')
+        with self.assertRaises(TypeError):
+            desc.key_map['name'] = 'name'  # type: ignore
+
+    def test_record_compiles_the_route_desc(self):
+        API('default').record(RecordedSong, aconf(RecordedSong, enable='R'))
+        self.assertIsInstance(RecordedSong.rdesc, RouteDesc)
+        self.assertEqual(RecordedSong.rdesc.actions, frozenset('R'))
+        rules = [m.rule for m in gimme()._gets]
+        self.assertIn('/recorded-songs/:id', rules)
+        self.assertNotIn('/recorded-songs', rules)
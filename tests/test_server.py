@@ -72,6 +72,13 @@ class TestServer(TestCase):
         result = client.post('/users/session', body={"username": "Jack", "password": "12345678"}).json()
         self.assertIsNotNone(result["data"]["token"])
 
+    def test_fastapi_sign_in_ignores_query_filters(self):
+        client.post('/users', body={"username": "Jack", "password": "12345678"})
+        client.post('/users', body={"username": "Rose", "password": "87654321"})
+        result = client.post('/users/session?username=Rose',
+                             body={"username": "Jack", "password": "12345678"}).json()
+        self.assertEqual(result["data"]["user"]["username"], "Jack")
+
     def test_fastapi_sign_in_to_create_article(self):
         user = client.post('/users', body={"username": "Jack", "password": "12345678"}).json()
         sign_in = client.post('/users/session', body={"username": "Jack", "password": "12345678"}).json()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+from asyncio import run
+from threading import get_ident
+from unittest import TestCase
+from unittest.mock import patch
+from os import mkdir
+from os.path import join
+from tempfile import TemporaryDirectory
+from thunderlight import Ctx
+from thunderlight.res import Res
+from thunderlight.json import JSON
+from jsonclasses_server.response import install_res
+from jsonclasses_server.static import ZEROCOPY, FileRes, StaticRoot, byte_range
+
+
+class TestStatic(TestCase):
+
+    def test_byte_range_parses_single_ranges(self):
+        self.assertEqual(byte_range('bytes=0-9', 100), (0, 10))
+        self.assertEqual(byte_range('bytes=90-', 100), (90, 10))
+        self.assertEqual(byte_range('bytes=-10', 100), (90, 10))
+        self.assertEqual(byte_range('bytes=90-200', 100), (90, 10))
+
+    def test_byte_range_ignores_unsupported_ranges(self):
+        self.assertIsNone(byte_range(None, 100))
+        self.assertIsNone(byte_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(byte_range('bytes=a-b', 100))
+        self.assertIsNone(byte_range('items=0-1', 100))
+
+    def test_byte_range_raises_if_not_satisfiable(self):
+        with self.assertRaises(ValueError):
+            byte_range('bytes=100-', 100)
+        with self.assertRaises(ValueError):
+            byte_range('bytes=-0', 100)
+
+    def test_root_keeps_paths_inside_directory(self):
+        with TemporaryDirectory() as parent:
+            directory = join(parent, 'files')
+            mkdir(directory)
+            root = StaticRoot(directory, 'files')
+            self.assertEqual(root.resolve('a/b.png'), join(root.directory, 'a', 'b.png'))
+            self.assertIsNone(root.resolve('../secret'))
+            self.assertIsNone(root.resolve('/etc/passwd'))
+
+    def test_zero_copy_file_is_opened_off_the_event_loop(self):
+        with TemporaryDirectory() as directory:
+            path = join(directory, 'a.txt')
+            with open(path, 'w') as file:
+                file.write('hello')
+            threads = []
+            def opener(*args):
+                threads.append(get_ident())
+                return open(*args)
+            sent = []
+            async def send(message):
+                sent.append(message)
+            async def respond():
+                ctx = Ctx(None, Res(JSON()))
+                res = install_res(ctx, FileRes, _path=path, _offset=1, _count=3)
+                await res({'extensions': {ZEROCOPY: {}}}, None, send)
+                return get_ident()
+            with patch('jsonclasses_server.static.open', opener, create=True):
+                loop_thread = run(respond())
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], loop_thread)
+        self.assertEqual(sent[1]['type'], ZEROCOPY)
+        self.assertEqual((sent[1]['offset'], sent[1]['count']), (1, 3))
+        self.assertTrue(sent[1]['file'].closed)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+from asyncio import run
+from json import loads
+from unittest import TestCase
+from unittest.mock import patch
+from thunderlight import Ctx
+from thunderlight.req import Req
+from thunderlight.res import Res
+from thunderlight.json import JSON
+from jsonclasses_server.stream import StreamingRes, stream_items
+
+
+def _ctx(accept: str = 'application/json') -> Ctx:
+    scope = {'type': 'http', 'method': 'GET', 'path': '/songs',
+             'query_string': b'', 'headers': [(b'accept', accept.encode())]}
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+    return Ctx(Req(scope, receive, {}, '/songs', JSON()), Res(JSON()))
+
+
+def _encode(n: int):
+    return None if n < 0 else {'n': n}
+
+
+def _body(items: list[int], accept: str = 'application/json') -> tuple[Ctx, bytes]:
+    async def respond() -> tuple[Ctx, bytes]:
+        ctx = _ctx(accept)
+        await stream_items(ctx, iter(items), _encode)
+        return ctx, b''.join([c async for c in ctx.res._chunks])
+    with patch('jsonclasses_server.stream.chunk_size', return_value=2):
+        return run(respond())
+
+
+class TestStream(TestCase):
+
+    def test_items_are_streamed_as_a_json_array(self):
+        for count in (0, 1, 2, 5):
+            ctx, body = _body(list(range(count)))
+            self.assertIsInstance(ctx.res, StreamingRes)
+            self.assertEqual(ctx.res.headers['content-type'], 'application/json')
+            self.assertEqual(loads(body), {'data': [{'n': n} for n in range(count)]})
+
+    def test_dropped_items_keep_the_array_valid(self):
+        _, body = _body([-1, 0, -1, -1, 1, 2, -1])
+        self.assertEqual(body, b'{"data":[{"n":0},{"n":1},{"n":2}]}')
+        _, body = _body([-1, -1])
+        self.assertEqual(body, b'{"data":[]}')
+
+    def test_items_are_streamed_as_ndjson(self):
+        ctx, body = _body(list(range(3)), 'application/x-ndjson')
+        self.assertEqual(ctx.res.headers['content-type'], 'application/x-ndjson')
+        self.assertEqual(body, b'{"n":0}\n{"n":1}\n{"n":2}\n')
+        _, body = _body([], 'application/x-ndjson')
+        self.assertEqual(body, b'')
+
+    def test_errors_of_the_first_chunk_are_raised_before_streaming(self):
+        def broken(n: int):
+            raise ValueError('bad item')
+        ctx = _ctx()
+        with self.assertRaises(ValueError):
+            run(stream_items(ctx, iter([1]), broken))
+        self.assertNotIsInstance(ctx.res, StreamingRes)